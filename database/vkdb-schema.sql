@@ -82,8 +82,14 @@ CREATE TABLE public.jobs
     submitted   timestamp without time zone NOT NULL,
     user_id     character varying           NOT NULL,
     comment     character varying DEFAULT ''::character varying,
+    lease_owner character varying,
+    lease_expires_at timestamp without time zone,
+    attempts    integer DEFAULT 0 NOT NULL,
+    next_attempt_at timestamp without time zone,
+    stage       character varying,
+    progress    integer,
     CONSTRAINT check_state CHECK (((state)::text = ANY
-                                   ((ARRAY ['not_started'::character varying, 'completed'::character varying, 'failed'::character varying])::text[]))),
+                                   ((ARRAY ['not_started'::character varying, 'completed'::character varying, 'failed'::character varying, 'in_progress'::character varying, 'merged'::character varying])::text[]))),
     CONSTRAINT check_type CHECK (((type)::text = ANY
                                   ((ARRAY ['transformation_process'::character varying, 'transformation_set_valid'::character varying, 'transformation_set_invalid'::character varying, 'maps_create'::character varying, 'maps_delete'::character varying, 'maps_update'::character varying, 'mosaic_map_create'::character varying, 'mosaic_map_delete'::character varying])::text[])))
 );
@@ -106,7 +112,7 @@ CREATE TABLE public.jobs_history
     user_id     character varying           NOT NULL,
     comment     character varying DEFAULT ''::character varying,
     CONSTRAINT check_state CHECK (((state)::text = ANY
-                                   ((ARRAY ['not_started'::character varying, 'completed'::character varying, 'failed'::character varying])::text[]))),
+                                   ((ARRAY ['not_started'::character varying, 'completed'::character varying, 'failed'::character varying, 'in_progress'::character varying, 'merged'::character varying])::text[]))),
     CONSTRAINT check_type CHECK (((type)::text = ANY
                                   ((ARRAY ['transformation_process'::character varying, 'transformation_set_valid'::character varying, 'transformation_set_invalid'::character varying, 'maps_create'::character varying, 'maps_delete'::character varying, 'maps_update'::character varying, 'mosaic_map_create'::character varying, 'mosaic_map_delete'::character varying])::text[])))
 );
@@ -20,6 +20,9 @@ PATH_DATA_ROOT = get_settings().PATH_DATA_ROOT
 # Path to the image root directory
 PATH_IMAGE_ROOT = os.path.join(PATH_DATA_ROOT, "./original")
 
+# Path to the tiled working copies of the raw images, which are read instead of the raw images
+PATH_WORKING_COPY_ROOT = os.path.join(PATH_DATA_ROOT, "./working_copies")
+
 # Path to the georef root directory
 PATH_GEOREF_ROOT = os.path.join(PATH_DATA_ROOT, "./georef")
 
@@ -45,6 +48,12 @@ PATH_TMP_TRANSFORMATION_ROOT = os.path.join(PATH_DATA_ROOT, "./map_services_tmp"
 # Path to the tms root directoy
 PATH_TMS_ROOT = os.path.join(PATH_DATA_ROOT, "./tms")
 
+# Path to the checkpoints of the transformation pipeline
+PATH_CHECKPOINT_ROOT = os.path.join(PATH_DATA_ROOT, "./checkpoints")
+
+# Path to the manifest of the derived artifacts of all maps
+PATH_MANIFEST = os.path.join(PATH_DATA_ROOT, "./manifest.json")
+
 # Path to the zoomify files directory
 PATH_ZOOMIFY_ROOT = os.path.join(PATH_DATA_ROOT, "./zoomify")
 
@@ -57,12 +66,14 @@ def create_data_directories():
     create_path_if_not_exists(PATH_GEOREF_ROOT)
     create_path_if_not_exists(PATH_TMS_ROOT)
     create_path_if_not_exists(PATH_IMAGE_ROOT)
+    create_path_if_not_exists(PATH_WORKING_COPY_ROOT)
     create_path_if_not_exists(PATH_MAPFILE_ROOT)
     create_path_if_not_exists(PATH_ZOOMIFY_ROOT)
     create_path_if_not_exists(PATH_THUMBNAIL_ROOT)
     create_path_if_not_exists(PATH_TMP_NEW_MAP_ROOT)
     create_path_if_not_exists(PATH_TMP_TRANSFORMATION_ROOT)
     create_path_if_not_exists(PATH_MOSAIC_ROOT)
+    create_path_if_not_exists(PATH_CHECKPOINT_ROOT)
 
 
 def create_path_if_not_exists(path):
@@ -10,7 +10,7 @@ import os
 from functools import lru_cache
 from typing import Annotated, Optional
 
-from pydantic import AfterValidator
+from pydantic import AfterValidator, BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from urllib3.util import parse_url
 
@@ -35,6 +35,15 @@ def is_https(value: str):
 TYPO3_URL_TYPE = Annotated[str, AfterValidator(is_https)]
 
 
+class JobLane(BaseModel):
+    # Name of the lane, used for logging
+    name: str
+    # Job types, which are scheduled within this lane
+    job_types: list[str]
+    # Maximum number of jobs of this lane, which run at the same time. None means unlimited.
+    max_concurrent: Optional[int] = None
+
+
 class Settings(BaseSettings):
     # Role configuration
     ADMIN_ROLE: str = "vk2-admin"
@@ -72,8 +81,15 @@ class Settings(BaseSettings):
     ES_USERNAME: Optional[str] = None
     ES_PASSWORD: Optional[str] = None
 
-    # Name of the search index
+    # Name of the search index. It is an alias on versioned indices (e.g. vk20_20240806120000000000), which are
+    # switched atomically after a rebuild. The given number of previous versions is kept.
     ES_INDEX_NAME: str = "vk20"
+    ES_INDEX_KEEP_VERSIONS: int = 1
+
+    # Bulk indexing of the initialization. Items rejected by an overloaded cluster are retried with a backoff (seconds).
+    ES_BULK_BATCH_SIZE: int = 500
+    ES_BULK_MAX_RETRIES: int = 3
+    ES_BULK_RETRY_BACKOFF: float = 1
 
     # HAS TO BE HTTPS!
     TYPO3_URL: TYPO3_URL_TYPE = "https://ddev-kartenforum.ddev.site"
@@ -88,8 +104,33 @@ class Settings(BaseSettings):
     # GDAL_NUM_THREADS - This setting can influence the georeference speed. For more information see https://gdal.org/user/configoptions.html
     GDAL_NUM_THREADS: int = 3
 
+    # Georeference images are written as Cloud Optimized GeoTIFF. JPEG and WEBP are lossy (QUALITY) and store the
+    # transparency as internal mask, DEFLATE and LZW are lossless and use a predictor. Overviews are added until the
+    # smallest overview fits into GEO_IMAGE_OVERVIEW_MIN_SIZE pixels.
+    GEO_IMAGE_COMPRESSION: str = "DEFLATE"
+    GEO_IMAGE_QUALITY: int = 85
+    GEO_IMAGE_OVERVIEW_MIN_SIZE: int = 256
+
     # TMS configuration
     GLOBAL_TMS_PROCESSES: int = 2
+    # The png tiles are quantized in batches per zoom level within a process pool. The count of processes is limited
+    # by the cpu budget of a job, which defaults to the cpu count divided by DAEMON_WORKER_COUNT.
+    TMS_COMPRESSION_PROCESSES: int = 4
+    TMS_COMPRESSION_BATCH_SIZE: int = 256
+    TMS_JOB_CPU_BUDGET: Optional[int] = None
+    # With "tile" every tile is quantized with its own palette. With "map" one palette is computed per map from the
+    # overviews of the geo image and the tiles are mapped onto it, which is faster and keeps the colors of neighbouring
+    # tiles consistent.
+    TMS_COMPRESSION_PALETTE: str = "tile"
+    # Besides the tms directory, a single-file archive per format ("mbtiles", "pmtiles") can be written next to it, e.g.
+    # tms/mtb/df_dk_0010001.pmtiles. Without TMS_DIRECTORY_OUTPUT only the archives are written.
+    TMS_ARCHIVE_FORMATS: list[str] = []
+    TMS_DIRECTORY_OUTPUT: bool = True
+
+    # Consistency check of the data directories (georeference/jobs/fsck.py). Temporary files older than the max age
+    # (seconds) are reported as stale.
+    FSCK_WORKERS: int = 8
+    FSCK_TMP_MAX_AGE: int = 24 * 60 * 60
 
     # Sentry configuration
     SENTRY_DSN: Optional[str] = None
@@ -111,13 +152,57 @@ class Settings(BaseSettings):
         os.path.join(BASE_PATH, "../tmp/daemon.pid")
     )
     DAEMON_PIDFILE_TIMEOUT: int = 5
-    DAEMON_SLEEP_TIME: int = 10
+    # The daemon is woken up through PostgreSQL LISTEN/NOTIFY, whenever a new job is added. The sleep time is the
+    # interval of the fallback polling.
+    DAEMON_SLEEP_TIME: int = 60
     DAEMON_WAIT_ON_STARTUP: int = 1
     DAEMON_LOGFILE_PATH: Optional[str] = os.path.abspath(
         os.path.join(BASE_PATH, "../tmp/daemon.log")
     )
     DAEMON_LOG_LEVEL: str = "DEBUG"
     DAEMON_LOOP_HEARTBEAT_COUNT: int = 10
+    # On startup the daemon only processes missing or stale artifacts and search documents in the background. With
+    # this flag it rebuilds the search index and checks all artifacts before it starts processing jobs.
+    DAEMON_FULL_INITIALIZATION_ON_START: bool = False
+    # Number of worker processes, which run jobs concurrently. With 1 the jobs are processed sequentially.
+    DAEMON_WORKER_COUNT: int = 1
+    # A running job is leased to its worker, which renews the lease periodically. Jobs with an expired lease, e.g.
+    # because the worker crashed, are reclaimed and processed again.
+    DAEMON_LEASE_DURATION: int = 300
+    DAEMON_LEASE_HEARTBEAT_INTERVAL: int = 60
+    # Port of the Prometheus metrics endpoint of the daemon ("/metrics"). None disables the endpoint.
+    DAEMON_METRICS_PORT: Optional[int] = None
+    DAEMON_METRICS_HOST: str = "127.0.0.1"
+    # Jobs, which fail with a transient error (e.g. a restart of elasticsearch), are retried with an exponential
+    # backoff starting at DAEMON_JOB_RETRY_BACKOFF seconds. After DAEMON_JOB_MAX_ATTEMPTS attempts they are failed.
+    DAEMON_JOB_MAX_ATTEMPTS: int = 5
+    DAEMON_JOB_RETRY_BACKOFF: int = 30
+    DAEMON_JOB_RETRY_BACKOFF_MAX: int = 3600
+    # Minimum seconds between two progress updates of a running job within the same stage
+    DAEMON_JOB_PROGRESS_INTERVAL: int = 5
+    # Lanes of the job scheduler. Jobs of earlier lanes are run first. Job types not assigned to a lane are
+    # scheduled after all lanes.
+    DAEMON_JOB_LANES: list[JobLane] = [
+        JobLane(
+            name="light",
+            job_types=[
+                "transformation_set_valid",
+                "transformation_set_invalid",
+                "maps_delete",
+                "mosaic_map_delete",
+            ],
+        ),
+        JobLane(
+            name="heavy",
+            job_types=[
+                "transformation_process",
+                "maps_create",
+                "maps_update",
+                "mosaic_map_create",
+            ],
+            max_concurrent=2,
+        ),
+    ]
 
     # Configuration of the data root directory
     PATH_BASE_ROOT: str = BASE_PATH
@@ -131,6 +216,14 @@ class Settings(BaseSettings):
     TEMPLATE_ZOOMIFY_URL: str = "https://zoomify.ddev.site/{}/ImageProperties.xml"
     TEMPLATE_THUMBNAIL_URL: str = "https://thumbnails.ddev.site/{}"
 
+    # Dry runs of transformations with the preview flag warp a source image, whose larger side is reduced to this
+    # size in pixels. The full resolution is still processed by the transformation job.
+    TRANSFORMATION_PREVIEW_MAX_SIZE: int = 2048
+
+    # Results of dry runs are cached by a fingerprint of the raw image, the gcps, the algorithm, the target crs and the
+    # clip. Identical dry runs return the cached temporary wms, as long as its files exist.
+    TRANSFORMATION_DRY_RUN_CACHE: bool = True
+
     # Overwrites are used within the local development setup. In production, they should be set to null
     OVERWRITE_MAPFILE_TMP_PATH: str = ""
 
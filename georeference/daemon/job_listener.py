@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import select
+import time
+
+from loguru import logger
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from georeference.models.job import JOBS_NOTIFY_CHANNEL
+
+
+class JobListener:
+    """Listens on the jobs channel of the database and blocks until a new job is announced. If the connection
+    breaks, it reconnects on the next call of wait and falls back to plain sleeping in the meantime."""
+
+    def __init__(self, engine, channel=JOBS_NOTIFY_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self.connection = None
+
+    def _connect(self):
+        # The connection is detached from the pool, because it is permanently used in autocommit mode
+        raw_connection = self.engine.raw_connection()
+        raw_connection.detach()
+        connection = raw_connection.driver_connection
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel};")
+        logger.debug(f"Listen for notifications on channel {self.channel}.")
+        return connection
+
+    def wait(self, timeout):
+        """Blocks until a notification is received or the timeout is reached.
+
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :result: True if a notification was received
+        :rtype: bool
+        """
+        try:
+            if self.connection is None:
+                self.connection = self._connect()
+
+            if select.select([self.connection], [], [], timeout) == ([], [], []):
+                return False
+
+            self.connection.poll()
+            has_notifications = len(self.connection.notifies) > 0
+            for notify in self.connection.notifies:
+                logger.debug(
+                    f"Received notification for new job of type {notify.payload}."
+                )
+            self.connection.notifies.clear()
+            return has_notifications
+        except Exception as e:
+            logger.warning("Error while listening for new jobs. Fall back to polling.")
+            logger.error(e)
+            self.close()
+            time.sleep(timeout)
+            return False
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
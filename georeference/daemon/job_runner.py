@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+import socket
+import threading
+import time
+import traceback
+
+from loguru import logger
+from sqlalchemy import text
+from sqlmodel import Session
+
+from georeference.config.settings import get_settings
+from georeference.daemon.scheduler import get_lane_index, order_jobs
+from georeference.jobs.errors import is_transient_error
+from georeference.models.enums import EnumJobState, EnumJobType
+from georeference.models.job import Job, JobHistory
+from georeference.utils.metrics import JOB_DURATION_METRIC, registry
+from georeference.utils.progress import ProgressReporter, progress_reporting
+
+# Namespaces for the two-key advisory locks. They make sure that a raw map id, a mosaic map id and a lane index
+# with the same value do not block each other.
+LOCK_NAMESPACES = {
+    "raw_map": 1,
+    "mosaic_map": 2,
+    "lane": 3,
+}
+
+
+def get_lease_owner(pid=None):
+    """Returns an identifier of a worker process, which is unique across all worker nodes.
+
+    :param pid: Process id of the worker (Default: current process)
+    :type pid: int|None
+    :result: Identifier in the form "<hostname>:<pid>"
+    :rtype: str
+    """
+    return f"{socket.gethostname()}:{pid if pid is not None else os.getpid()}"
+
+
+def _is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def release_leases_of_dead_workers(session):
+    """Releases the leases of jobs, which are leased to worker processes of this host that do not exist anymore
+        (e.g. because they were killed by the OOM killer). Every release counts as an attempt of the job.
+
+    :param session: Database session
+    :type session: sqlalchemy.orm.session.Session
+    :result: Count of released jobs
+    :rtype: int
+    """
+    hostname = socket.gethostname()
+    lease_owners = set()
+    for job in Job.query_in_progress_jobs(session):
+        owner_host, _, pid = (job.lease_owner or "").rpartition(":")
+        if owner_host == hostname and pid.isdigit() and not _is_process_alive(int(pid)):
+            lease_owners.add(job.lease_owner)
+
+    if len(lease_owners) == 0:
+        return 0
+    return Job.release_leases(
+        session, sorted(lease_owners), get_settings().DAEMON_JOB_MAX_ATTEMPTS
+    )
+
+
+def _lock(session, namespace, key):
+    """Acquires a transaction scoped advisory lock and waits if necessary. The lock is released with the next
+        commit or rollback of the session.
+
+    :param session: Database session
+    :type session: sqlalchemy.orm.session.Session
+    :param namespace: Name of the lock namespace
+    :type namespace: str
+    :param key: Key of the lock
+    :type key: int
+    """
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, :key)"),
+        {"namespace": LOCK_NAMESPACES[namespace], "key": key},
+    )
+
+
+def _try_lock(session, namespace, key):
+    return session.execute(
+        text("SELECT pg_try_advisory_xact_lock(:namespace, :key)"),
+        {"namespace": LOCK_NAMESPACES[namespace], "key": key},
+    ).scalar()
+
+
+def _is_target_busy(session, target):
+    jobs = Job.query_in_progress_jobs(session)
+    return target in Job.get_targets(jobs, session).values()
+
+
+def try_lock_target(session, target):
+    """Acquires the transaction scoped advisory lock of a target without waiting and checks that no job for the
+        target is in progress. As long as the lock is held, no job for the target can be claimed. The lock is
+        released with the next commit or rollback of the session.
+
+    :param session: Database session
+    :type session: sqlalchemy.orm.session.Session
+    :param target: Target in the form (type, id), e.g. ("raw_map", 10001556)
+    :type target: (str, int)
+    :result: True if the lock was acquired and the target is not busy
+    :rtype: bool
+    """
+    return _try_lock(session, target[0], target[1]) and not _is_target_busy(
+        session, target
+    )
+
+
+def _is_lane_full(session, lane):
+    running_count = len(
+        [
+            job
+            for job in Job.query_in_progress_jobs(session)
+            if job.type in lane.job_types
+        ]
+    )
+    return running_count >= lane.max_concurrent
+
+
+def _try_claim(session, job, target, lanes):
+    # The advisory locks serialize concurrent claims for the same target and lane, so that the following checks
+    # see all leases committed by other workers. A target, which is locked by another claim or by the
+    # initialization of its map, is skipped.
+    if target is not None and not try_lock_target(session, target):
+        return False
+
+    lane_index = get_lane_index(job.type, lanes)
+    if lane_index < len(lanes) and lanes[lane_index].max_concurrent is not None:
+        _lock(session, "lane", lane_index)
+        if _is_lane_full(session, lanes[lane_index]):
+            return False
+
+    return Job.lock_not_started_by_id(job.id, session) is not None
+
+
+def claim_job(session, lanes, lease_owner):
+    """Claims the next job in the order of the scheduler and leases it to the given worker. A job is claimed if
+        no other job for its map is in progress and its lane has a free slot. If a job can not be claimed, all
+        later jobs for the same target are skipped as well, so the order of jobs for a target is preserved. Before
+        claiming, jobs with an expired lease are reclaimed.
+
+    :param session: Database session
+    :type session: sqlalchemy.orm.session.Session
+    :param lanes: Lane configuration
+    :type lanes: georeference.config.settings.JobLane[]
+    :param lease_owner: Identifier of the worker
+    :type lease_owner: str
+    :result: Claimed job or None
+    :rtype: georeference.models.job.Job|None
+    """
+    settings = get_settings()
+
+    reclaimed_count = Job.reclaim_expired_leases(
+        session, settings.DAEMON_JOB_MAX_ATTEMPTS
+    )
+    if reclaimed_count > 0:
+        logger.warning(f"Reclaimed {reclaimed_count} jobs with an expired lease.")
+    session.commit()
+
+    jobs = Job.query_not_started_jobs([e.value for e in EnumJobType], session)
+
+    blocked_targets = set()
+    for job, target in order_jobs(jobs, Job.get_targets(jobs, session), lanes):
+        if target is not None and target in blocked_targets:
+            continue
+
+        # Locks acquired for a job, which could not be claimed, are released by rolling back to the savepoint
+        savepoint = session.begin_nested()
+        if _try_claim(session, job, target, lanes):
+            job.acquire_lease(session, lease_owner, settings.DAEMON_LEASE_DURATION)
+            savepoint.commit()
+            session.commit()
+            return job
+
+        savepoint.rollback()
+        logger.debug(f"Skip job {job.id}, because it can not be claimed right now.")
+        if target is not None:
+            blocked_targets.add(target)
+
+    session.rollback()
+    return None
+
+
+class LeaseHeartbeat:
+    """Renews the lease of a job within a background thread, as long as the job is running."""
+
+    def __init__(self, bind, job_id, lease_owner):
+        settings = get_settings()
+        self.bind = bind
+        self.job_id = job_id
+        self.lease_owner = lease_owner
+        self.lease_duration = settings.DAEMON_LEASE_DURATION
+        self.interval = settings.DAEMON_LEASE_HEARTBEAT_INTERVAL
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with Session(self.bind) as session:
+                    if not Job.renew_lease(
+                        self.job_id, self.lease_owner, self.lease_duration, session
+                    ):
+                        logger.warning(f"Lost the lease for job {self.job_id}.")
+                    session.commit()
+            except Exception as e:
+                logger.warning(f"Could not renew the lease for job {self.job_id}.")
+                logger.error(e)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+
+
+def _create_progress_writer(bind, job_id, lease_owner):
+    # Progress updates are committed immediately within an own session, as the session of the job is only committed
+    # after the job has finished
+    def write(stage, progress):
+        with Session(bind) as session:
+            Job.update_progress(job_id, lease_owner, stage, progress, session)
+            session.commit()
+
+    return write
+
+
+def process_claimed_job(dbsession, handlers, es_index, job, lease_owner):
+    """Runs a claimed job and moves it to the jobs_history afterwards. While the job is running, its lease is
+        renewed periodically. If the lease was lost in the meantime, the job belongs to another worker and is not
+        touched. Jobs, which failed with a transient error, are returned to the queue with an exponential backoff
+        until the maximum number of attempts is reached.
+
+    :param dbsession: Database session
+    :type dbsession: sqlalchemy.orm.session.Session
+    :param handlers: Map job names to a handler
+    :type handlers: dict<EnumJobName, function>
+    :param es_index: Elasticsearch index object
+    :type es_index: elasticsearch.Elasticsearch
+    :param job: Claimed job
+    :type job: georeference.models.job.Job
+    :param lease_owner: Identifier of the worker
+    :type lease_owner: str
+    """
+    job_id = job.id
+    job_type = job.type
+    start = time.monotonic()
+    reporter = ProgressReporter(
+        _create_progress_writer(dbsession.get_bind(), job_id, lease_owner),
+        get_settings().DAEMON_JOB_PROGRESS_INTERVAL,
+    )
+    with LeaseHeartbeat(dbsession.get_bind(), job_id, lease_owner), progress_reporting(
+        reporter
+    ):
+        try:
+            run = handlers.get(job_type)
+            logger.info(f"Start running job with id {job_id} of type {job_type} ...")
+            run(es_index, dbsession, job)
+            dbsession.commit()
+
+            logger.info(f"Job of type {job_type} was finished successful")
+            state = EnumJobState.COMPLETED.value
+            comment = job.comment
+            is_transient = False
+        except Exception as e:
+            logger.info(
+                f'Error while trying to process job {job_id} of type "{job_type}".'
+            )
+
+            if get_settings().DEV_MODE:
+                logger.error(traceback.format_exc())
+            logger.error(e)
+
+            # Rollback previous changes, as the job could not be completed successfully
+            dbsession.rollback()
+
+            # assign the error including message to the comment field
+            # one might pass custom error messages by raising custom exceptions in the job runners
+            state = EnumJobState.FAILED.value
+            comment = str(e)
+            is_transient = is_transient_error(e)
+
+    registry.observe(
+        JOB_DURATION_METRIC, time.monotonic() - start, type=job_type, state=state
+    )
+
+    job = dbsession.get(Job, job_id, populate_existing=True)
+    if job is None or job.lease_owner != lease_owner:
+        logger.warning(
+            f"Job {job_id} is not leased to {lease_owner} anymore. Skip finishing it."
+        )
+        dbsession.rollback()
+        return
+
+    settings = get_settings()
+    if is_transient and job.attempts + 1 < settings.DAEMON_JOB_MAX_ATTEMPTS:
+        backoff = min(
+            settings.DAEMON_JOB_RETRY_BACKOFF * 2**job.attempts,
+            settings.DAEMON_JOB_RETRY_BACKOFF_MAX,
+        )
+        job.schedule_retry(dbsession, backoff, comment)
+        dbsession.commit()
+        logger.warning(
+            f"Job {job_id} failed with a transient error. Retry attempt {job.attempts} in {backoff} seconds."
+        )
+        return
+
+    # add job to job_history table and remove it from the job table
+    dbsession.add(JobHistory.from_job(job, state=state, comment=comment))
+    dbsession.delete(job)
+    dbsession.commit()
+    logger.info(f"Processed job with id {job_id}.")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+from sqlmodel import Session
+
+from georeference.models.enums import EnumJobType
+from georeference.models.job import Job
+from georeference.utils.metrics import format_labels, registry
+
+
+def render_queue_metrics(session):
+    """Renders the state of the job queue in the Prometheus text exposition format. The values are read from the
+        database, so they also cover jobs of other worker nodes.
+
+    :param session: Database session
+    :type session: sqlalchemy.orm.session.Session
+    :result: Lines of the exposition format
+    :rtype: str[]
+    """
+    statistics = Job.query_queue_statistics(session)
+
+    lines = [
+        "# HELP vk_jobs_queue_depth Number of not started jobs.",
+        "# TYPE vk_jobs_queue_depth gauge",
+    ]
+    for job_type in EnumJobType:
+        count = statistics.get(job_type.value, (0, None))[0]
+        lines.append(
+            f"vk_jobs_queue_depth{format_labels((('type', job_type.value),))} {count}"
+        )
+
+    oldest_submitted = [
+        oldest for _, oldest in statistics.values() if oldest is not None
+    ]
+    oldest_age = (
+        max((datetime.now() - min(oldest_submitted)).total_seconds(), 0)
+        if len(oldest_submitted) > 0
+        else 0
+    )
+    lines += [
+        "# HELP vk_jobs_oldest_not_started_age_seconds Age of the oldest not started job in seconds.",
+        "# TYPE vk_jobs_oldest_not_started_age_seconds gauge",
+        f"vk_jobs_oldest_not_started_age_seconds {oldest_age}",
+    ]
+    return lines
+
+
+class MetricsServer:
+    """Serves the metrics of the daemon on "/metrics" within a background thread. Observations of the worker
+    processes are received via the metrics queue."""
+
+    def __init__(self, engine, host, port, metrics_queue=None):
+        self.engine = engine
+        self.metrics_queue = metrics_queue
+        self.server = ThreadingHTTPServer((host, port), self._create_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _create_handler(self):
+        metrics_server = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+
+                try:
+                    body = metrics_server.render().encode("utf-8")
+                except Exception as e:
+                    logger.warning("Error while rendering the metrics.")
+                    logger.error(e)
+                    self.send_error(500)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Metrics request - {format % args}")
+
+        return MetricsHandler
+
+    def collect(self):
+        """Records the observations, which were forwarded by the worker processes."""
+        if self.metrics_queue is not None:
+            registry.collect_from(self.metrics_queue)
+
+    def render(self):
+        """Renders all metrics in the Prometheus text exposition format.
+
+        :result: Metrics
+        :rtype: str
+        """
+        self.collect()
+        with Session(self.engine) as session:
+            lines = render_queue_metrics(session)
+        lines += registry.render()
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        logger.info(
+            f"Serve metrics on http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics"
+        )
+        self.thread.start()
+
+    def shutdown(self):
+        # shutdown() blocks until serve_forever returns, so it must only be called for a running server
+        if self.thread.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
@@ -7,6 +7,7 @@
 # "LICENSE", which is part of this source code package
 
 import logging
+import multiprocessing
 
 # Created by jacob.mendt@pikobytes.de on 09.12.21
 #
@@ -14,18 +15,31 @@ import logging
 # "LICENSE", which is part of this source code package
 import os
 import sys
+import threading
 import time
 import traceback
 import sentry_sdk
 from datetime import datetime
 from loguru import logger
+from sqlmodel import Session
 
-from georeference.config.db import get_session
+from georeference.config.db import get_session, engine
 from georeference.config.logging_config import parse_log_level
 from georeference.config.paths import create_data_directories
 from georeference.config.sentry import setup_sentry
 from georeference.config.settings import get_settings
-from georeference.jobs.initialize_data import run_initialize_data
+from georeference.daemon.job_listener import JobListener
+from georeference.daemon.job_runner import (
+    claim_job,
+    get_lease_owner,
+    process_claimed_job,
+)
+from georeference.daemon.metrics_server import MetricsServer
+from georeference.daemon.worker_pool import WorkerPool
+from georeference.jobs.initialize_data import (
+    run_incremental_initialize_data,
+    run_initialize_data,
+)
 from georeference.jobs.process_create_map import run_process_create_map
 from georeference.jobs.process_create_mosaic_map import run_process_create_mosaic_map
 from georeference.jobs.process_delete_map import run_process_delete_maps
@@ -33,10 +47,11 @@ from georeference.jobs.process_delete_mosaic_map import run_process_delete_mosai
 from georeference.jobs.process_transformation import run_process_new_transformation
 from georeference.jobs.process_update_maps import run_process_update_maps
 from georeference.jobs.set_validation import run_process_new_validation
-from georeference.models.enums import EnumJobType, EnumJobState
-from georeference.models.job import Job, JobHistory
+from georeference.models.enums import EnumJobType
+from georeference.models.job import Job
 from georeference.utils.es_index import get_es_index_from_settings
 from georeference.utils.init_helper import log_startup_information
+from georeference.utils.metrics import registry
 
 # For correct resolving of the paths we use derive the base_path of the file
 BASE_PATH = os.path.dirname(os.path.realpath(__file__))
@@ -85,6 +100,30 @@ def _initialize_logger():
     logger.debug("Logger initialized")
 
 
+def _initialize_worker(metrics_queue):
+    """Initializes a process of the worker pool
+
+    :param metrics_queue: Queue, which forwards the metrics to the main process
+    :type metrics_queue: multiprocessing.Queue|None
+    """
+    _initialize_logger()
+    if metrics_queue is not None:
+        registry.forward_to(metrics_queue)
+
+
+def _coalesce_jobs(dbsession):
+    """Merges superseded jobs before they are dispatched, so that only the effective last job for a map or mosaic
+    map is processed.
+
+    :param dbsession: Database session object
+    :type dbsession: sqlalchemy.orm.session.Session
+    """
+    merged_count = Job.coalesce_not_started_jobs(dbsession)
+    dbsession.commit()
+    if merged_count > 0:
+        logger.info(f"Merged {merged_count} superseded jobs.")
+
+
 def loop(dbsession, handlers, es_index):
     """Iteration holding the main functionality
 
@@ -96,54 +135,19 @@ def loop(dbsession, handlers, es_index):
     :type es_index: elasticsearch.client.IndicesClient
     """
     try:
-        logger.info("Looking for pending jobs ...")
-
-        for job in Job.query_not_started_jobs(
-            [e.value for e in EnumJobType], dbsession
-        ):
-            job_id = job.id
-            try:
-                run = handlers.get(job.type)
-                logger.info(
-                    f"Start running job with id {job.id} of type {job.type} ..."
-                )
-                run(es_index, dbsession, job)
-
-                logger.info(f"Job of type {job.type} was finished successful")
-                job.state = EnumJobState.COMPLETED.value
-            except Exception as e:
-                logger.info(
-                    f'Error while trying to process job {job_id} of type "{job.type}".'
-                )
-
-                if settings.DEV_MODE:
-                    logger.error(traceback.format_exc())
-                logger.error(e)
+        _coalesce_jobs(dbsession)
 
-                # Rollback previous changes, as the job could not be completed successfully
-                dbsession.rollback()
-
-                # Update job state
-                job = dbsession.query(Job).filter(Job.id == job_id).first()
-                job.state = EnumJobState.FAILED.value
-
-                # assign the error including message to the comment field
-                # one might pass custom error messages by raising custom exceptions in the job runners
-                job.comment = str(e)
-
-            finally:
-                # add job to job_history table
-                job_history_entry = JobHistory(**job.model_dump())
-                dbsession.add(job_history_entry)
-                dbsession.commit()
+        logger.info("Looking for pending jobs ...")
 
-                # remove job from job table
-                dbsession.delete(job)
-                logger.debug(job.model_dump())
+        # Light jobs are run before heavy jobs, but jobs for the same map keep their order. Each job is leased
+        # to this process, so that daemons on other nodes do not process it at the same time.
+        lease_owner = get_lease_owner()
+        while True:
+            job = claim_job(dbsession, settings.DAEMON_JOB_LANES, lease_owner)
+            if job is None:
+                break
 
-                # commit session
-                dbsession.commit()
-            logger.info("Processed job with id %s." % job.id)
+            process_claimed_job(dbsession, handlers, es_index, job, lease_owner)
 
         logger.debug("Close database connection.")
         dbsession.close()
@@ -157,11 +161,32 @@ def loop(dbsession, handlers, es_index):
         logger.error(e)
 
 
+def _run_background_initialization():
+    """Runs the incremental initialization within its own database session and search index client."""
+    es_index = None
+    try:
+        es_index = get_es_index_from_settings(False)
+        if es_index is None:
+            raise Exception("Could not initialize elasticsearch index")
+
+        with Session(engine) as dbsession:
+            run_incremental_initialize_data(dbsession, es_index)
+    except Exception as e:
+        logger.info("Error while running the background initialization")
+        logger.error(e)
+    finally:
+        if es_index is not None:
+            es_index.close()
+
+
 def on_start(dbsession=None):
-    """Should be called once on daemon startup
+    """Should be called once on daemon startup. By default the geo and index data is initialized incrementally
+        within a background thread, so that the processing of jobs can start right away.
 
     :param dbsession: Database session object
     :type dbsession: sqlalchemy.orm.session.Session
+    :result: Thread of the background initialization or None
+    :rtype: threading.Thread|None
     """
     try:
         logger.info("Starting the daemon ...")
@@ -169,25 +194,46 @@ def on_start(dbsession=None):
         logger.info("Make sure data directories are existing ...")
         create_data_directories()
 
-        logger.info("Initialize geo and index data ...")
-        run_initialize_data(dbsession)
+        if settings.DAEMON_FULL_INITIALIZATION_ON_START:
+            logger.info("Initialize geo and index data ...")
+            run_initialize_data(dbsession)
 
-        dbsession.commit()
-        dbsession.close()
-        logger.info("Initialization of the daemon has finished. Waiting for changes...")
+            dbsession.commit()
+            dbsession.close()
+            logger.info(
+                "Initialization of the daemon has finished. Waiting for changes..."
+            )
+            return None
+
+        logger.info(
+            "Initialize missing or stale geo and index data in the background ..."
+        )
+        thread = threading.Thread(
+            target=_run_background_initialization,
+            name="background-initialization",
+            daemon=True,
+        )
+        thread.start()
+        return thread
     except Exception as e:
         logger.info("Error while starting the daemon")
         logger.error(e)
 
 
 def main(wait_on_start=1, wait_on_loop=1):
-    """Daemon main run.
+    """Daemon main run. Between the loops the daemon blocks until a new job is announced via PostgreSQL
+    LISTEN/NOTIFY. If no notification is received, it polls the jobs table after "wait_on_loop" seconds.
 
     :param wait_on_start: Seconds to wait on startup
     :type wait_on_start: int
-    :param wait_on_loop: Seconds to wait after each loop
+    :param wait_on_loop: Maximum seconds to wait for a notification before polling
     :type wait_on_loop: int
     """
+    worker_pool = None
+    job_listener = None
+    metrics_server = None
+    session = None
+    es_index = None
     try:
         run_count = 0
         _initialize_logger()
@@ -205,6 +251,50 @@ def main(wait_on_start=1, wait_on_loop=1):
         on_start(dbsession=session)
         session.close()
 
+        # Start listening before the first loop, so that no notification gets lost
+        job_listener = JobListener(engine)
+
+        if settings.DAEMON_METRICS_PORT is not None:
+            # Worker processes forward their metrics to this process, which serves them
+            metrics_queue = (
+                multiprocessing.get_context("spawn").Queue()
+                if settings.DAEMON_WORKER_COUNT > 1
+                else None
+            )
+            metrics_server = MetricsServer(
+                engine,
+                settings.DAEMON_METRICS_HOST,
+                settings.DAEMON_METRICS_PORT,
+                metrics_queue,
+            )
+            metrics_server.start()
+
+        # In case more than one worker is configured, the jobs are processed concurrently by a process pool
+        if settings.DAEMON_WORKER_COUNT > 1:
+            logger.info(
+                f"Start worker pool with {settings.DAEMON_WORKER_COUNT} workers ..."
+            )
+            worker_pool = WorkerPool(
+                job_run_handlers,
+                settings.DAEMON_WORKER_COUNT,
+                initializer=_initialize_worker,
+                initargs=(
+                    metrics_server.metrics_queue
+                    if metrics_server is not None
+                    else None,
+                ),
+            )
+        else:
+            logger.debug("Initialize search index")
+            # The session and the search index client are reused across loops. The session releases its
+            # connection at the end of each loop.
+            es_index = get_es_index_from_settings(False)
+            if es_index is None:
+                logger.error("Could not initialize elasticsearch index")
+                raise
+
+        has_pending_jobs = True
+        last_poll = time.monotonic()
         while True:
             if run_count % settings.DAEMON_LOOP_HEARTBEAT_COUNT == 0:
                 # send heartbeat to sentry
@@ -217,40 +307,53 @@ def main(wait_on_start=1, wait_on_loop=1):
                 )
                 run_count = 0
 
-            # To prevent the daemon from having to long lasting logger handles or database session we reinitialize / reset
-            # both before each loop
-            logger.info("################################")
-            logger.info("Starting new loop ...")
-
-            logger.debug("Initialize database")
-            # get the database session
-            session = next(get_session())
-            if session is None:
-                logger.error(
-                    "Could not initialize database because of missing configuration file"
-                )
-                raise
-
-            logger.debug("Initialize search index")
-            # get the elasticsearch index
-            es_index = get_es_index_from_settings(False)
-            if es_index is None:
-                logger.error("Could not initialize elasticsearch index")
-                raise
-
-            loop(session, job_run_handlers, es_index)
-            logger.info(f"Sleep for {wait_on_loop} seconds.")
-
-            session.close()
-            es_index.close()
-
-            time.sleep(wait_on_loop)
+            wait_time = wait_on_loop
+            if worker_pool is not None:
+                # A notification could arrive while all workers are busy, but about to finish. In this case the
+                # dispatch is retried once a worker slot is free.
+                if has_pending_jobs:
+                    with Session(engine) as coalesce_session:
+                        _coalesce_jobs(coalesce_session)
+
+                if has_pending_jobs and worker_pool.dispatch() > 0:
+                    has_pending_jobs = False
+                else:
+                    worker_pool.reap()
+
+                if worker_pool.is_busy():
+                    wait_time = min(wait_on_loop, 1)
+
+                # Drain the forwarded metrics regularly, so the queue does not grow between two scrapes
+                if metrics_server is not None:
+                    metrics_server.collect()
+            elif has_pending_jobs:
+                logger.info("################################")
+                logger.info("Starting new loop ...")
+                loop(session, job_run_handlers, es_index)
+                # Make sure a failed loop does not leave the reused session in an invalid transaction state
+                session.close()
+                has_pending_jobs = False
+
+            is_notified = job_listener.wait(wait_time)
+            if is_notified or time.monotonic() - last_poll >= wait_on_loop:
+                has_pending_jobs = True
+                last_poll = time.monotonic()
             run_count += 1
     except Exception as e:
         logger.info("Error while running the daemon")
         logger.error(e)
     finally:
         logger.info("Clean up")
+        if worker_pool is not None:
+            worker_pool.shutdown()
+        if job_listener is not None:
+            job_listener.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if es_index is not None:
+            es_index.close()
+        if session is not None:
+            session.close()
         logging.shutdown()
 
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import heapq
+from collections import deque
+
+
+def get_lane_index(job_type, lanes):
+    """Returns the index of the lane for a job type. Job types without a lane are scheduled after all lanes.
+
+    :param job_type: Type of the job
+    :type job_type: str
+    :param lanes: Lane configuration
+    :type lanes: georeference.config.settings.JobLane[]
+    :result: Index of the lane
+    :rtype: int
+    """
+    for index, lane in enumerate(lanes):
+        if job_type in lane.job_types:
+            return index
+    return len(lanes)
+
+
+def order_jobs(jobs, targets, lanes):
+    """Orders jobs by their lane and id. Jobs for the same map or mosaic map are never reordered against each other,
+        so a light job waits for an earlier heavy job for the same target.
+
+    :param jobs: Jobs ordered by id
+    :type jobs: georeference.models.job.Job[]
+    :param targets: Map of job id to the target of the job (see Job.get_targets)
+    :type targets: dict<int, (str, int)|None>
+    :param lanes: Lane configuration
+    :type lanes: georeference.config.settings.JobLane[]
+    :result: List of tuples of job and target
+    :rtype: (georeference.models.job.Job, (str, int)|None)[]
+    """
+    queues = {}
+    heap = []
+    for job in jobs:
+        target = targets[job.id]
+        key = target if target is not None else ("job", job.id)
+        queue = queues.setdefault(key, deque())
+        queue.append((job, target))
+        if len(queue) == 1:
+            heapq.heappush(heap, (get_lane_index(job.type, lanes), job.id, key))
+
+    ordered_jobs = []
+    while heap:
+        _, _, key = heapq.heappop(heap)
+        queue = queues[key]
+        ordered_jobs.append(queue.popleft())
+
+        if len(queue) > 0:
+            next_job = queue[0][0]
+            heapq.heappush(
+                heap, (get_lane_index(next_job.type, lanes), next_job.id, key)
+            )
+
+    return ordered_jobs
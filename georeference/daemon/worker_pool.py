@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from loguru import logger
+from sqlmodel import Session
+
+from georeference.config.db import engine
+from georeference.config.settings import get_settings
+from georeference.daemon.job_runner import (
+    claim_job,
+    get_lease_owner,
+    process_claimed_job,
+    release_leases_of_dead_workers,
+)
+from georeference.utils.es_index import get_es_index_from_settings
+
+
+def run_worker(handlers, worker_id):
+    """Drains the job queue within a worker process. It returns as soon as there are no more claimable jobs.
+
+    :param handlers: Map job names to a handler
+    :type handlers: dict<EnumJobName, function>
+    :param worker_id: Id of the worker, used for logging
+    :type worker_id: int
+    :result: Count of processed jobs
+    :rtype: int
+    """
+    lanes = get_settings().DAEMON_JOB_LANES
+    lease_owner = get_lease_owner()
+    processed = 0
+
+    es_index = get_es_index_from_settings(False)
+    if es_index is None:
+        raise Exception("Could not initialize elasticsearch index")
+
+    try:
+        with Session(engine) as dbsession:
+            while True:
+                job = claim_job(dbsession, lanes, lease_owner)
+                if job is None:
+                    break
+
+                logger.debug(f"Worker {worker_id} claimed job {job.id}.")
+                process_claimed_job(dbsession, handlers, es_index, job, lease_owner)
+                processed += 1
+    finally:
+        es_index.close()
+
+    return processed
+
+
+class WorkerPool:
+    """Process pool, which runs jobs concurrently. Every free worker slot is filled with a worker, which drains the
+    job queue until there are no more claimable jobs left. If a worker process dies (e.g. killed by the OOM killer or
+    a segfault within GDAL), the pool is recreated and the leases of the jobs of the dead workers are released."""
+
+    def __init__(
+        self, handlers, worker_count, initializer=None, initargs=(), bind=engine
+    ):
+        self.handlers = handlers
+        self.worker_count = worker_count
+        self.initializer = initializer
+        self.initargs = initargs
+        self.bind = bind
+        self.futures = {}
+        self.executor = self._create_executor()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.worker_count,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+
+    def _restart(self):
+        """Replaces a broken executor and releases the leases of the jobs of the dead workers, so that they are
+        picked up again."""
+        logger.warning(
+            "A worker process died unexpectedly. Restart the worker pool ..."
+        )
+        self.executor.shutdown(wait=True)
+        self.futures = {}
+
+        try:
+            with Session(self.bind) as dbsession:
+                released_count = release_leases_of_dead_workers(dbsession)
+                dbsession.commit()
+            if released_count > 0:
+                logger.warning(
+                    f"Released the leases of {released_count} jobs of dead workers."
+                )
+        except Exception as e:
+            logger.info("Error while releasing the leases of dead workers")
+            logger.error(e)
+
+        self.executor = self._create_executor()
+
+    def reap(self):
+        """Removes finished workers from the pool and logs their results. A broken pool is recreated."""
+        is_broken = False
+        for worker_id, future in list(self.futures.items()):
+            if not future.done():
+                continue
+
+            del self.futures[worker_id]
+            try:
+                logger.info(f"Worker {worker_id} processed {future.result()} jobs.")
+            except BrokenProcessPool as e:
+                logger.info(f"Error while running worker {worker_id}")
+                logger.error(e)
+                is_broken = True
+            except Exception as e:
+                logger.info(f"Error while running worker {worker_id}")
+                logger.error(e)
+
+        if is_broken:
+            self._restart()
+
+    def _start_workers(self):
+        started = 0
+        for worker_id in range(self.worker_count):
+            if worker_id not in self.futures:
+                self.futures[worker_id] = self.executor.submit(
+                    run_worker, self.handlers, worker_id
+                )
+                started += 1
+        return started
+
+    def dispatch(self):
+        """Reaps finished workers and starts new ones for all free slots. It does not block.
+
+        :result: Count of started workers
+        :rtype: int
+        """
+        self.reap()
+
+        try:
+            return self._start_workers()
+        except BrokenProcessPool as e:
+            logger.info("Error while starting workers")
+            logger.error(e)
+            self._restart()
+            return self._start_workers()
+
+    def is_busy(self):
+        return len(self.futures) > 0
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
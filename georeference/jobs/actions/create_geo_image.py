@@ -9,10 +9,10 @@ import os
 
 from loguru import logger
 
-from georeference.config.paths import PATH_TMP_ROOT
 from georeference.utils.georeference import rectify_image_with_clip_and_overviews
 from georeference.utils.parser import to_gdal_gcps
 from georeference.utils.proj import transform_to_params_to_target_crs
+from georeference.utils.publish import get_temporary_path, publish_file
 
 
 def run_process_geo_image(
@@ -57,16 +57,22 @@ def run_process_geo_image(
         else georef_params["target"],
     )
 
-    # Try processing a geo transformation
-    rectify_image_with_clip_and_overviews(
-        path_raw_image,
-        path_geo_image,
-        georef_params["algorithm"],
-        to_gdal_gcps(georef_params["gcps"]),
-        georef_params["target"],
-        PATH_TMP_ROOT,
-        clip,
-    )
+    # Try processing a geo transformation. The geo image is written to a temporary file and replaces an existing geo
+    # image atomically.
+    tmp_geo_image = get_temporary_path(path_geo_image)
+    try:
+        rectify_image_with_clip_and_overviews(
+            path_raw_image,
+            tmp_geo_image,
+            georef_params["algorithm"],
+            to_gdal_gcps(georef_params["gcps"]),
+            georef_params["target"],
+            clip,
+        )
+        publish_file(tmp_geo_image, path_geo_image)
+    finally:
+        if os.path.exists(tmp_geo_image):
+            os.remove(tmp_geo_image)
 
     if not os.path.exists(path_geo_image):
         raise Exception(
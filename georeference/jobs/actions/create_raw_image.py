@@ -6,14 +6,32 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import os
-import subprocess
 
 from loguru import logger
 from osgeo import gdal
 
+from georeference.config.paths import create_path_if_not_exists
+from georeference.utils.warp import get_overview_count, translate
+
 # For a full list of all supported CO (creation opions) have a lock at https://gdal.org/drivers/raster/gtiff.html
 CO_PARAMETER = [("PROFILE", "BASELINE"), ("TILED", "NO"), ("INTERLEAVE", "BAND")]
 
+# Creation options of the working copy of the raw image. It is tiled, pixel interleaved and lossless compressed, so
+# that the warping, the thumbnails and the zoomify tiles read single windows and do not have to decode the whole image.
+WORKING_COPY_CO_PARAMETER = [
+    ("TILED", "YES"),
+    ("BLOCKXSIZE", "512"),
+    ("BLOCKYSIZE", "512"),
+    ("INTERLEAVE", "PIXEL"),
+    ("COMPRESS", "DEFLATE"),
+    ("PREDICTOR", "2"),
+    ("BIGTIFF", "IF_SAFER"),
+]
+
+# Internal overviews are added until the smallest overview fits into this size. They are used for decimated reads,
+# e.g. of the dry run previews.
+OVERVIEW_MIN_SIZE = 256
+
 # For a full list supported metadata tags have a lock at https://gdal.org/drivers/raster/gtiff.html
 MO_PARAMETER = [
     ("TIFFTAG_DATETIME", ""),
@@ -37,11 +55,32 @@ def _get_pixel_data_type(path_to_image):
             del datasource
 
 
+def _add_overviews(path_to_image):
+    """Adds internal overviews to an image. The number of overview levels depends on the image size.
+
+    :param path_to_image: Path to the image
+    :type path_to_image: str
+    """
+    with gdal.ExceptionMgr(useExceptions=True), gdal.config_options(
+        {"COMPRESS_OVERVIEW": "DEFLATE", "PREDICTOR_OVERVIEW": "2"}
+    ):
+        dataset = gdal.Open(path_to_image, gdal.GA_Update)
+        overview_count = get_overview_count(
+            dataset.RasterXSize, dataset.RasterYSize, OVERVIEW_MIN_SIZE
+        )
+        if overview_count > 0:
+            dataset.BuildOverviews(
+                "AVERAGE", [2**level for level in range(1, overview_count + 1)]
+            )
+        del dataset
+
+
 def run_process_raw_image(path_src_raw_img, path_trg_raw_img, force=False):
     """This action preprocess a raw image used for further processing within the georeference service. As part of the
         preprocessing it resets different default tiff metadata fields, changes some creation options and checks if
-        should change the pixel data type. All this is done by using the command line utility gdal_translate, see also
-        https://gdal.org/programs/gdal_translate.html and https://gdal.org/drivers/raster/gtiff.html for more information.
+        should change the pixel data type. All this is done in-process with gdal.Translate, see also
+        https://gdal.org/programs/gdal_translate.html and https://gdal.org/drivers/raster/gtiff.html for more
+        information.
 
     :param path_src_raw_img: Path to the source image.
     :type path_src_raw_img: str
@@ -73,26 +112,60 @@ def run_process_raw_image(path_src_raw_img, path_trg_raw_img, force=False):
     data_type = _get_pixel_data_type(path_src_raw_img)
     fix_data_type = True if data_type == "UInt16" else False
 
-    command = "gdal_translate -of GTIFF {fix_data_type} {set_creation_options} {set_metadata_options} {path_src} {path_trg}".format(
-        fix_data_type="-ot Byte -scale 0 65635 0 255" if fix_data_type else "",
-        path_src=path_src_raw_img,
-        path_trg=path_trg_raw_img,
-        set_creation_options=" ".join(
-            ['-co "%s=%s"' % (el[0], el[1]) for el in CO_PARAMETER]
-        ),
-        set_metadata_options=" ".join(
-            ['-mo "%s=%s"' % (el[0], el[1]) for el in MO_PARAMETER]
-        ),
+    translate(
+        path_trg_raw_img,
+        path_src_raw_img,
+        stage="raw_image",
+        format="GTiff",
+        outputType=gdal.GDT_Byte if fix_data_type else gdal.GDT_Unknown,
+        scaleParams=[[0, 65635, 0, 255]] if fix_data_type else None,
+        creationOptions=["%s=%s" % (el[0], el[1]) for el in CO_PARAMETER],
+        metadataOptions=["%s=%s" % (el[0], el[1]) for el in MO_PARAMETER],
     )
 
-    try:
-        logger.debug(command)
-        subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output)
-        raise
-
     if not os.path.exists(path_trg_raw_img):
         raise Exception("Something went wrong while trying to process raw image.")
 
     return path_trg_raw_img
+
+
+def run_process_working_copy(path_raw_img, path_trg_working_copy, force=False):
+    """This action writes a tiled and compressed working copy with internal overviews of a processed raw image. The
+        raw image itself stays unchanged, while the working copy is read by the warping, the thumbnails and the zoomify
+        tiles.
+
+    :param path_raw_img: Path to the processed raw image
+    :type path_raw_img: str
+    :param path_trg_working_copy: Path of the working copy
+    :type path_trg_working_copy: str
+    :param force: Signals if the function should overwrite an already existing working copy (Default: False)
+    :type force: bool
+    :result: Path of the working copy
+    :rtype: str
+    """
+    if not os.path.exists(path_raw_img):
+        logger.debug('Could not find raw image "%s".' % path_raw_img)
+        return None
+
+    if os.path.exists(path_trg_working_copy) and force is False:
+        logger.debug(
+            'Skip processing of working copy "%s", because of an already existing image. Use "force" parameter in case you want to overwrite it.'
+            % path_trg_working_copy
+        )
+        return path_trg_working_copy
+
+    logger.info("Process working copy of raw image %s ..." % path_raw_img)
+    create_path_if_not_exists(os.path.dirname(path_trg_working_copy))
+    translate(
+        path_trg_working_copy,
+        path_raw_img,
+        stage="working_copy",
+        format="GTiff",
+        creationOptions=["%s=%s" % (el[0], el[1]) for el in WORKING_COPY_CO_PARAMETER],
+    )
+    _add_overviews(path_trg_working_copy)
+
+    if not os.path.exists(path_trg_working_copy):
+        raise Exception("Something went wrong while trying to process working copy.")
+
+    return path_trg_working_copy
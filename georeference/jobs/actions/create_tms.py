@@ -6,7 +6,6 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import os
-import shutil
 from pathlib import Path
 
 from loguru import logger
@@ -16,6 +15,7 @@ from georeference.config.paths import TMP_DIR
 from georeference.config.settings import get_settings
 from georeference.utils.georeference import reproject_image_from_4314_15869_to_3857
 from georeference.utils.proj import get_epsg_and_bbox_for_tif
+from georeference.utils.tile_archives import get_tms_outputs
 from georeference.utils.tms import calculate_compressed_tms
 from georeference.utils.utils import bbox_position
 
@@ -24,6 +24,9 @@ def run_process_tms(path_tms_dir, path_geo_image, force=False):
     """This actions generate a Tile Map Service (TMS) for a given geo services. It therefore heavily relies on the
         gdal utility tool, gdal2tiles. See also https://gdal.org/programs/gdal2tiles.html
 
+        Depending on TMS_ARCHIVE_FORMATS and TMS_DIRECTORY_OUTPUT the tiles are also or only written to single-file
+        archives next to the tms directory (see georeference.utils.tile_archives).
+
     :param path_tms_dir: Root path of the tms cache directory
     :type path_tms_dir: str
     :param path_geo_image: Path of the geo image
@@ -42,19 +45,19 @@ def run_process_tms(path_tms_dir, path_geo_image, force=False):
         )
         return None
 
-    if os.path.exists(path_tms_dir) and force is False:
+    settings = get_settings()
+    if (
+        all(os.path.exists(path) for path in get_tms_outputs(path_tms_dir))
+        and force is False
+    ):
         logger.debug(
             'Skip processing of tms for geo image "%s", because of an already existing tms. Use "force" parameter in case you want to overwrite it.'
             % path_tms_dir
         )
         return path_tms_dir
 
-    # In case a tms directory exist clean it
-    if os.path.exists(path_tms_dir):
-        shutil.rmtree(path_tms_dir)
-
+    # An existing tms directory is replaced atomically, after the new one was built
     logger.debug("Process tile map service (TMS) ...")
-    settings = get_settings()
 
     try:
         logger.debug(f"Detecting srs and bounding box for {path_geo_image}")
@@ -94,6 +97,8 @@ def run_process_tms(path_tms_dir, path_geo_image, force=False):
             path_geo_image,
             path_tms_dir,
             settings.GLOBAL_TMS_PROCESSES,
+            archive_formats=settings.TMS_ARCHIVE_FORMATS,
+            with_directory=settings.TMS_DIRECTORY_OUTPUT,
         )
 
         return path_tms_dir
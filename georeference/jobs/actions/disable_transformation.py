@@ -6,13 +6,13 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import os
-import shutil
 
 from loguru import logger
 
 from georeference.jobs.actions.update_index import run_update_index
 from georeference.models.georef_map import GeorefMap
 from georeference.models.raw_map import RawMap
+from georeference.utils.tile_archives import remove_tms_outputs
 from georeference.utils.utils import get_mapfile_path, get_tms_directory
 
 
@@ -48,10 +48,8 @@ def run_disable_transformation(transformation_obj, es_index, dbsession):
         dbsession.delete(georef_map_obj)
         dbsession.flush()
 
-    # Check if there is a tms and if yes remove it
-    tms_dir = get_tms_directory(raw_map_obj)
-    if os.path.isdir(tms_dir):
-        shutil.rmtree(tms_dir)
+    # Remove the tms, together with its versions and tile archives
+    remove_tms_outputs(get_tms_directory(raw_map_obj))
 
     # Check if there is a mapfile and remove it, if it exists
     mapfile = get_mapfile_path(raw_map_obj)
@@ -6,9 +6,11 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 from loguru import logger
 
+from georeference.config.settings import get_settings
 from georeference.jobs.actions.create_geo_image import run_process_geo_image
 from georeference.jobs.actions.create_geo_services import run_process_geo_services
 from georeference.jobs.actions.create_tms import run_process_tms
@@ -17,14 +19,55 @@ from georeference.models.georef_map import GeorefMap
 from georeference.models.metadata import Metadata
 from georeference.models.raw_map import RawMap
 from georeference.models.transformation import Transformation
+from georeference.utils.checkpoints import (
+    PipelineCheckpoint,
+    get_file_signature,
+    get_fingerprint,
+)
+from georeference.utils.metrics import stage_timer
+from georeference.utils.progress import submit_stage, wait_with_progress
 from georeference.utils.utils import (
     get_extent_as_geojson_polygon,
     get_mapfile_id,
     get_mapfile_path,
+    get_readable_raw_image_path,
     get_tms_directory,
 )
 
 
+def _restore_index(
+    es_index, raw_map_obj, georef_map_obj, previous_georef_state, dbsession
+):
+    """Writes the search document of the state of a georef map before the transformation was enabled.
+
+    :param es_index: Elsaticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param raw_map_obj: Raw map
+    :type raw_map_obj: georeference.models.raw_map.RawMap
+    :param georef_map_obj: Georef map
+    :type georef_map_obj: georeference.models.georef_map.GeorefMap
+    :param previous_georef_state: Previous transformation id and extent or None, if the georef map is new
+    :type previous_georef_state: (int, str)|None
+    :param dbsession: Database session
+    :type dbsession: sqlalchemy.orm.session.Session
+    """
+    try:
+        if previous_georef_state is None:
+            dbsession.delete(georef_map_obj)
+            georef_map_obj = None
+        else:
+            georef_map_obj.transformation_id, georef_map_obj.extent = (
+                previous_georef_state
+            )
+        dbsession.flush()
+        run_update_index(es_index, raw_map_obj, georef_map_obj, dbsession)
+    except Exception as e:
+        logger.info(
+            f"Error while trying to restore the search document of map {raw_map_obj.id}."
+        )
+        logger.error(e)
+
+
 def run_enable_transformation(transformation_obj, es_index, dbsession):
     """Enables a given transformation. This means it process a geo image based on the transformation and creates/updates
         the GeorefMap object. Further it creates a tms directories and the mapfiles for serving WMS / WCS services. It also
@@ -48,6 +91,14 @@ def run_enable_transformation(transformation_obj, es_index, dbsession):
     georef_map_obj = GeorefMap.by_raw_map_id(transformation_obj.raw_map_id, dbsession)
     metadata_obj = Metadata.by_map_id(raw_map_obj.id, dbsession)
 
+    # The previous state of the georef map is indexed again, if the tms stage fails after the search document was
+    # already updated
+    previous_georef_state = (
+        None
+        if georef_map_obj is None
+        else (georef_map_obj.transformation_id, georef_map_obj.extent)
+    )
+
     # In case a georefMapObj does not exist, create a new one
     if georef_map_obj is None:
         logger.debug(
@@ -59,47 +110,106 @@ def run_enable_transformation(transformation_obj, es_index, dbsession):
         dbsession.add(georef_map_obj)
         dbsession.flush()
 
-    # Make sure to process the geo image. We do not use the "force" parameter, which skips this
-    # step in case a geo image already exists
-    path_geo_image = run_process_geo_image(
-        transformation_obj,
-        raw_map_obj.get_abs_path(),
-        georef_map_obj.get_abs_path(),
-        force=True,
-        clip=Transformation.get_valid_clip_geometry(
+    clip = (
+        Transformation.get_valid_clip_geometry(
             georef_map_obj.transformation_id, dbsession=dbsession
         )
         if transformation_obj.clip is not None
-        else None,
+        else None
     )
 
-    logger.debug("Update the extent of the georef map object ...")
-    georef_map_obj.extent = json.dumps(
-        get_extent_as_geojson_polygon(georef_map_obj.get_abs_path())
+    # The stages write their outputs to disk. They are checkpointed, so that a retry of a failed job continues with
+    # the failed stage, as long as the inputs and the outputs of the completed stages are unchanged.
+    checkpoint = PipelineCheckpoint(
+        f"transformation_{transformation_obj.id}",
+        get_fingerprint(
+            {
+                "params": transformation_obj.params,
+                "target_crs": transformation_obj.target_crs,
+                "clip": clip,
+                "raw_image": get_file_signature(raw_map_obj.get_abs_path()),
+                "path_geo_image": georef_map_obj.get_abs_path(),
+            }
+        ),
     )
 
-    run_process_tms(get_tms_directory(raw_map_obj), path_geo_image, force=True)
+    # Make sure to process the geo image. We do not use the "force" parameter, which skips this
+    # step in case a geo image already exists
+    path_geo_image = checkpoint.run_stage(
+        "geo_image",
+        lambda: run_process_geo_image(
+            transformation_obj,
+            get_readable_raw_image_path(raw_map_obj.get_abs_path()),
+            georef_map_obj.get_abs_path(),
+            force=True,
+            clip=clip,
+        ),
+    )
 
     # Process the map file
-    run_process_geo_services(
-        get_mapfile_path(raw_map_obj),
-        path_geo_image,
-        get_mapfile_id(raw_map_obj),
-        raw_map_obj.file_name,
-        metadata_obj.title_short,
-        with_wcs=True,
-        force=True,
-    )
+    def run_mapfile_stage():
+        with stage_timer("mapfile"):
+            return run_process_geo_services(
+                get_mapfile_path(raw_map_obj),
+                path_geo_image,
+                get_mapfile_id(raw_map_obj),
+                raw_map_obj.file_name,
+                metadata_obj.title_short,
+                with_wcs=True,
+                force=True,
+            )
+
+    # The tms, the mapfile and the extent only depend on the geo image and are processed concurrently. The database
+    # session is only used from this thread. The progress of the other threads is written from this thread as well.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        tms_future = submit_stage(
+            executor,
+            checkpoint.run_stage,
+            "tms",
+            lambda: run_process_tms(
+                get_tms_directory(raw_map_obj), path_geo_image, force=True
+            ),
+            ["geo_image"],
+        )
+        mapfile_future = submit_stage(
+            executor, checkpoint.run_stage, "mapfile", run_mapfile_stage, ["geo_image"]
+        )
+        extent_future = submit_stage(
+            executor, get_extent_as_geojson_polygon, georef_map_obj.get_abs_path()
+        )
+
+        logger.debug("Update the extent of the georef map object ...")
+        georef_map_obj.extent = json.dumps(wait_with_progress(extent_future))
+        wait_with_progress(mapfile_future)
 
-    logger.info(f"{transformation_obj.id}")
+        logger.info(f"{transformation_obj.id}")
 
-    # Update the transformation_id
-    georef_map_obj.transformation_id = transformation_obj.id
+        # Update the transformation_id
+        georef_map_obj.transformation_id = transformation_obj.id
 
-    # Make sure that all changes are persistet to the database
-    dbsession.flush()
+        # Make sure that all changes are persistet to the database
+        dbsession.flush()
 
-    # Write document to es
-    run_update_index(es_index, raw_map_obj, georef_map_obj, dbsession)
+        # The search document is written as soon as the geo image and the mapfile exist, while the tiles are still
+        # rendered
+        with stage_timer("index"):
+            run_update_index(es_index, raw_map_obj, georef_map_obj, dbsession)
+
+        try:
+            wait_with_progress(tms_future)
+        except Exception:
+            # The database is rolled back, so the search document has to describe the previous state again
+            _restore_index(
+                es_index, raw_map_obj, georef_map_obj, previous_georef_state, dbsession
+            )
+            raise
+
+    # The search document lists the tile archives, which are only written by the tms stage
+    if len(get_settings().TMS_ARCHIVE_FORMATS) > 0:
+        with stage_timer("index"):
+            run_update_index(es_index, raw_map_obj, georef_map_obj, dbsession)
+
+    # All stages are completed, so a later run has to process everything again
+    checkpoint.clear()
 
     return transformation_obj
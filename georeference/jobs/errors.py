@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import errno
+
+from elasticsearch import exceptions as es_exceptions
+from sqlalchemy import exc as sa_exceptions
+
+from georeference.utils.es_bulk import BulkRejectedError
+
+# Errors of the file system, which are usually caused by a temporarily unavailable network share
+TRANSIENT_OS_ERRNOS = {
+    errno.EAGAIN,
+    errno.EBUSY,
+    errno.EIO,
+    errno.ESTALE,
+    errno.ETIMEDOUT,
+    errno.ENOTCONN,
+    errno.ECONNRESET,
+    errno.ECONNREFUSED,
+    errno.EHOSTUNREACH,
+}
+
+# HTTP status codes of elasticsearch, which signal a temporarily unavailable cluster
+TRANSIENT_ES_STATUS_CODES = {429, 502, 503, 504}
+
+
+class TransientJobError(Exception):
+    """Can be raised by a job, to signal that it failed because of a temporary problem and should be retried."""
+
+
+def is_transient_error(error):
+    """Classifies an error of a job. Transient errors are caused by temporarily unavailable services, like a restart
+        of elasticsearch, a failover of the database or a hiccup of a network share. All other errors are permanent.
+
+    :param error: Error raised by the job
+    :type error: Exception
+    :result: True if the job should be retried
+    :rtype: bool
+    """
+    if isinstance(error, (TransientJobError, BulkRejectedError)):
+        return True
+
+    # Connection errors and timeouts of elasticsearch are subclasses of the TransportError
+    if isinstance(
+        error, (es_exceptions.ConnectionError, es_exceptions.ConnectionTimeout)
+    ):
+        return True
+    if isinstance(error, es_exceptions.TransportError):
+        return error.status_code in TRANSIENT_ES_STATUS_CODES
+
+    if isinstance(
+        error, (sa_exceptions.OperationalError, sa_exceptions.InterfaceError)
+    ):
+        return True
+    if isinstance(error, sa_exceptions.DBAPIError):
+        return error.connection_invalidated
+
+    if isinstance(error, OSError):
+        return error.errno in TRANSIENT_OS_ERRNOS
+
+    return False
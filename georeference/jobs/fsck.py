@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from loguru import logger
+from sqlmodel import Session, select
+
+from georeference.config.paths import (
+    PATH_GEOREF_ROOT,
+    PATH_IMAGE_ROOT,
+    PATH_MAPFILE_ROOT,
+    PATH_THUMBNAIL_ROOT,
+    PATH_TMP_NEW_MAP_ROOT,
+    PATH_TMP_TRANSFORMATION_ROOT,
+    PATH_TMS_ROOT,
+    PATH_WORKING_COPY_ROOT,
+    PATH_ZOOMIFY_ROOT,
+)
+from georeference.config.settings import get_settings
+from georeference.config.templates import (
+    TEMPLATE_PUBLIC_THUMBNAIL_URL,
+    TEMPLATE_PUBLIC_ZOOMIFY_URL,
+)
+from georeference.models.enums import EnumJobState, EnumJobType
+from georeference.models.georef_map import GeorefMap
+from georeference.models.job import Job
+from georeference.models.metadata import Metadata
+from georeference.models.mosaic_map import MosaicMap
+from georeference.models.raw_map import RawMap
+from georeference.utils.tile_archives import get_tms_outputs
+
+# Roots of the derived artifacts and the depth of the items within them. The georef images, the tms caches and the
+# working copies of the raw images are placed in a directory per map type.
+ARTIFACT_ROOTS = {
+    "working_copy": (PATH_WORKING_COPY_ROOT, 2),
+    "georef": (PATH_GEOREF_ROOT, 2),
+    "tms": (PATH_TMS_ROOT, 2),
+    "mapfile": (PATH_MAPFILE_ROOT, 1),
+    "zoomify": (PATH_ZOOMIFY_ROOT, 1),
+    "thumbnail": (PATH_THUMBNAIL_ROOT, 1),
+}
+
+# Roots of temporary files, which are left over if an upload or a transformation preview was abandoned
+TMP_ROOTS = {
+    "upload_tmp": PATH_TMP_NEW_MAP_ROOT,
+    "map_services_tmp": PATH_TMP_TRANSFORMATION_ROOT,
+}
+
+# Artifacts, which are rebuilt by enabling the active transformation of a map
+TRANSFORMATION_ARTIFACTS = {"georef", "tms", "mapfile"}
+
+# Metadata links of the artifacts, which are rebuilt by a maps_update job
+METADATA_ARTIFACT_LINKS = {
+    "zoomify": "link_zoomify",
+    "thumbnail_small": "link_thumb_small",
+    "thumbnail_mid": "link_thumb_mid",
+}
+
+
+def _list_directory(path):
+    """Lists a directory. A missing directory is treated as empty.
+
+    :param path: Path of the directory
+    :type path: str
+    :result: Name, directory flag and modification time of the entries
+    :rtype: (str, bool, float)[]
+    """
+    try:
+        with os.scandir(path) as entries:
+            return [
+                (
+                    entry.name,
+                    entry.is_dir(follow_symlinks=False),
+                    entry.stat(follow_symlinks=False).st_mtime,
+                )
+                for entry in entries
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def _get_size(path):
+    """Returns the size of a file or the total size of all files within a directory.
+
+    :param path: Path of the file or directory
+    :type path: str
+    :result: Size in bytes
+    :rtype: int
+    """
+    try:
+        # Published artifact directories are symlinks to their current version
+        if os.path.islink(path) and os.path.isdir(path):
+            path = os.path.realpath(path)
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.lstat(path).st_size
+
+        size = 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    size += _get_size(entry.path)
+                else:
+                    size += entry.stat(follow_symlinks=False).st_size
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def _scan_roots(executor, roots):
+    """Lists the items of all roots in parallel.
+
+    :param executor: Thread pool
+    :type executor: concurrent.futures.ThreadPoolExecutor
+    :param roots: Path and depth of the items per root
+    :type roots: dict
+    :result: Modification time of the items per root. The items are relative paths.
+    :rtype: dict
+    """
+    listings = {
+        name: executor.submit(_list_directory, path)
+        for name, (path, _) in roots.items()
+    }
+
+    items = {name: {} for name in roots}
+    sub_listings = []
+    for name, (path, depth) in roots.items():
+        for entry_name, is_dir, mtime in listings[name].result():
+            # Hidden entries are versions and temporary files of the publishing (see georeference.utils.publish)
+            if entry_name.startswith("."):
+                continue
+            if depth > 1 and is_dir:
+                sub_listings.append(
+                    (
+                        name,
+                        entry_name,
+                        executor.submit(
+                            _list_directory, os.path.join(path, entry_name)
+                        ),
+                    )
+                )
+            else:
+                items[name][entry_name] = mtime
+
+    for name, directory, listing in sub_listings:
+        for entry_name, _, mtime in listing.result():
+            if not entry_name.startswith("."):
+                items[name][f"{directory}/{entry_name}"] = mtime
+    return items
+
+
+def _get_item_from_link(link, template):
+    """Returns the file name of an artifact from its public link, if the link points to this service.
+
+    :param link: Public link
+    :type link: str|None
+    :param template: Template of the public link
+    :type template: str
+    :result: File name or None if the link is missing or external
+    :rtype: str|None
+    """
+    prefix, suffix = template.split("{}", 1)
+    if link is None or not link.startswith(prefix) or not link.endswith(suffix):
+        return None
+    item = link[len(prefix) : len(link) - len(suffix)]
+    return item if len(item) > 0 and "/" not in item else None
+
+
+def _query_snapshot(dbsession):
+    """Queries the expected artifacts of all maps with a single query.
+
+    :param dbsession: Database session
+    :type dbsession: sqlalchemy.orm.session.Session
+    :result: Snapshot with the expected items per root, the known items and the raw maps
+    :rtype: dict
+    """
+    statement = (
+        select(
+            RawMap.id,
+            RawMap.map_type,
+            RawMap.file_name,
+            RawMap.rel_path,
+            GeorefMap.rel_path,
+            GeorefMap.transformation_id,
+            Metadata.link_zoomify,
+            Metadata.link_thumb_small,
+            Metadata.link_thumb_mid,
+        )
+        .outerjoin(GeorefMap, GeorefMap.raw_map_id == RawMap.id)
+        .outerjoin(Metadata, Metadata.raw_map_id == RawMap.id)
+    )
+
+    expected = {name: {} for name in ARTIFACT_ROOTS}
+    raw_maps = {}
+    for (
+        raw_map_id,
+        map_type,
+        file_name,
+        raw_map_rel_path,
+        georef_rel_path,
+        transformation_id,
+        link_zoomify,
+        link_thumb_small,
+        link_thumb_mid,
+    ) in dbsession.exec(statement):
+        raw_maps[raw_map_id] = {
+            "raw_image": os.path.join(PATH_IMAGE_ROOT, raw_map_rel_path),
+            "transformation_id": transformation_id,
+        }
+        # The working copy has the same relative path as the raw image (see get_working_copy_path)
+        expected["working_copy"][os.path.normpath(raw_map_rel_path)] = (
+            raw_map_id,
+            "working_copy",
+        )
+
+        if georef_rel_path is not None:
+            expected["georef"][os.path.normpath(georef_rel_path)] = (
+                raw_map_id,
+                "georef",
+            )
+            # The tms cache is a directory and/or single-file archives next to it
+            for item in get_tms_outputs(f"{str(map_type).lower()}/{file_name}"):
+                expected["tms"][item] = (raw_map_id, "tms")
+            expected["mapfile"][f"{raw_map_id}.map"] = (raw_map_id, "mapfile")
+
+        for artifact, link, template, root in [
+            ("zoomify", link_zoomify, TEMPLATE_PUBLIC_ZOOMIFY_URL, "zoomify"),
+            (
+                "thumbnail_small",
+                link_thumb_small,
+                TEMPLATE_PUBLIC_THUMBNAIL_URL,
+                "thumbnail",
+            ),
+            (
+                "thumbnail_mid",
+                link_thumb_mid,
+                TEMPLATE_PUBLIC_THUMBNAIL_URL,
+                "thumbnail",
+            ),
+        ]:
+            item = _get_item_from_link(link, template)
+            if item is not None:
+                expected[root][item] = (raw_map_id, artifact)
+
+    # The mapfiles of the mosaic maps are not derived from a raw map, but are not orphaned either
+    known = {name: set() for name in ARTIFACT_ROOTS}
+    for mosaic_map_obj in MosaicMap.all(dbsession):
+        known["mapfile"].add(f"{mosaic_map_obj.name}.map")
+
+    jobs = Job.all(dbsession)
+    return {
+        "expected": expected,
+        "known": known,
+        "raw_maps": raw_maps,
+        "busy_targets": {job.get_target(dbsession) for job in jobs},
+        "referenced_files": {
+            os.path.abspath(json.loads(job.description).get("file"))
+            for job in jobs
+            if job.type
+            in (EnumJobType.MAPS_CREATE.value, EnumJobType.MAPS_UPDATE.value)
+            and json.loads(job.description).get("file") is not None
+        },
+    }
+
+
+def _enqueue_repairs(dbsession, missing, snapshot):
+    """Adds the jobs, which rebuild the missing artifacts. Maps with unfinished jobs are skipped.
+
+    :param dbsession: Database session
+    :type dbsession: sqlalchemy.orm.session.Session
+    :param missing: Missing artifacts per raw map id
+    :type missing: dict
+    :param snapshot: Snapshot of the database
+    :type snapshot: dict
+    :result: Added jobs
+    :rtype: dict[]
+    """
+    repairs = []
+    for raw_map_id, artifacts in sorted(missing.items()):
+        raw_map = snapshot["raw_maps"][raw_map_id]
+        if ("raw_map", raw_map_id) in snapshot["busy_targets"]:
+            logger.info(
+                f"Skip repair of map {raw_map_id}, because it has unfinished jobs."
+            )
+            continue
+        if not os.path.exists(raw_map["raw_image"]):
+            logger.warning(
+                f"Skip repair of map {raw_map_id}, because the raw image is missing."
+            )
+            continue
+
+        descriptions = []
+        if len(artifacts & TRANSFORMATION_ARTIFACTS) > 0:
+            descriptions.append(
+                (
+                    EnumJobType.TRANSFORMATION_PROCESS.value,
+                    {"transformation_id": raw_map["transformation_id"]},
+                )
+            )
+
+        # Links set to null are regenerated by the maps_update job
+        links = {
+            METADATA_ARTIFACT_LINKS[artifact]: None
+            for artifact in sorted(artifacts & METADATA_ARTIFACT_LINKS.keys())
+        }
+        if len(links) > 0:
+            descriptions.append(
+                (
+                    EnumJobType.MAPS_UPDATE.value,
+                    {"map_id": raw_map_id, "metadata": links, "file": None},
+                )
+            )
+
+        for job_type, description in descriptions:
+            job = Job(
+                description=json.dumps(description),
+                type=job_type,
+                state=EnumJobState.NOT_STARTED.value,
+                submitted=datetime.now().isoformat(),
+                user_id="system",
+                comment="Repair of missing artifacts",
+            )
+            dbsession.add(job)
+            dbsession.flush()
+            Job.notify_listeners(dbsession, job_type)
+            repairs.append(
+                {"job_id": job.id, "type": job_type, "raw_map_id": raw_map_id}
+            )
+
+    dbsession.commit()
+    return repairs
+
+
+def run_fsck(dbsession, repair=False, tmp_max_age=None, workers=None):
+    """Compares the derived artifacts within the data directories with the database. It reports missing artifacts,
+        orphaned artifacts and stale temporary files with their sizes.
+
+    :param dbsession: Database session
+    :type dbsession: sqlalchemy.orm.session.Session
+    :param repair: Signals if jobs should be added, which rebuild the missing artifacts (Default: False)
+    :type repair: bool
+    :param tmp_max_age: Age in seconds after which temporary files are stale (Default: FSCK_TMP_MAX_AGE)
+    :type tmp_max_age: int|None
+    :param workers: Number of threads for scanning the directories (Default: FSCK_WORKERS)
+    :type workers: int|None
+    :result: Report
+    :rtype: dict
+    """
+    settings = get_settings()
+    tmp_max_age = tmp_max_age if tmp_max_age is not None else settings.FSCK_TMP_MAX_AGE
+    workers = workers if workers is not None else settings.FSCK_WORKERS
+
+    logger.info("Query the database snapshot ...")
+    snapshot = _query_snapshot(dbsession)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        logger.info("Scan the data directories ...")
+        items = _scan_roots(
+            executor,
+            {
+                **ARTIFACT_ROOTS,
+                **{name: (path, 1) for name, path in TMP_ROOTS.items()},
+            },
+        )
+
+        report = {"created": datetime.now().isoformat(), "roots": {}}
+        missing_per_map = {}
+        sizes = []
+        for name, (path, _) in ARTIFACT_ROOTS.items():
+            expected = snapshot["expected"][name]
+            missing = [
+                {"item": item, "raw_map_id": raw_map_id, "artifact": artifact}
+                for item, (raw_map_id, artifact) in sorted(expected.items())
+                if item not in items[name]
+            ]
+            orphaned = [
+                {"item": item}
+                for item in sorted(items[name])
+                if item not in expected and item not in snapshot["known"][name]
+            ]
+            for entry in missing:
+                missing_per_map.setdefault(entry["raw_map_id"], set()).add(
+                    entry["artifact"]
+                )
+            sizes += [(entry, os.path.join(path, entry["item"])) for entry in orphaned]
+            report["roots"][name] = {
+                "path": path,
+                "missing": missing,
+                "orphaned": orphaned,
+            }
+
+        now = time.time()
+        for name, path in TMP_ROOTS.items():
+            stale = [
+                {"item": item, "age": round(now - mtime)}
+                for item, mtime in sorted(items[name].items())
+                if now - mtime > tmp_max_age
+                and os.path.abspath(os.path.join(path, item))
+                not in snapshot["referenced_files"]
+            ]
+            sizes += [(entry, os.path.join(path, entry["item"])) for entry in stale]
+            report["roots"][name] = {"path": path, "stale": stale}
+
+        logger.info(f"Calculate the size of {len(sizes)} orphaned and stale items ...")
+        for entry, size in zip(
+            [entry for entry, _ in sizes],
+            executor.map(_get_size, [item_path for _, item_path in sizes]),
+        ):
+            entry["size"] = size
+
+    report["summary"] = {
+        name: {key: len(value) for key, value in root.items() if key != "path"}
+        for name, root in report["roots"].items()
+    }
+    report["summary"]["reclaimable_size"] = sum(entry["size"] for entry, _ in sizes)
+
+    report["repairs"] = (
+        _enqueue_repairs(dbsession, missing_per_map, snapshot) if repair else []
+    )
+    return report
+
+
+""" Main """
+if __name__ == "__main__":
+    from georeference.config.db import engine
+
+    parser = argparse.ArgumentParser(
+        description="Checks the derived artifacts within the data directories against the database and reports \
+        missing and orphaned artifacts as well as stale temporary files.",
+        prog="python -m georeference.jobs.fsck",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Add jobs, which rebuild the missing artifacts.",
+    )
+    parser.add_argument("--output", help="Path of the JSON report (Default: stdout)")
+    arguments = parser.parse_args()
+
+    with Session(engine) as session:
+        fsck_report = run_fsck(session, repair=arguments.repair)
+
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(fsck_report, f, indent=2)
+    else:
+        print(json.dumps(fsck_report, indent=2))
@@ -8,22 +8,34 @@
 import json
 import os
 from loguru import logger
+from sqlmodel import Session
 
 from georeference.config.paths import PATH_MOSAIC_ROOT
 from georeference.config.settings import get_settings
+from georeference.daemon.job_runner import try_lock_target
 from georeference.jobs.actions.create_geo_image import run_process_geo_image
 from georeference.jobs.actions.create_geo_services import run_process_geo_services
 from georeference.jobs.actions.create_tms import run_process_tms
 from georeference.jobs.process_create_mosaic_map import push_mosaic_to_es_index
+from georeference.models.catalog import iter_catalog
 from georeference.models.georef_map import GeorefMap
-from georeference.models.metadata import Metadata
+from georeference.models.job import Job
 from georeference.models.mosaic_map import MosaicMap
-from georeference.models.raw_map import RawMap
-from georeference.models.transformation import Transformation
+from georeference.utils.checkpoints import get_file_signature, get_fingerprint
+from georeference.utils.es_bulk import (
+    get_bulk_indexer_from_settings,
+    relaxed_index_settings,
+)
 from georeference.utils.es_index import (
+    create_index_version,
+    delete_old_index_versions,
     get_es_index_from_settings,
+    get_pending_index_version,
+    swap_index_alias,
+    get_es_index_uuid,
     generate_es_original_map_document,
 )
+from georeference.utils.manifest import ArtifactManifest
 from georeference.utils.mosaics import get_mosaic_dataset_path
 from georeference.utils.utils import (
     get_extent_as_geojson_polygon,
@@ -31,9 +43,87 @@ from georeference.utils.utils import (
     get_mapfile_path,
     get_mapfile_id,
     get_geometry,
+    get_readable_raw_image_path,
 )
 
 
+def _process_raw_map_artifacts(
+    raw_map_obj, georef_map_obj, metadata_obj, transformation_obj, clip, force=False
+):
+    """Makes sure that a geo image, a tms cache and geo service (mapfile) exist for a georeferenced map.
+
+    :param raw_map_obj: Raw map
+    :type raw_map_obj: georeference.models.raw_map.RawMap
+    :param georef_map_obj: Georef map
+    :type georef_map_obj: georeference.models.georef_map.GeorefMap
+    :param metadata_obj: Metadata
+    :type metadata_obj: georeference.models.metadata.Metadata
+    :param transformation_obj: Active transformation
+    :type transformation_obj: georeference.models.transformation.Transformation
+    :param clip: Valid clip geometry of the active transformation
+    :type clip: dict|None
+    :param force: Signals if existing artifacts should be overwritten (Default: False)
+    :type force: bool
+    :result: True if the geo image was (re)created
+    :rtype: bool
+    """
+    geo_image_signature = get_file_signature(georef_map_obj.get_abs_path())
+
+    # Make sure to process the geo image. We do not use the "force" parameter, which skips this
+    # step in case a geo image already exists
+    path_geo_image = run_process_geo_image(
+        transformation_obj,
+        get_readable_raw_image_path(raw_map_obj.get_abs_path()),
+        georef_map_obj.get_abs_path(),
+        force=force,
+        clip=clip,
+    )
+
+    logger.debug("Update the extent of the georef map object ...")
+    georef_map_obj.extent = json.dumps(
+        get_extent_as_geojson_polygon(georef_map_obj.get_abs_path())
+    )
+
+    # Process the tms cache
+    run_process_tms(
+        get_tms_directory(raw_map_obj),
+        path_geo_image,
+        force=force,
+    )
+
+    # Process the map file
+    run_process_geo_services(
+        get_mapfile_path(raw_map_obj),
+        path_geo_image,
+        get_mapfile_id(raw_map_obj),
+        raw_map_obj.file_name,
+        metadata_obj.title_short,
+        with_wcs=True,
+        force=force,
+    )
+
+    return get_file_signature(georef_map_obj.get_abs_path()) != geo_image_signature
+
+
+def _generate_raw_map_document(raw_map_obj, metadata_obj, georef_map_obj, geometry):
+    return generate_es_original_map_document(
+        raw_map_obj,
+        metadata_obj,
+        georef_map_obj=georef_map_obj
+        if georef_map_obj is not None and os.path.exists(georef_map_obj.get_abs_path())
+        else None,
+        geometry=geometry,
+    )
+
+
+def _get_raw_map_artifact_signatures(raw_map_obj, georef_map_obj):
+    return {
+        "geo_image": get_file_signature(georef_map_obj.get_abs_path()),
+        "tms": get_file_signature(get_tms_directory(raw_map_obj)),
+        "mapfile": get_file_signature(get_mapfile_path(raw_map_obj)),
+    }
+
+
 def run_initialize_data(dbsession):
     """This job checks the database and initially builds the index and missing georeference images.
 
@@ -42,108 +132,311 @@ def run_initialize_data(dbsession):
     :result: True if performed successfully
     :rtype: bool
     """
+    es_index = None
+    version_name = None
     try:
         logger.info("Run initialization job ...")
         logger.info("Create index ...")
-        es_index = get_es_index_from_settings(True)
+        es_index = get_es_index_from_settings(False)
 
-        logger.info("Start processing all single sheet maps ...")
-        for raw_map_obj in RawMap.all(dbsession):
-            logger.info(f"Initialize single sheet map with id {raw_map_obj.id} ...")
-            georef_map_obj = GeorefMap.by_raw_map_id(raw_map_obj.id, dbsession)
-            metadata_obj = Metadata.by_map_id(raw_map_obj.id, dbsession)
-
-            # If a georef map is registered within the database, make sure that also a geo image, a tms cache and
-            # geo service (mapfile) does exist.
-            if georef_map_obj is not None and os.path.exists(
-                raw_map_obj.get_abs_path()
-            ):
-                transformation_obj = Transformation.by_id(
-                    georef_map_obj.transformation_id, dbsession
-                )
-
-                # Make sure to process the geo image. We do not use the "force" parameter, which skips this
-                # step in case a geo image already exists
-                path_geo_image = run_process_geo_image(
-                    transformation_obj,
-                    raw_map_obj.get_abs_path(),
-                    georef_map_obj.get_abs_path(),
-                    clip=Transformation.get_valid_clip_geometry(
-                        georef_map_obj.transformation_id, dbsession=dbsession
+        # The index is rebuilt within a new version, or within the version created by a forced recreation, while the
+        # search still uses the current one. The refresh and the replicas are disabled until all documents are
+        # written.
+        settings = get_settings()
+        version_name = get_pending_index_version(
+            es_index, settings.ES_INDEX_NAME
+        ) or create_index_version(es_index, settings.ES_INDEX_NAME)
+        with relaxed_index_settings(
+            es_index, version_name
+        ), get_bulk_indexer_from_settings(es_index, version_name) as bulk_indexer:
+            logger.info("Start processing all single sheet maps ...")
+            for entry in iter_catalog(dbsession):
+                raw_map_obj = entry.raw_map
+                georef_map_obj = entry.georef_map
+                geometry = entry.get_geometry()
+                logger.info(f"Initialize single sheet map with id {raw_map_obj.id} ...")
+
+                # If a georef map is registered within the database, make sure that also a geo image, a tms cache and
+                # geo service (mapfile) does exist.
+                if georef_map_obj is not None and os.path.exists(
+                    raw_map_obj.get_abs_path()
+                ):
+                    is_new_geo_image = _process_raw_map_artifacts(
+                        raw_map_obj,
+                        georef_map_obj,
+                        entry.metadata,
+                        entry.transformation,
+                        entry.get_clip(),
                     )
-                    if transformation_obj.clip is not None
-                    else None,
-                )
-
-                logger.debug("Update the extent of the georef map object ...")
-                georef_map_obj.extent = json.dumps(
-                    get_extent_as_geojson_polygon(georef_map_obj.get_abs_path())
-                )
-
-                # Process the tms cache
-                run_process_tms(
-                    get_tms_directory(raw_map_obj),
-                    path_geo_image,
-                )
-
-                # Process the map file
-                run_process_geo_services(
-                    get_mapfile_path(raw_map_obj),
-                    path_geo_image,
-                    get_mapfile_id(raw_map_obj),
-                    raw_map_obj.file_name,
-                    metadata_obj.title_short,
-                    with_wcs=True,
-                )
-
-            # Synchronise the index with the current state of the raw map objects.
-            try:
-                logger.debug(
-                    f"Write search record for raw map id {raw_map_obj.id} to index ..."
-                )
-                document = generate_es_original_map_document(
-                    raw_map_obj,
-                    Metadata.by_map_id(raw_map_obj.id, dbsession),
-                    georef_map_obj=georef_map_obj
-                    if georef_map_obj is not None
-                    and os.path.exists(georef_map_obj.get_abs_path())
-                    else None,
-                    geometry=get_geometry(raw_map_obj.id, dbsession),
-                )
-                logger.debug(document)
-                settings = get_settings()
-                es_index.index(
-                    index=settings.ES_INDEX_NAME,
-                    doc_type=None,
-                    id=document["map_id"],
-                    body=document,
-                )
-            except Exception as e:
-                logger.info(
-                    "Error while trying to write single sheet document to index"
-                )
-                logger.error(e)
-        logger.info("Finish initializing single sheet maps.")
-
-        logger.info("Start processing all mosaic maps ...")
-        for mosaic_map_obj in MosaicMap.all(dbsession):
-            logger.info(f"Initialize mosaic map with id {mosaic_map_obj.id} ...")
-            try:
-                trg_mosaic_dataset = get_mosaic_dataset_path(
-                    PATH_MOSAIC_ROOT, mosaic_map_obj.name
-                )
-                push_mosaic_to_es_index(
-                    es_index=es_index,
-                    mosaic_map_obj=mosaic_map_obj,
-                    trg_mosaic_dataset=trg_mosaic_dataset,
-                )
-            except Exception as e:
-                logger.info("Error while trying to mosaic document to index")
-                logger.error(e)
-        logger.info("Finish initializing mosaic maps.")
 
+                    # A new geo image might have changed the extent
+                    if is_new_geo_image:
+                        geometry = get_geometry(raw_map_obj.id, dbsession)
+
+                # Synchronise the index with the current state of the raw map objects.
+                try:
+                    logger.debug(
+                        f"Write search record for raw map id {raw_map_obj.id} to index ..."
+                    )
+                    document = _generate_raw_map_document(
+                        raw_map_obj, entry.metadata, georef_map_obj, geometry
+                    )
+                    logger.debug(document)
+                    bulk_indexer.index(document["map_id"], document)
+                except Exception as e:
+                    logger.info(
+                        "Error while trying to write single sheet document to index"
+                    )
+                    logger.error(e)
+            logger.info("Finish initializing single sheet maps.")
+
+            logger.info("Start processing all mosaic maps ...")
+            for mosaic_map_obj in MosaicMap.all(dbsession):
+                logger.info(f"Initialize mosaic map with id {mosaic_map_obj.id} ...")
+                try:
+                    trg_mosaic_dataset = get_mosaic_dataset_path(
+                        PATH_MOSAIC_ROOT, mosaic_map_obj.name
+                    )
+                    push_mosaic_to_es_index(
+                        es_index=es_index,
+                        mosaic_map_obj=mosaic_map_obj,
+                        trg_mosaic_dataset=trg_mosaic_dataset,
+                        bulk_indexer=bulk_indexer,
+                    )
+                except Exception as e:
+                    logger.info("Error while trying to mosaic document to index")
+                    logger.error(e)
+            logger.info("Finish initializing mosaic maps.")
+
+        logger.info(
+            f"Indexed {bulk_indexer.indexed_count} documents, {len(bulk_indexer.errors)} failed."
+        )
+
+        logger.info(f"Switch the search index to version {version_name} ...")
+        swap_index_alias(es_index, settings.ES_INDEX_NAME, version_name)
+        version_name = None
+        delete_old_index_versions(es_index, settings.ES_INDEX_NAME)
         logger.info("Finish initialization job.")
         return True
     except Exception as e:
         logger.info("Error while trying to process initialisation job.")
         logger.error(e)
+
+        # The incomplete version is removed, the search keeps using the current one
+        if version_name is not None:
+            es_index.indices.delete(index=version_name, ignore=404)
+
+
+def _reconcile_raw_map(entry, manifest, bulk_indexer, dbsession):
+    raw_map_obj = entry.raw_map
+    georef_map_obj = entry.georef_map
+    geometry = entry.get_geometry()
+    key = f"raw_map:{raw_map_obj.id}"
+    manifest_entry = manifest.get(key)
+
+    if georef_map_obj is not None and os.path.exists(raw_map_obj.get_abs_path()):
+        fingerprint = get_fingerprint(
+            {
+                "transformation_id": georef_map_obj.transformation_id,
+                "raw_image": get_file_signature(raw_map_obj.get_abs_path()),
+            }
+        )
+        signatures = _get_raw_map_artifact_signatures(raw_map_obj, georef_map_obj)
+
+        if (
+            manifest_entry.get("fingerprint") != fingerprint
+            or manifest_entry.get("artifacts") != signatures
+        ):
+            # If the inputs have changed, but the artifacts are still the same as before, they are stale. Otherwise,
+            # they were updated by a job or are missing.
+            is_stale = (
+                "fingerprint" in manifest_entry
+                and manifest_entry["fingerprint"] != fingerprint
+                and manifest_entry.get("artifacts") == signatures
+            )
+            logger.info(
+                f"Process {'stale' if is_stale else 'missing or changed'} artifacts of map {raw_map_obj.id} ..."
+            )
+
+            # The catalog is streamed within another session, so the georef map is loaded for the update
+            georef_map_obj = GeorefMap.by_raw_map_id(raw_map_obj.id, dbsession)
+            _process_raw_map_artifacts(
+                raw_map_obj,
+                georef_map_obj,
+                entry.metadata,
+                entry.transformation,
+                entry.get_clip(),
+                force=is_stale,
+            )
+            dbsession.flush()
+            geometry = get_geometry(raw_map_obj.id, dbsession)
+            signatures = _get_raw_map_artifact_signatures(raw_map_obj, georef_map_obj)
+
+        manifest_entry["fingerprint"] = fingerprint
+        manifest_entry["artifacts"] = signatures
+    else:
+        manifest_entry.pop("fingerprint", None)
+        manifest_entry.pop("artifacts", None)
+
+    manifest.set(key, manifest_entry)
+
+    document = _generate_raw_map_document(
+        raw_map_obj, entry.metadata, georef_map_obj, geometry
+    )
+    document_fingerprint = get_fingerprint(document)
+    if manifest_entry.get("document") != document_fingerprint:
+        logger.debug(
+            f"Write search record for raw map id {raw_map_obj.id} to index ..."
+        )
+        bulk_indexer.index(
+            document["map_id"],
+            document,
+            on_success=lambda: manifest.set_document(key, document_fingerprint),
+        )
+
+
+def _reconcile_mosaic_map(mosaic_map_obj, manifest, es_index, bulk_indexer):
+    key = f"mosaic_map:{mosaic_map_obj.id}"
+    entry = manifest.get(key)
+
+    trg_mosaic_dataset = get_mosaic_dataset_path(PATH_MOSAIC_ROOT, mosaic_map_obj.name)
+    document_fingerprint = get_fingerprint(
+        {
+            "mosaic_map": mosaic_map_obj.model_dump(),
+            "dataset": get_file_signature(trg_mosaic_dataset),
+        }
+    )
+    if entry.get("document") != document_fingerprint:
+        push_mosaic_to_es_index(
+            es_index=es_index,
+            mosaic_map_obj=mosaic_map_obj,
+            trg_mosaic_dataset=trg_mosaic_dataset,
+            bulk_indexer=bulk_indexer,
+            on_success=lambda: manifest.set_document(key, document_fingerprint),
+        )
+
+
+def _reconcile_under_lock(dbsession, target, reconcile):
+    """Reconciles a map within a savepoint, which acquires the advisory lock of its target. If the reconciliation
+        fails, the savepoint and the lock are rolled back. Otherwise, the lock is held until the batch is committed.
+
+    :param dbsession: Database session object
+    :type dbsession: sqlalchemy.orm.session.Session
+    :param target: Target in the form (type, id)
+    :type target: (str, int)
+    :param reconcile: Function, which reconciles the map
+    :type reconcile: function
+    :result: True if the map was reconciled, False if the target is locked or busy
+    :rtype: bool
+    """
+    savepoint = dbsession.begin_nested()
+    if not try_lock_target(dbsession, target):
+        savepoint.rollback()
+        return False
+
+    try:
+        reconcile()
+    except Exception:
+        savepoint.rollback()
+        raise
+    savepoint.commit()
+    return True
+
+
+def _commit_batch(dbsession, bulk_indexer):
+    # The search documents are written before the locks are released, so that they can not overwrite the document
+    # of a job, which is claimed afterwards
+    bulk_indexer.flush()
+    dbsession.commit()
+
+
+def run_incremental_initialize_data(dbsession, es_index, manifest=None):
+    """Incremental variant of the initialization job. It compares the derived artifacts of all maps with the artifact
+        manifest and only processes artifacts and search documents, which are missing or stale. Maps with unfinished
+        jobs are skipped, as the jobs update them anyway. The maps are processed in batches. Each map of a batch
+        holds the advisory lock of its target until the search documents of the batch are written and the batch is
+        committed, so that no job for the map is claimed in the meantime.
+
+    :param dbsession: Database session object
+    :type dbsession: sqlalchemy.orm.session.Session
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param manifest: Artifact manifest (Default: manifest within the data directory)
+    :type manifest: georeference.utils.manifest.ArtifactManifest
+    :result: True if performed successfully
+    :rtype: bool
+    """
+    try:
+        logger.info("Run incremental initialization job ...")
+        manifest = manifest if manifest is not None else ArtifactManifest()
+        manifest.set_es_index_uuid(
+            get_es_index_uuid(es_index, get_settings().ES_INDEX_NAME)
+        )
+
+        busy_targets = set(Job.get_targets(Job.all(dbsession), dbsession).values())
+
+        with get_bulk_indexer_from_settings(es_index) as bulk_indexer:
+            locked_count = 0
+
+            # The catalog is streamed within its own session, because the changes of the maps are committed in batches
+            with Session(dbsession.get_bind()) as catalog_session:
+                for index, entry in enumerate(iter_catalog(catalog_session)):
+                    target = ("raw_map", entry.raw_map.id)
+                    if target in busy_targets:
+                        continue
+
+                    try:
+                        if _reconcile_under_lock(
+                            dbsession,
+                            target,
+                            lambda: _reconcile_raw_map(
+                                entry, manifest, bulk_indexer, dbsession
+                            ),
+                        ):
+                            locked_count += 1
+                    except Exception as e:
+                        logger.info(
+                            f"Error while trying to initialize map {entry.raw_map.id}."
+                        )
+                        logger.error(e)
+
+                    if locked_count >= bulk_indexer.batch_size:
+                        _commit_batch(dbsession, bulk_indexer)
+                        locked_count = 0
+
+                    # Persist the progress regularly, so that an interrupted run does not start from scratch
+                    if index % 100 == 99:
+                        manifest.save()
+
+            for mosaic_map_obj in MosaicMap.all(dbsession):
+                target = ("mosaic_map", mosaic_map_obj.id)
+                if target in busy_targets:
+                    continue
+
+                try:
+                    if _reconcile_under_lock(
+                        dbsession,
+                        target,
+                        lambda: _reconcile_mosaic_map(
+                            mosaic_map_obj, manifest, es_index, bulk_indexer
+                        ),
+                    ):
+                        locked_count += 1
+                except Exception as e:
+                    logger.info(
+                        f"Error while trying to initialize mosaic map {mosaic_map_obj.id}."
+                    )
+                    logger.error(e)
+
+                if locked_count >= bulk_indexer.batch_size:
+                    _commit_batch(dbsession, bulk_indexer)
+                    locked_count = 0
+
+            _commit_batch(dbsession, bulk_indexer)
+
+        manifest.save()
+        logger.info("Finish incremental initialization job.")
+        return True
+    except Exception as e:
+        logger.info("Error while trying to process incremental initialisation job.")
+        logger.error(e)
@@ -11,12 +11,19 @@ import os.path
 from loguru import logger
 
 from georeference.config.paths import create_path_if_not_exists, PATH_IMAGE_ROOT
-from georeference.jobs.actions.create_raw_image import run_process_raw_image
+from georeference.jobs.actions.create_raw_image import (
+    run_process_raw_image,
+    run_process_working_copy,
+)
 from georeference.jobs.actions.update_index import run_update_index
 from georeference.jobs.process_update_maps import generate_zoomify, generate_thumbnail
 from georeference.models.metadata import Metadata
 from georeference.models.raw_map import RawMap
-from georeference.utils.utils import without_keys, remove_if_exists
+from georeference.utils.utils import (
+    get_working_copy_path,
+    without_keys,
+    remove_if_exists,
+)
 
 
 def run_process_create_map(es_index, dbsession, job):
@@ -34,6 +41,7 @@ def run_process_create_map(es_index, dbsession, job):
     thumbnail_target_small = None
     thumbnail_target_mid = None
     processed_image_path = None
+    working_copy_path = None
     zoomify_target = None
 
     try:
@@ -58,25 +66,30 @@ def run_process_create_map(es_index, dbsession, job):
         processed_image_path = run_process_raw_image(
             description["file"], processed_image_path, force=False
         )
+        working_copy_path = run_process_working_copy(
+            processed_image_path,
+            get_working_copy_path(processed_image_path),
+            force=False,
+        )
 
         # 2. If not present, generate zoomify tiles
         if "link_zoomify" not in metadata:
             metadata["link_zoomify"] = generate_zoomify(
-                processed_image_path,
+                working_copy_path,
                 map_id,
             )
 
         # 3. If not present, generate thumbnails
         if "link_thumb_mid" not in metadata:
             metadata["link_thumb_mid"] = generate_thumbnail(
-                processed_image_path,
+                working_copy_path,
                 map_id,
                 400,
             )
 
         if "link_thumb_small" not in metadata:
             metadata["link_thumb_small"] = generate_thumbnail(
-                processed_image_path, map_id, 120
+                working_copy_path, map_id, 120
             )
 
         # 4. Insert Raw Map
@@ -116,6 +129,7 @@ def run_process_create_map(es_index, dbsession, job):
     except Exception as e:
         # cleanup leftover files
         remove_if_exists(processed_image_path)
+        remove_if_exists(working_copy_path)
         remove_if_exists(thumbnail_target_mid)
         remove_if_exists(thumbnail_target_small)
         remove_if_exists(zoomify_target)
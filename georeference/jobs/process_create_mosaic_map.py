@@ -13,7 +13,7 @@ from datetime import datetime
 
 from loguru import logger
 
-from georeference.config.paths import PATH_TMP_ROOT, PATH_MOSAIC_ROOT, PATH_MAPFILE_ROOT
+from georeference.config.paths import PATH_MOSAIC_ROOT, PATH_MAPFILE_ROOT
 from georeference.config.settings import get_settings
 from georeference.jobs.actions.create_mosaic_services import run_process_mosaic_services
 from georeference.models.enums import EnumJobType
@@ -25,6 +25,7 @@ from georeference.utils.mosaics import (
     get_mosaic_dataset_path,
     get_mosaic_mapfile_path,
 )
+from georeference.utils.publish import get_version_path, publish_directory
 from georeference.utils.utils import get_geometry_for_mosaic_map
 
 
@@ -49,14 +50,23 @@ def run_process_create_mosaic_map(es_index, dbsession, job):
     job_desc = json.loads(job.description)
     mosaic_map_obj = MosaicMap.by_id(job_desc["mosaic_map_id"], dbsession)
 
-    # TODOs (Do not forget that create is also update
-    # Precheck: In a higher order component it should make clear that, this job is only run once per daemon run
+    # Create is also update. Repeated jobs for the same mosaic map are merged by the daemon before dispatch (see
+    # Job.coalesce_not_started_jobs), so only the last one is processed.
 
+    tmp_dir = None
     try:
-        # 1. Create a tmp folder where to place the mosaic dataset
+        # 1. Create a tmp folder where to place the mosaic dataset. It is placed next to the versions of the mosaic
+        # dataset, so that it is on the same file system.
         logger.debug("Start creating mosaic dataset")
+        trg_mosaic_dataset = get_mosaic_dataset_path(
+            PATH_MOSAIC_ROOT, mosaic_map_obj.name
+        )
+        version_dir = get_version_path(os.path.dirname(trg_mosaic_dataset))
         tmp_dir = os.path.abspath(
-            tempfile.mkdtemp(prefix="run_process_create_mosiac_map", dir=PATH_TMP_ROOT)
+            tempfile.mkdtemp(
+                prefix="run_process_create_mosiac_map",
+                dir=os.path.dirname(version_dir),
+            )
         )
 
         # 2. Extract paths of geo_images
@@ -75,14 +85,12 @@ def run_process_create_mosaic_map(es_index, dbsession, job):
             target_crs=3857,
         )
 
-        # 4. Create the target directory of the mosaic dataset and mosaic service
-        trg_mosaic_dataset = get_mosaic_dataset_path(
-            PATH_MOSAIC_ROOT, mosaic_map_obj.name
-        )
+        # 4. Move the mosaic dataset to a new version. The VRT references its images relative to itself.
+        os.rename(os.path.dirname(tmp_mosaic_dataset), version_dir)
 
-        # 5. Copy or replace current mosaic dataset
-        logger.debug("Copy or replace current mosaic dataset ...")
-        _copy_mosaic_dataset(tmp_mosaic_dataset, trg_mosaic_dataset)
+        # 5. Publish the new version of the mosaic dataset
+        logger.debug("Publish mosaic dataset ...")
+        publish_directory(version_dir, os.path.dirname(trg_mosaic_dataset))
 
         # 6. Create the mapfile in a tmp folder
         logger.debug("Create mosaic service in tmp directory ...")
@@ -113,11 +121,13 @@ def run_process_create_mosaic_map(es_index, dbsession, job):
         logger.error(e)
         raise
     finally:
-        if os.path.exists(tmp_dir):
+        if tmp_dir is not None and os.path.exists(tmp_dir):
             shutil.rmtree(tmp_dir)
 
 
-def push_mosaic_to_es_index(es_index, mosaic_map_obj, trg_mosaic_dataset):
+def push_mosaic_to_es_index(
+    es_index, mosaic_map_obj, trg_mosaic_dataset, bulk_indexer=None, on_success=None
+):
     """Creates/Updates the document for a mosaic_map_obj at the es_index.
 
     :param es_index: Elasticsearch client
@@ -126,6 +136,10 @@ def push_mosaic_to_es_index(es_index, mosaic_map_obj, trg_mosaic_dataset):
     :type mosaic_map_obj: georeference.models.mosaic_maps.MosaicMap
     :param trg_mosaic_dataset: Path to the mosaic dataset
     :type trg_mosaic_dataset: str
+    :param bulk_indexer: If set, the document is added to the bulk indexer instead of being indexed directly
+    :type bulk_indexer: georeference.utils.es_bulk.BulkIndexer|None
+    :param on_success: Function, which is called after the document was indexed
+    :type on_success: function|None
     """
     search_geometry = get_geometry_for_mosaic_map(trg_mosaic_dataset)
     es_document = generate_es_mosaic_map_document(
@@ -134,17 +148,13 @@ def push_mosaic_to_es_index(es_index, mosaic_map_obj, trg_mosaic_dataset):
     )
     es_document_id = es_document["map_id"]
     logger.debug(f"Push document with id {es_document_id} to index: {es_document} ...")
+    if bulk_indexer is not None:
+        bulk_indexer.index(es_document_id, es_document, on_success=on_success)
+        return
+
     settings = get_settings()
     es_index.index(
         index=settings.ES_INDEX_NAME, doc_type=None, id=es_document_id, body=es_document
     )
-
-
-def _copy_mosaic_dataset(source_path, target_path):
-    source_parent_dir = os.path.dirname(source_path)
-    target_parent_dir = os.path.dirname(target_path)
-
-    if os.path.exists(target_parent_dir):
-        shutil.rmtree(target_parent_dir)
-
-    shutil.copytree(source_parent_dir, target_parent_dir)
+    if on_success is not None:
+        on_success()
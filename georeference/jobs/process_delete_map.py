@@ -15,7 +15,14 @@ from georeference.config.settings import get_settings
 from georeference.models.georef_map import GeorefMap
 from georeference.models.raw_map import RawMap
 from georeference.utils.parser import to_public_map_id
-from georeference.utils.utils import get_thumbnail_path, get_zoomify_path
+from georeference.utils.tile_archives import remove_tms_outputs
+from georeference.utils.utils import (
+    get_mapfile_path,
+    get_thumbnail_path,
+    get_tms_directory,
+    get_working_copy_path,
+    get_zoomify_path,
+)
 
 
 def run_process_delete_maps(es_index, dbsession, job):
@@ -43,8 +50,12 @@ def run_process_delete_maps(es_index, dbsession, job):
         # 2. Delete raw map and through cascade also the georef map, the transformations and the metadata
         raw_map = RawMap.by_id(map_id, dbsession)
         raw_map_path = None
+        tms_path = None
+        mapfile_path = None
         if raw_map is not None:
             raw_map_path = raw_map.get_abs_path()
+            tms_path = get_tms_directory(raw_map)
+            mapfile_path = get_mapfile_path(raw_map)
         dbsession.delete(raw_map)
 
         # already commit this changes here, so the db session does not get rolled back if something
@@ -83,6 +94,18 @@ def run_process_delete_maps(es_index, dbsession, job):
         if raw_map_path is not None and os.path.exists(raw_map_path):
             os.remove(raw_map_path)
 
+        # 4 e) delete the working copy of the preprocessed map file
+        if raw_map_path is not None and os.path.exists(
+            get_working_copy_path(raw_map_path)
+        ):
+            os.remove(get_working_copy_path(raw_map_path))
+
+        # 4 f) delete the tms, together with its versions and tile archives, and the mapfile
+        if tms_path is not None:
+            remove_tms_outputs(tms_path)
+        if mapfile_path is not None and os.path.exists(mapfile_path):
+            os.remove(mapfile_path)
+
         logger.debug("Finished processing delete_map job.")
 
     except Exception as e:
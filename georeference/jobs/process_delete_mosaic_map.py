@@ -7,7 +7,6 @@
 # "LICENSE", which is part of this source code package
 import json
 import os
-import shutil
 
 from loguru import logger
 
@@ -17,6 +16,7 @@ from georeference.models.enums import EnumJobType
 from georeference.models.mosaic_map import MosaicMap
 from georeference.utils.mosaics import get_mosaic_dataset_path, get_mosaic_mapfile_path
 from georeference.utils.parser import to_public_mosaic_map_id
+from georeference.utils.publish import unpublish
 
 
 def run_process_delete_mosaic_map(es_index, dbsession, job):
@@ -77,8 +77,8 @@ def run_process_delete_mosaic_map(es_index, dbsession, job):
         # Remove mosaic map dataset
         trg_mosaic_dataset = get_mosaic_dataset_path(PATH_MOSAIC_ROOT, mosaic_map_name)
         logger.debug(f"Remove mosaic dataset {trg_mosaic_dataset} ...")
-        if os.path.exists(trg_mosaic_dataset):
-            shutil.rmtree(os.path.dirname(trg_mosaic_dataset))
+        if os.path.lexists(os.path.dirname(trg_mosaic_dataset)):
+            unpublish(os.path.dirname(trg_mosaic_dataset))
 
     except Exception as e:
         logger.info("Error while running the daemon")
@@ -21,7 +21,10 @@ from georeference.config.templates import (
     TEMPLATE_PUBLIC_THUMBNAIL_URL,
     TEMPLATE_PUBLIC_ZOOMIFY_URL,
 )
-from georeference.jobs.actions.create_raw_image import run_process_raw_image
+from georeference.jobs.actions.create_raw_image import (
+    run_process_raw_image,
+    run_process_working_copy,
+)
 from georeference.jobs.actions.create_thumbnail import run_process_thumbnail
 from georeference.jobs.actions.create_zoomify_tiles import run_process_zoomify_tiles
 from georeference.jobs.actions.update_index import run_update_index
@@ -31,7 +34,9 @@ from georeference.models.raw_map import RawMap
 from georeference.models.transformation import Transformation
 from georeference.utils.utils import (
     without_keys,
+    get_readable_raw_image_path,
     get_thumbnail_path,
+    get_working_copy_path,
     get_zoomify_path,
     remove_if_exists,
 )
@@ -80,6 +85,11 @@ def run_process_update_maps(es_index, dbsession, job):
         processed_image_path = run_process_raw_image(
             description["file"], processed_image_path, force=True
         )
+        run_process_working_copy(
+            processed_image_path,
+            get_working_copy_path(processed_image_path),
+            force=True,
+        )
 
         raw_map_updates["file_name"] = os.path.splitext(
             processed_image_path.split(os.sep)[-1]
@@ -88,6 +98,9 @@ def run_process_update_maps(es_index, dbsession, job):
             processed_image_path, PATH_IMAGE_ROOT
         )
 
+    # The zoomify tiles and thumbnails are generated from the working copy of the raw image
+    readable_image_path = get_readable_raw_image_path(processed_image_path)
+
     # handle link updates if necessary
     internal_thumbnail_base_url = _get_base_url(TEMPLATE_PUBLIC_THUMBNAIL_URL)
     internal_zoomify_base_url = _get_base_url(TEMPLATE_PUBLIC_ZOOMIFY_URL)
@@ -99,9 +112,7 @@ def run_process_update_maps(es_index, dbsession, job):
         internal_zoomify_base_url,
         is_file_updated,
     ):
-        metadata_updates["link_zoomify"] = generate_zoomify(
-            processed_image_path, map_id
-        )
+        metadata_updates["link_zoomify"] = generate_zoomify(readable_image_path, map_id)
 
     if _should_generate_files(
         metadata,
@@ -111,7 +122,7 @@ def run_process_update_maps(es_index, dbsession, job):
         is_file_updated,
     ):
         metadata_updates["link_thumb_small"] = generate_thumbnail(
-            processed_image_path, map_id, 120
+            readable_image_path, map_id, 120
         )
 
     if _should_generate_files(
@@ -122,7 +133,7 @@ def run_process_update_maps(es_index, dbsession, job):
         is_file_updated,
     ):
         metadata_updates["link_thumb_mid"] = generate_thumbnail(
-            processed_image_path, map_id, 400
+            readable_image_path, map_id, 400
         )
 
     # Write updates to db
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func, literal_column
+from sqlmodel import Session, desc, select
+
+from georeference.models.georef_map import GeorefMap
+from georeference.models.metadata import Metadata
+from georeference.models.raw_map import RawMap
+from georeference.models.transformation import Transformation
+from georeference.utils.utils import fix_polygon_geometry
+
+# Largest polygon of the valid clip of the active transformation. This mirrors Transformation.get_valid_clip_geometry
+# as a correlated subquery.
+VALID_CLIP_GEOJSON = literal_column(
+    "(SELECT st_asgeojson(st_geometryn(st_makevalid(transformations.clip), n)) "
+    "FROM generate_series(1, st_numgeometries(st_makevalid(transformations.clip))) AS n "
+    "ORDER BY st_area(st_geometryn(st_makevalid(transformations.clip), n)) DESC LIMIT 1)"
+)
+
+
+class CatalogEntry(NamedTuple):
+    raw_map: RawMap
+    metadata: Optional[Metadata]
+    georef_map: Optional[GeorefMap]
+    transformation: Optional[Transformation]
+    # Valid clip polygon of the active transformation and the envelope of the extent as GeoJSON strings
+    clip_geojson: Optional[str]
+    extent_geojson: Optional[str]
+
+    def get_clip(self):
+        """Returns the valid clip geometry of the active transformation, if the transformation has a clip.
+
+        :result: GeoJSON geometry
+        :rtype: dict|None
+        """
+        if self.transformation is None or self.transformation.clip is None:
+            return None
+        return json.loads(self.clip_geojson) if self.clip_geojson is not None else None
+
+    def get_geometry(self):
+        """Returns the search geometry of the map. It is the clip polygon of the active transformation or, if there
+            is none, the envelope of the extent. Equivalent to georeference.utils.utils.get_geometry.
+
+        :result: GeoJSON geometry
+        :rtype: dict|None
+        """
+        if self.georef_map is None:
+            return None
+        if self.clip_geojson is not None:
+            return fix_polygon_geometry(json.loads(self.clip_geojson))
+        return (
+            json.loads(self.extent_geojson) if self.extent_geojson is not None else None
+        )
+
+
+def iter_catalog(dbsession: Session, batch_size: int = 500):
+    """Iterates over all raw maps together with their metadata, georef map, active transformation, clip and extent.
+        Everything is loaded with one query, which is streamed via a server side cursor. The session must not be
+        committed or rolled back while iterating.
+
+    :param dbsession: Database session
+    :type dbsession: sqlalchemy.orm.session.Session
+    :param batch_size: Number of rows fetched at once
+    :type batch_size: int
+    :result: Catalog entries ordered by descending raw map id
+    :rtype: Iterator[georeference.models.catalog.CatalogEntry]
+    """
+    statement = (
+        select(
+            RawMap,
+            Metadata,
+            GeorefMap,
+            Transformation,
+            VALID_CLIP_GEOJSON.label("clip_geojson"),
+            func.ST_AsGeoJSON(
+                func.ST_Envelope(func.ST_Transform(GeorefMap.__table__.c.extent, 4326))
+            ).label("extent_geojson"),
+        )
+        .outerjoin(Metadata, Metadata.raw_map_id == RawMap.id)
+        .outerjoin(GeorefMap, GeorefMap.raw_map_id == RawMap.id)
+        .outerjoin(Transformation, Transformation.id == GeorefMap.transformation_id)
+        .order_by(desc(RawMap.id))
+        .execution_options(yield_per=batch_size)
+    )
+
+    for row in dbsession.exec(statement):
+        yield CatalogEntry(*row)
@@ -23,4 +23,6 @@ class EnumJobType(Enum, metaclass=EnumMeta):
 class EnumJobState(Enum, metaclass=EnumMeta):
     COMPLETED = "completed"
     FAILED = "failed"
+    IN_PROGRESS = "in_progress"
+    MERGED = "merged"
     NOT_STARTED = "not_started"
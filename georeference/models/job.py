@@ -5,40 +5,374 @@
 #
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
-from sqlmodel import Field, Session, select, asc, col, cast, SQLModel
-from sqlalchemy import Integer
+import json
+from typing import Optional
 
-from datetime import datetime
+from pydantic import NaiveDatetime
+from sqlmodel import Field, Session, select, asc, col, cast, SQLModel, update
+from sqlalchemy import Integer, func, text
+
+from datetime import datetime, timedelta
 
 from sqlalchemy.dialects.postgresql import JSON
 
+from georeference.models import datetime_without_timezone, varchar_255
+
 from georeference.models.enums import EnumJobType, EnumJobState
 from georeference.models.mixins import JobMixin
 from georeference.models.transformation import Transformation
 from georeference.schemas.job_payload import JobPayload
 
+# Name of the PostgreSQL channel, which is used to signal the daemon that new jobs were added
+JOBS_NOTIFY_CHANNEL = "jobs"
+
+# Job types, where a later job for the same map or mosaic map supersedes all earlier ones. For all other job types,
+# only identical duplicates are merged.
+SUPERSEDING_JOB_TYPES = [
+    EnumJobType.TRANSFORMATION_PROCESS.value,
+    EnumJobType.MOSAIC_MAP_CREATE.value,
+]
+
+# Job types, which are never merged, because each job carries its own payload (e.g. an uploaded file)
+NOT_MERGEABLE_JOB_TYPES = [
+    EnumJobType.MAPS_CREATE.value,
+    EnumJobType.MAPS_UPDATE.value,
+]
+
 
 class Job(SQLModel, JobMixin, table=True):
     __tablename__ = "jobs"
     id: int = Field(default=None, sa_type=Integer, primary_key=True)
+    # Worker, which currently processes the job, and the time until its lease is valid
+    lease_owner: Optional[str] = varchar_255
+    lease_expires_at: Optional[NaiveDatetime] = datetime_without_timezone
+    # Number of failed attempts and the earliest time of the next attempt of a job, which failed with a transient error
+    attempts: int = Field(default=0, sa_type=Integer)
+    next_attempt_at: Optional[NaiveDatetime] = datetime_without_timezone
+    # Current stage of a running job and its progress in percent
+    stage: Optional[str] = varchar_255
+    progress: Optional[int] = Field(default=None, sa_type=Integer)
 
     @classmethod
     def all(cls, session: Session):
         return session.exec(select(Job)).all()
 
     @classmethod
-    def has_not_started_jobs_for_map_id(cls, session: Session, map_id: int):
-        """Checks if there are pending jobs for a given map id.
+    def query_not_started_jobs(cls, job_types: list[EnumJobType], session: Session):
+        """Query unprocessed jobs for a given list of job types.
 
+        :param job_types: List of job types
+        :type job_types: EnumJobName[]
         :param session: Database session
         :type session: sqlalchemy.orm.session.Session
-        :param map_id: Id of the original map
-        :type map_id: int
+        :param logger: Logger
+        """
+        statement = (
+            select(Job)
+            .where(Job.state == EnumJobState.NOT_STARTED.value)
+            .where(col(Job.type).in_(job_types))
+            .where(
+                col(Job.next_attempt_at).is_(None)
+                | (Job.next_attempt_at <= func.localtimestamp())
+            )
+            .order_by(asc(Job.id))
+        )
+
+        return session.exec(statement).all()
+
+    @classmethod
+    def query_queue_statistics(cls, session: Session):
+        """Query the number of unprocessed jobs and the submission time of the oldest one per job type.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :result: Map of job type to a tuple of job count and oldest submission time
+        :rtype: dict<str, (int, datetime)>
+        """
+        statement = (
+            select(Job.type, func.count(Job.id), func.min(Job.submitted))
+            .where(Job.state == EnumJobState.NOT_STARTED.value)
+            .group_by(Job.type)
+        )
+
+        return {
+            job_type: (count, oldest)
+            for job_type, count, oldest in session.exec(statement).all()
+        }
+
+    @classmethod
+    def coalesce_not_started_jobs(cls, session: Session):
+        """Merges superseded jobs into the effective last job for the same map or mosaic map. A job is only merged
+            into the next job for the same target, so the order of different job types for a target is preserved.
+            Merged jobs are moved to the jobs_history with the state "merged". Jobs locked by a worker are skipped.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :result: Count of merged jobs
+        :rtype: int
+        """
+        statement = (
+            select(Job)
+            .where(Job.state == EnumJobState.NOT_STARTED.value)
+            .order_by(asc(Job.id))
+            .with_for_update(skip_locked=True)
+        )
+        jobs = session.exec(statement).all()
+
+        # Walk backwards through the queue and remember the next job for each target
+        targets = Job.get_targets(jobs, session)
+        next_job_by_target = {}
+        merged_count = 0
+        for job in reversed(jobs):
+            target = targets[job.id]
+            if target is None:
+                continue
+
+            next_job = next_job_by_target.get(target)
+            if next_job is None or not next_job.supersedes(job):
+                next_job_by_target[target] = job
+                continue
+
+            session.add(
+                JobHistory.from_job(
+                    job,
+                    state=EnumJobState.MERGED.value,
+                    comment=f"Merged into job {next_job.id}.",
+                )
+            )
+            session.delete(job)
+            merged_count += 1
+
+        session.flush()
+        return merged_count
+
+    def supersedes(self, job):
+        """Checks if this job makes a given earlier job for the same target obsolete.
+
+        :param job: Earlier job
+        :type job: georeference.models.job.Job
         :result: True | False
         :rtype: bool
         """
+        if self.type != job.type or self.type in NOT_MERGEABLE_JOB_TYPES:
+            return False
+
+        if self.type in SUPERSEDING_JOB_TYPES:
+            return True
+
+        try:
+            return json.loads(self.description) == json.loads(job.description)
+        except (TypeError, json.JSONDecodeError):
+            return self.description == job.description
+
+    def acquire_lease(self, session: Session, lease_owner: str, lease_duration: int):
+        """Marks the job as in progress for a given worker. The lease has to be renewed by the worker before it
+            expires, otherwise the job is reclaimed.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param lease_owner: Identifier of the worker
+        :type lease_owner: str
+        :param lease_duration: Seconds until the lease expires
+        :type lease_duration: int
+        """
+        self.state = EnumJobState.IN_PROGRESS.value
+        self.lease_owner = lease_owner
+        self.stage = None
+        self.progress = None
+        self.lease_expires_at = func.localtimestamp() + timedelta(
+            seconds=lease_duration
+        )
+        session.flush()
+
+    def schedule_retry(self, session: Session, backoff: int, comment: str):
+        """Returns a failed job to the queue. It is not picked up again before the backoff has elapsed.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param backoff: Seconds until the next attempt
+        :type backoff: int
+        :param comment: Error of the failed attempt
+        :type comment: str
+        """
+        self.state = EnumJobState.NOT_STARTED.value
+        self.attempts += 1
+        self.next_attempt_at = func.localtimestamp() + timedelta(seconds=backoff)
+        self.lease_owner = None
+        self.lease_expires_at = None
+        self.comment = comment
+        session.flush()
+
+    @classmethod
+    def renew_lease(
+        cls, job_id: int, lease_owner: str, lease_duration: int, session: Session
+    ):
+        """Extends the lease of a job, as long as it is still owned by the given worker.
+
+        :param job_id: Id of the job
+        :type job_id: int
+        :param lease_owner: Identifier of the worker
+        :type lease_owner: str
+        :param lease_duration: Seconds until the lease expires
+        :type lease_duration: int
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :result: True if the lease was renewed
+        :rtype: bool
+        """
+        statement = (
+            update(Job)
+            .where(Job.id == job_id)
+            .where(Job.state == EnumJobState.IN_PROGRESS.value)
+            .where(Job.lease_owner == lease_owner)
+            .values(
+                lease_expires_at=func.localtimestamp()
+                + timedelta(seconds=lease_duration)
+            )
+        )
+        return session.execute(statement).rowcount == 1
+
+    @classmethod
+    def update_progress(
+        cls,
+        job_id: int,
+        lease_owner: str,
+        stage: str,
+        progress: Optional[int],
+        session: Session,
+    ):
+        """Updates the stage and progress of a job, as long as it is owned by the given worker.
+
+        :param job_id: Id of the job
+        :type job_id: int
+        :param lease_owner: Identifier of the worker
+        :type lease_owner: str
+        :param stage: Name of the current stage
+        :type stage: str
+        :param progress: Progress of the stage in percent
+        :type progress: int|None
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        """
+        statement = (
+            update(Job)
+            .where(Job.id == job_id)
+            .where(Job.state == EnumJobState.IN_PROGRESS.value)
+            .where(Job.lease_owner == lease_owner)
+            .values(stage=stage, progress=progress)
+        )
+        session.execute(statement)
+
+    @classmethod
+    def _reclaim_leased_jobs(cls, session: Session, condition, max_attempts: int):
+        """Returns leased jobs, whose worker is gone, to the queue. Every reclaim counts as an attempt, so that a job
+            which reliably crashes its worker is moved to the jobs_history as failed after max_attempts attempts.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param condition: Filter for the jobs in progress, which should be reclaimed
+        :type condition: sqlalchemy.sql.ColumnElement
+        :param max_attempts: Maximum number of attempts of a job
+        :type max_attempts: int
+        :result: Count of reclaimed jobs
+        :rtype: int
+        """
         statement = (
-            select(Job.id, Transformation.id)
+            select(Job)
+            .where(Job.state == EnumJobState.IN_PROGRESS.value)
+            .where(condition)
+            .with_for_update(skip_locked=True)
+        )
+        jobs = session.exec(statement).all()
+
+        for job in jobs:
+            job.attempts += 1
+            if job.attempts >= max_attempts:
+                session.add(
+                    JobHistory.from_job(
+                        job,
+                        state=EnumJobState.FAILED.value,
+                        comment=f"The worker {job.lease_owner} did not finish the job within {job.attempts} attempts.",
+                    )
+                )
+                session.delete(job)
+                continue
+
+            job.state = EnumJobState.NOT_STARTED.value
+            job.lease_owner = None
+            job.lease_expires_at = None
+            job.stage = None
+            job.progress = None
+
+        session.flush()
+        return len(jobs)
+
+    @classmethod
+    def reclaim_expired_leases(cls, session: Session, max_attempts: int):
+        """Resets jobs, whose worker did not renew the lease in time (e.g. because the worker crashed), so that
+            they are processed again. Jobs, which reached max_attempts, are failed instead.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param max_attempts: Maximum number of attempts of a job
+        :type max_attempts: int
+        :result: Count of reclaimed jobs
+        :rtype: int
+        """
+        return cls._reclaim_leased_jobs(
+            session, Job.lease_expires_at < func.localtimestamp(), max_attempts
+        )
+
+    @classmethod
+    def release_leases(
+        cls, session: Session, lease_owners: list[str], max_attempts: int
+    ):
+        """Returns the jobs of workers, which are known to be gone, to the queue without waiting for their leases
+            to expire. Jobs, which reached max_attempts, are failed instead.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param lease_owners: Identifiers of the workers
+        :type lease_owners: str[]
+        :param max_attempts: Maximum number of attempts of a job
+        :type max_attempts: int
+        :result: Count of released jobs
+        :rtype: int
+        """
+        return cls._reclaim_leased_jobs(
+            session, col(Job.lease_owner).in_(lease_owners), max_attempts
+        )
+
+    @classmethod
+    def query_in_progress_jobs(cls, session: Session):
+        """Query jobs, which are currently processed by a worker with a valid lease.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :result: Jobs in progress
+        :rtype: georeference.models.job.Job[]
+        """
+        statement = (
+            select(Job)
+            .where(Job.state == EnumJobState.IN_PROGRESS.value)
+            .where(Job.lease_expires_at >= func.localtimestamp())
+        )
+
+        return session.exec(statement).all()
+
+    @classmethod
+    def query_transformation_job_for_map_id(cls, session: Session, map_id: int):
+        """Query the oldest transformation job for a given map id.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param map_id: Id of the original map
+        :type map_id: int
+        :result: Job or None
+        :rtype: georeference.models.job.Job|None
+        """
+        statement = (
+            select(Job)
             .join(
                 Transformation,
                 cast((cast(Job.description, JSON)["transformation_id"]).astext, Integer)
@@ -46,30 +380,112 @@ class Job(SQLModel, JobMixin, table=True):
             )
             .where(Job.type == EnumJobType.TRANSFORMATION_PROCESS.value)
             .where(Transformation.raw_map_id == map_id)
+            .order_by(asc(Job.id))
         )
 
-        result = session.exec(statement).first()
-
-        return result is not None
+        return session.exec(statement).first()
 
     @classmethod
-    def query_not_started_jobs(cls, job_types: list[EnumJobType], session: Session):
-        """Query unprocessed jobs for a given list of job types.
+    def lock_not_started_by_id(cls, job_id: int, session: Session):
+        """Locks the row of an unprocessed job with "FOR UPDATE SKIP LOCKED". The lock is held until the session
+            commits or rolls back.
 
-        :param job_types: List of job types
-        :type job_types: EnumJobName[]
+        :param job_id: Id of the job
+        :type job_id: int
         :param session: Database session
         :type session: sqlalchemy.orm.session.Session
-        :param logger: Logger
+        :result: Locked job or None if the job is already locked or processed
+        :rtype: georeference.models.job.Job|None
         """
         statement = (
             select(Job)
+            .where(Job.id == job_id)
             .where(Job.state == EnumJobState.NOT_STARTED.value)
-            .where(col(Job.type).in_(job_types))
-            .order_by(asc(Job.id))
+            .with_for_update(skip_locked=True)
         )
 
-        return session.exec(statement).all()
+        return session.exec(statement).first()
+
+    def _get_target_from_description(self):
+        # Transformation jobs are returned as ("transformation", id) and have to be resolved to their raw map
+        try:
+            description = json.loads(self.description)
+        except (TypeError, json.JSONDecodeError):
+            return None
+
+        if not isinstance(description, dict):
+            return None
+
+        if "mosaic_map_id" in description:
+            return "mosaic_map", int(description["mosaic_map_id"])
+
+        if "map_id" in description:
+            return "raw_map", int(description["map_id"])
+
+        if "transformation_id" in description:
+            return "transformation", int(description["transformation_id"])
+
+        return None
+
+    def get_target(self, session: Session):
+        """Returns the entity a job operates on. Transformation jobs are resolved to the raw map of their
+            transformation.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :result: Tuple of target kind ("raw_map" | "mosaic_map") and id or None if it could not be derived
+        :rtype: (str, int)|None
+        """
+        return Job.get_targets([self], session)[self.id]
+
+    @classmethod
+    def get_targets(cls, jobs: list["Job"], session: Session):
+        """Returns the entities a list of jobs operates on. The raw maps of all transformation jobs are resolved
+            with a single query.
+
+        :param jobs: Jobs
+        :type jobs: georeference.models.job.Job[]
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :result: Map of job id to a tuple of target kind ("raw_map" | "mosaic_map") and id or None
+        :rtype: dict<int, (str, int)|None>
+        """
+        targets = {job.id: job._get_target_from_description() for job in jobs}
+
+        transformation_ids = {
+            target[1]
+            for target in targets.values()
+            if target is not None and target[0] == "transformation"
+        }
+        raw_map_ids = {}
+        if len(transformation_ids) > 0:
+            statement = select(Transformation.id, Transformation.raw_map_id).where(
+                col(Transformation.id).in_(transformation_ids)
+            )
+            raw_map_ids = dict(session.exec(statement).all())
+
+        for job_id, target in targets.items():
+            if target is not None and target[0] == "transformation":
+                raw_map_id = raw_map_ids.get(target[1])
+                targets[job_id] = (
+                    ("raw_map", raw_map_id) if raw_map_id is not None else None
+                )
+        return targets
+
+    @classmethod
+    def notify_listeners(cls, session: Session, job_type: str):
+        """Sends a notification about a new job to the daemon. PostgreSQL delivers the notification on commit, so
+            it should be called within the transaction which inserts the job.
+
+        :param session: Database session
+        :type session: sqlalchemy.orm.session.Session
+        :param job_type: Type of the new job
+        :type job_type: str
+        """
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": JOBS_NOTIFY_CHANNEL, "payload": job_type},
+        )
 
     @classmethod
     def from_payload(cls, payload: JobPayload, user_id: str):
@@ -85,3 +501,16 @@ class Job(SQLModel, JobMixin, table=True):
 class JobHistory(SQLModel, JobMixin, table=True):
     __tablename__ = "jobs_history"
     id: int = Field(default=None, sa_type=Integer, primary_key=True)
+
+    @classmethod
+    def from_job(cls, job: Job, **overwrites):
+        """Creates a history entry for a job. Fields, which only exist for running jobs, are dropped.
+
+        :param job: Job
+        :type job: georeference.models.job.Job
+        :result: History entry
+        :rtype: georeference.models.job.JobHistory
+        """
+        return cls(
+            **{**job.model_dump(include=set(JobMixin.model_fields)), **overwrites}
+        )
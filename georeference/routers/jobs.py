@@ -9,7 +9,7 @@ from typing import Annotated
 
 from fastapi import APIRouter, Query, Depends, HTTPException
 from loguru import logger
-from sqlmodel import select, desc, Session
+from sqlmodel import select, desc, col, Session
 
 from georeference.config.constants import GENERAL_ERROR_MESSAGE
 from georeference.config.db import get_session
@@ -25,13 +25,14 @@ from georeference.utils.auth import require_authenticated_user, require_user_rol
 router = APIRouter()
 
 
-def get_filter_state(pending: bool | None):
+def get_filter_states(pending: bool | None):
     if pending is None:
         return None
     elif pending:
-        return EnumJobState.NOT_STARTED.value
+        # Running jobs are still pending and report their progress
+        return [EnumJobState.NOT_STARTED.value, EnumJobState.IN_PROGRESS.value]
     else:
-        return EnumJobState.COMPLETED.value
+        return [EnumJobState.COMPLETED.value]
 
 
 settings = get_settings()
@@ -45,11 +46,11 @@ def get_jobs(
     session: Session = Depends(get_session),
 ):
     try:
-        filter_state = get_filter_state(pending)
+        filter_states = get_filter_states(pending)
 
         statement = select(Job)
-        if filter_state:
-            statement = statement.where(Job.state == filter_state)
+        if filter_states:
+            statement = statement.where(col(Job.state).in_(filter_states))
         statement = statement.order_by(desc(Job.submitted)).limit(limit)
 
         jobs = session.exec(statement).all()
@@ -88,6 +89,7 @@ def post_job(
 
         job = Job.from_payload(new_job, user.username)
         session.add(job)
+        Job.notify_listeners(session, job.type)
         session.commit()
 
         logger.debug(f"Job with id {job.id} was added to the database.")
@@ -329,6 +329,7 @@ def _add_job(
     )
 
     session.add(create_job)
+    Job.notify_listeners(session, create_job.type)
     session.commit()
 
 
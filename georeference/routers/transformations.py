@@ -33,7 +33,12 @@ from georeference.schemas.transformation import (
 )
 from georeference.schemas.user import User
 from georeference.utils.auth import require_authenticated_user
-from georeference.utils.georeference import get_image_extent
+from georeference.utils.dry_run_cache import dry_run_cache, get_dry_run_key
+from georeference.utils.georeference import (
+    get_image_extent,
+    get_image_resolution,
+    get_image_size,
+)
 from georeference.utils.parser import (
     to_public_map_id,
     parse_public_map_id,
@@ -45,7 +50,11 @@ from georeference.utils.proj import (
 from georeference.utils.temp_files import (
     _create_temporary_georeference_image,
     _create_temporary_mapfile,
+    get_temporary_mapfile_name,
+    get_temporary_mapfile_path,
 )
+from georeference.utils.utils import get_readable_raw_image_path
+from georeference.utils.warp import get_preview_scale
 
 router = APIRouter()
 settings = get_settings()
@@ -143,6 +152,7 @@ def create_transformation(
     transformation: TransformationPayload,
     user: Annotated[User, Depends(require_authenticated_user)],
     dry_run: bool = Query(False),
+    preview: bool = Query(False),
     session: Session = Depends(get_session),
 ):
     try:
@@ -179,6 +189,7 @@ def create_transformation(
                     # On dry_runs we never use clip, because we want to allow the user in the client to draw
                     # clip polygons based on the full georeference image.
                     clip=None,
+                    preview=preview,
                 )
             else:
                 raise HTTPException(
@@ -187,7 +198,7 @@ def create_transformation(
                 )
         else:
             return _handle_request_with_transformation_payload(
-                transformation, map_obj, dry_run, user.username, session
+                transformation, map_obj, dry_run, user.username, session, preview
             )
     except HTTPException:
         raise
@@ -227,6 +238,7 @@ def _to_transformation_response(
 def _create_additional_properties(raw_map_obj, dbsession):
     georef_map_obj = GeorefMap.by_raw_map_id(raw_map_obj.id, dbsession)
     metadata_obj = Metadata.by_map_id(raw_map_obj.id, dbsession)
+    job = Job.query_transformation_job_for_map_id(dbsession, raw_map_obj.id)
 
     data = {
         "active_transformation_id": georef_map_obj.transformation_id
@@ -237,14 +249,22 @@ def _create_additional_properties(raw_map_obj, dbsession):
         if georef_map_obj is not None and georef_map_obj.extent is not None
         else None,
         "metadata": metadata_obj.model_dump(),
-        "pending_jobs": Job.has_not_started_jobs_for_map_id(dbsession, raw_map_obj.id),
+        "pending_jobs": job is not None,
+        "job_progress": {
+            "job_id": job.id,
+            "state": job.state,
+            "stage": job.stage,
+            "progress": job.progress,
+        }
+        if job is not None
+        else None,
     }
 
     return TransformationResponseAdditionalProperties(**data)
 
 
 def _handle_transformation_dry_run(
-    map_obj, transformation_params, target_crs, clip=None
+    map_obj, transformation_params, target_crs, clip=None, preview=False
 ):
     """Handles the dry_run for POST transformation requests.
 
@@ -256,10 +276,13 @@ def _handle_transformation_dry_run(
     :type target_crs: str
     :param clip: Clip geometry
     :type clip: dict
+    :param preview: Flag indicating whether the image is warped with a reduced resolution
+    :type preview: bool
     :result: JSON object describing the map object
     :rtype: {{
         "extent": [number, number, number, number],
         "layer_name": str,
+        "resolution": {{ "scale": number, "pixel_size": [number, number] }},
         "wms_url": str,
     }}
     """
@@ -267,27 +290,60 @@ def _handle_transformation_dry_run(
         transformation_params, target_crs
     )
 
-    # Create temporary georeference file
-    trg_file_name = "{}::{}.tif".format(map_obj.file_name, uuid.uuid4())
-    trg_file = _create_temporary_georeference_image(
-        trg_file_name, map_obj.get_abs_path(), correct_transformation_params, clip
-    )
+    # For previews the source image is reduced to a maximal size
+    scale = 1.0
+    if preview:
+        image_size = get_image_size(get_readable_raw_image_path(map_obj.get_abs_path()))
+        if image_size is not None:
+            scale = get_preview_scale(
+                image_size["x"],
+                image_size["y"],
+                settings.TRANSFORMATION_PREVIEW_MAX_SIZE,
+            )
 
-    # Create temporary mapfile
-    wms_url = _create_temporary_mapfile(
-        map_obj, trg_file, correct_transformation_params
-    )
+    def create_dry_run():
+        # Create temporary georeference file
+        trg_file_name = "{}::{}.tif".format(map_obj.file_name, uuid.uuid4())
+        trg_file = _create_temporary_georeference_image(
+            trg_file_name,
+            get_readable_raw_image_path(map_obj.get_abs_path()),
+            correct_transformation_params,
+            clip,
+            scale=scale,
+        )
 
-    return {
-        "extent": get_image_extent(trg_file),
-        "layer_name": map_obj.file_name,
-        "wms_url": wms_url,
-    }
+        # Create temporary mapfile
+        mapfile_name = get_temporary_mapfile_name()
+        wms_url = _create_temporary_mapfile(
+            map_obj, trg_file, correct_transformation_params, mapfile_name
+        )
+
+        response = {
+            "extent": get_image_extent(trg_file),
+            "layer_name": map_obj.file_name,
+            "resolution": {
+                "scale": scale,
+                "pixel_size": get_image_resolution(trg_file),
+            },
+            "wms_url": wms_url,
+        }
+        return response, [trg_file, get_temporary_mapfile_path(mapfile_name)]
+
+    if not settings.TRANSFORMATION_DRY_RUN_CACHE:
+        return create_dry_run()[0]
+
+    # Identical dry runs return the result of a previous or of a concurrent request
+    return dry_run_cache.get_or_create(
+        get_dry_run_key(
+            map_obj, correct_transformation_params, target_crs, clip, scale
+        ),
+        create_dry_run,
+    )
 
 
 # @TODO: Remove request api
 def _handle_request_with_transformation_payload(
-    payload: TransformationPayload, map_obj, dry_run, user_id, session
+    payload: TransformationPayload, map_obj, dry_run, user_id, session, preview=False
 ):
     """Handles a request which supplies a transformation object in its json body.
 
@@ -297,6 +353,8 @@ def _handle_request_with_transformation_payload(
     :type map_obj: georeference.models.raw_maps.RawMap
     :param dry_run: Flag indicating whether the changes should be written to the db.
     :type dry_run: bool
+    :param preview: Flag indicating whether a dry run is warped with a reduced resolution.
+    :type preview: bool
     """
     clip = None if payload.clip is None else payload.clip.model_dump()
     transformation_params = payload.params.model_dump()
@@ -315,7 +373,7 @@ def _handle_request_with_transformation_payload(
         )
 
         return _handle_transformation_dry_run(
-            map_obj, transformation_params, target_crs, clip=None
+            map_obj, transformation_params, target_crs, clip=None, preview=preview
         )
     else:
         return _handle_transformation_write(
@@ -397,6 +455,7 @@ def _handle_transformation_write(
         comment=None,
     )
     dbsession.add(new_job)
+    Job.notify_listeners(dbsession, new_job.type)
     dbsession.commit()
 
     return {
@@ -6,7 +6,7 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from pydantic import RootModel
 
@@ -16,6 +16,9 @@ from georeference.models.mixins import JobMixin
 
 class JobResponse(JobMixin):
     description: Dict[str, Any]
+    # Current stage and its progress in percent, as long as the job is running
+    stage: Optional[str] = None
+    progress: Optional[int] = None
 
     @classmethod
     def from_sqlmodel(cls, item: Job):
@@ -51,12 +51,20 @@ class TransformationResponse(BaseModel):
     metadata: TransformationMetadata
 
 
+class TransformationJobProgress(BaseModel):
+    job_id: int
+    state: str
+    stage: Optional[str]
+    progress: Optional[int]
+
+
 class TransformationResponseAdditionalProperties(BaseModel):
     active_transformation_id: Optional[int]
     default_crs: str
     extent: Optional[Polygon]
     metadata: TransformationMetadata
     pending_jobs: bool
+    job_progress: Optional[TransformationJobProgress] = None
 
 
 class TransformationResponseWithoutAdditionalProperties(BaseModel):
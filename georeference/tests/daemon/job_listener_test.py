@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+from sqlmodel import Session
+
+from georeference.daemon.job_listener import JobListener
+from georeference.models.enums import EnumJobType
+from georeference.models.job import Job
+
+
+def test_job_listener_receives_notification(db_container):
+    job_listener = JobListener(db_container[1])
+    try:
+        # Nothing was announced yet
+        assert job_listener.wait(0.1) is False
+
+        with Session(db_container[1]) as session:
+            Job.notify_listeners(session, EnumJobType.MAPS_CREATE.value)
+            session.commit()
+
+        assert job_listener.wait(5) is True
+
+        # Notifications are consumed by the previous wait
+        assert job_listener.wait(0.1) is False
+    finally:
+        job_listener.close()
+
+
+def test_job_listener_ignores_uncommitted_notification(db_container):
+    job_listener = JobListener(db_container[1])
+    try:
+        with Session(db_container[1]) as session:
+            Job.notify_listeners(session, EnumJobType.MAPS_CREATE.value)
+            session.rollback()
+
+        assert job_listener.wait(0.5) is False
+    finally:
+        job_listener.close()
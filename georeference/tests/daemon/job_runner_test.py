@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from georeference.config.settings import JobLane, get_settings
+from georeference.daemon.job_runner import (
+    claim_job,
+    process_claimed_job,
+    try_lock_target,
+)
+from georeference.jobs.errors import TransientJobError
+from georeference.models.enums import EnumJobType, EnumJobState
+from georeference.models.job import Job, JobHistory
+
+lanes = [
+    JobLane(name="light", job_types=[EnumJobType.MAPS_DELETE.value]),
+    JobLane(name="heavy", job_types=[EnumJobType.MAPS_UPDATE.value], max_concurrent=1),
+]
+
+
+def _add_job(session, job_id, map_id, job_type=EnumJobType.MAPS_UPDATE):
+    session.add(
+        Job(
+            id=job_id,
+            description=json.dumps({"map_id": map_id}),
+            type=job_type.value,
+            state=EnumJobState.NOT_STARTED.value,
+            submitted=datetime.now(),
+            user_id="test",
+        )
+    )
+
+
+def test_claim_job_leases_job(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        _add_job(session, 10000002, 10009405)
+        session.commit()
+
+        job_1 = claim_job(session, [], "worker-1")
+        job_2 = claim_job(session, [], "worker-2")
+
+        assert job_1.id == 10000001
+        assert job_1.state == EnumJobState.IN_PROGRESS.value
+        assert job_1.lease_owner == "worker-1"
+        assert job_1.lease_expires_at is not None
+        assert job_2.id == 10000002
+        assert job_2.lease_owner == "worker-2"
+        assert claim_job(session, [], "worker-3") is None
+
+
+def test_claim_job_skips_jobs_for_busy_maps(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        _add_job(session, 10000002, 10007521)
+        _add_job(session, 10000003, 10009405)
+        session.commit()
+
+        # The second job for map 10007521 has to wait for the first one
+        assert claim_job(session, [], "worker-1").id == 10000001
+        assert claim_job(session, [], "worker-2").id == 10000003
+        assert claim_job(session, [], "worker-3") is None
+
+
+def test_claim_job_skips_jobs_for_locked_maps(db_container):
+    with Session(db_container[1]) as session, Session(db_container[1]) as other_session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        _add_job(session, 10000002, 10009405)
+        session.commit()
+
+        # Map 10007521 is locked, e.g. while it is processed by the initialization
+        assert try_lock_target(other_session, ("raw_map", 10007521))
+        assert not try_lock_target(session, ("raw_map", 10007521))
+        session.rollback()
+        assert claim_job(session, [], "worker-1").id == 10000002
+        assert claim_job(session, [], "worker-2") is None
+
+        # After the lock is released, the job is claimed and the map is busy
+        other_session.rollback()
+        assert claim_job(session, [], "worker-2").id == 10000001
+        assert not try_lock_target(other_session, ("raw_map", 10007521))
+        other_session.rollback()
+
+
+def test_claim_job_prefers_light_jobs_and_caps_heavy_jobs(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        _add_job(session, 10000002, 10009405)
+        _add_job(session, 10000003, 10001556, EnumJobType.MAPS_DELETE)
+        session.commit()
+
+        # The light job is claimed first, although it was submitted last
+        assert claim_job(session, lanes, "worker-1").id == 10000003
+        assert claim_job(session, lanes, "worker-2").id == 10000001
+
+        # The heavy lane only allows one job at the same time
+        assert claim_job(session, lanes, "worker-3") is None
+
+
+def test_claim_job_keeps_order_of_jobs_for_the_same_map(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        _add_job(session, 10000002, 10007521, EnumJobType.MAPS_DELETE)
+        session.commit()
+
+        assert claim_job(session, lanes, "worker-1").id == 10000001
+
+
+def test_claim_job_reclaims_expired_leases(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        job = session.get(Job, 10000001)
+        job.state = EnumJobState.IN_PROGRESS.value
+        job.lease_owner = "crashed-worker"
+        job.lease_expires_at = datetime.now() - timedelta(hours=1)
+        session.commit()
+
+        job = claim_job(session, [], "worker-1")
+        assert job.id == 10000001
+        assert job.lease_owner == "worker-1"
+        assert job.attempts == 1
+
+
+def test_claim_job_fails_reclaimed_jobs_after_max_attempts(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        # The job crashed its worker in all previous attempts
+        job = session.get(Job, 10000001)
+        job.state = EnumJobState.IN_PROGRESS.value
+        job.lease_owner = "crashed-worker"
+        job.lease_expires_at = datetime.now() - timedelta(hours=1)
+        job.attempts = get_settings().DAEMON_JOB_MAX_ATTEMPTS - 1
+        session.commit()
+
+        assert claim_job(session, [], "worker-1") is None
+        assert session.get(Job, 10000001) is None
+        assert session.get(JobHistory, 10000001).state == EnumJobState.FAILED.value
+
+
+def test_process_claimed_job_moves_job_to_history(db_container, es_index):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        job = claim_job(session, lanes, "worker-1")
+        process_claimed_job(
+            session,
+            {EnumJobType.MAPS_UPDATE.value: lambda u, v, w: None},
+            es_index,
+            job,
+            "worker-1",
+        )
+
+        assert session.exec(select(Job)).all() == []
+
+        history_entry = session.get(JobHistory, 10000001)
+        assert history_entry.state == EnumJobState.COMPLETED.value
+
+
+def test_process_claimed_job_skips_job_with_lost_lease(db_container, es_index):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        job = claim_job(session, lanes, "worker-1")
+
+        def handler(es_index, dbsession, job):
+            # Simulates that the lease was reclaimed by another worker in the meantime
+            job.lease_owner = "worker-2"
+            dbsession.flush()
+
+        process_claimed_job(
+            session,
+            {EnumJobType.MAPS_UPDATE.value: handler},
+            es_index,
+            job,
+            "worker-1",
+        )
+
+        assert session.get(Job, 10000001).lease_owner == "worker-2"
+        assert session.get(JobHistory, 10000001) is None
+
+
+def test_process_claimed_job_retries_transient_errors(db_container, es_index):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        def handler(es_index, dbsession, job):
+            raise TransientJobError("Elasticsearch is restarting")
+
+        job = claim_job(session, lanes, "worker-1")
+        process_claimed_job(
+            session,
+            {EnumJobType.MAPS_UPDATE.value: handler},
+            es_index,
+            job,
+            "worker-1",
+        )
+
+        job = session.get(Job, 10000001)
+        assert job.state == EnumJobState.NOT_STARTED.value
+        assert job.attempts == 1
+        assert job.next_attempt_at > datetime.now()
+        assert job.lease_owner is None
+        assert session.get(JobHistory, 10000001) is None
+
+        # The job is not claimed again before the backoff has elapsed
+        assert claim_job(session, lanes, "worker-1") is None
+
+
+def test_process_claimed_job_fails_permanent_errors(db_container, es_index):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        def handler(es_index, dbsession, job):
+            raise ValueError("Invalid transformation")
+
+        job = claim_job(session, lanes, "worker-1")
+        process_claimed_job(
+            session,
+            {EnumJobType.MAPS_UPDATE.value: handler},
+            es_index,
+            job,
+            "worker-1",
+        )
+
+        assert session.get(Job, 10000001) is None
+        history_entry = session.get(JobHistory, 10000001)
+        assert history_entry.state == EnumJobState.FAILED.value
+        assert history_entry.comment == "Invalid transformation"
+
+
+def test_process_claimed_job_fails_after_max_attempts(db_container, es_index):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+
+        def handler(es_index, dbsession, job):
+            raise TransientJobError("Elasticsearch is restarting")
+
+        job = claim_job(session, lanes, "worker-1")
+        job.attempts = get_settings().DAEMON_JOB_MAX_ATTEMPTS - 1
+        session.commit()
+
+        process_claimed_job(
+            session,
+            {EnumJobType.MAPS_UPDATE.value: handler},
+            es_index,
+            job,
+            "worker-1",
+        )
+
+        assert session.get(Job, 10000001) is None
+        assert session.get(JobHistory, 10000001).state == EnumJobState.FAILED.value
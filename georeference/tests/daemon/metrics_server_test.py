@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session
+
+from georeference.daemon.metrics_server import render_queue_metrics
+from georeference.models.enums import EnumJobType, EnumJobState
+from georeference.models.job import Job
+
+
+def test_render_queue_metrics(db_container):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        for job_id, submitted in [
+            (10000001, datetime.now() - timedelta(hours=1)),
+            (10000002, datetime.now()),
+        ]:
+            session.add(
+                Job(
+                    id=job_id,
+                    description=json.dumps({"map_id": 10007521}),
+                    type=EnumJobType.MAPS_UPDATE.value,
+                    state=EnumJobState.NOT_STARTED.value,
+                    submitted=submitted,
+                    user_id="test",
+                )
+            )
+        session.flush()
+
+        lines = render_queue_metrics(session)
+
+        assert 'vk_jobs_queue_depth{type="maps_update"} 2' in lines
+        assert 'vk_jobs_queue_depth{type="maps_create"} 0' in lines
+
+        oldest_age = float(lines[-1].split(" ")[1])
+        assert 3600 <= oldest_age < 3700
+
+        session.rollback()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+from georeference.config.settings import JobLane
+from georeference.daemon.scheduler import get_lane_index, order_jobs
+from georeference.models.enums import EnumJobType
+
+lanes = [
+    JobLane(name="light", job_types=[EnumJobType.TRANSFORMATION_SET_VALID.value]),
+    JobLane(name="heavy", job_types=[EnumJobType.TRANSFORMATION_PROCESS.value]),
+]
+
+
+class _TestJob:
+    def __init__(self, id, type, target):
+        self.id = id
+        self.type = type
+        self.target = target
+
+
+def _get_targets(jobs):
+    return {job.id: job.target for job in jobs}
+
+
+def test_get_lane_index():
+    assert get_lane_index(EnumJobType.TRANSFORMATION_SET_VALID.value, lanes) == 0
+    assert get_lane_index(EnumJobType.TRANSFORMATION_PROCESS.value, lanes) == 1
+    assert get_lane_index(EnumJobType.MAPS_DELETE.value, lanes) == 2
+
+
+def test_order_jobs_runs_light_jobs_first():
+    jobs = [
+        _TestJob(1, EnumJobType.TRANSFORMATION_PROCESS.value, ("raw_map", 1)),
+        _TestJob(2, EnumJobType.MAPS_DELETE.value, None),
+        _TestJob(3, EnumJobType.TRANSFORMATION_SET_VALID.value, ("raw_map", 2)),
+    ]
+
+    assert [job.id for job, _ in order_jobs(jobs, _get_targets(jobs), lanes)] == [
+        3,
+        1,
+        2,
+    ]
+
+
+def test_order_jobs_keeps_order_for_the_same_target():
+    jobs = [
+        _TestJob(1, EnumJobType.TRANSFORMATION_PROCESS.value, ("raw_map", 1)),
+        _TestJob(2, EnumJobType.TRANSFORMATION_SET_VALID.value, ("raw_map", 1)),
+        _TestJob(3, EnumJobType.TRANSFORMATION_SET_VALID.value, ("raw_map", 2)),
+    ]
+
+    assert [job.id for job, _ in order_jobs(jobs, _get_targets(jobs), lanes)] == [
+        3,
+        1,
+        2,
+    ]
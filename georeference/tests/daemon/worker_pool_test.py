@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+import os
+import signal
+import subprocess
+from concurrent.futures import wait
+from datetime import datetime
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from georeference.daemon import worker_pool
+from georeference.daemon.job_runner import get_lease_owner
+from georeference.daemon.worker_pool import WorkerPool, run_worker
+from georeference.models.enums import EnumJobType, EnumJobState
+from georeference.models.job import Job, JobHistory
+
+
+def _add_job(session, job_id, map_id, job_type=EnumJobType.MAPS_UPDATE):
+    session.add(
+        Job(
+            id=job_id,
+            description=json.dumps({"map_id": map_id}),
+            type=job_type.value,
+            state=EnumJobState.NOT_STARTED.value,
+            submitted=datetime.now(),
+            user_id="test",
+        )
+    )
+
+
+def _return_worker_id(handlers, worker_id):
+    return worker_id
+
+
+def _kill_worker(handlers, worker_id):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_run_worker_drains_queue(db_container, es_index, monkeypatch):
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        _add_job(session, 10000002, 10009405)
+        _add_job(session, 10000003, 10007521, EnumJobType.MAPS_DELETE)
+        session.commit()
+
+    monkeypatch.setattr(worker_pool, "engine", db_container[1])
+    monkeypatch.setattr(worker_pool, "get_es_index_from_settings", lambda _: es_index)
+
+    processed_jobs = []
+    handlers = {
+        job_type.value: lambda es_index, dbsession, job: processed_jobs.append(job.id)
+        for job_type in [EnumJobType.MAPS_UPDATE, EnumJobType.MAPS_DELETE]
+    }
+    assert run_worker(handlers, 0) == 3
+
+    # Jobs for the same map are processed in the order of their submission
+    assert processed_jobs.index(10000001) < processed_jobs.index(10000003)
+
+    with Session(db_container[1]) as session:
+        assert session.exec(select(Job)).all() == []
+        assert all(
+            entry.state == EnumJobState.COMPLETED.value
+            for entry in session.exec(select(JobHistory)).all()
+        )
+
+
+def test_worker_pool_fills_free_slots(monkeypatch):
+    monkeypatch.setattr(worker_pool, "run_worker", _return_worker_id)
+
+    pool = WorkerPool({}, 2)
+    try:
+        assert pool.dispatch() == 2
+        assert pool.dispatch() == 0
+        assert pool.is_busy()
+
+        wait(list(pool.futures.values()))
+        pool.reap()
+        assert not pool.is_busy()
+        assert pool.dispatch() == 2
+    finally:
+        pool.shutdown()
+
+
+def test_worker_pool_recovers_from_killed_worker(db_container, monkeypatch):
+    # Job leased to a worker process of this host, which does not exist anymore
+    process = subprocess.Popen(["true"])
+    process.wait()
+    with Session(db_container[1]) as session:
+        session.execute(delete(Job))
+        _add_job(session, 10000001, 10007521)
+        session.commit()
+        job = session.get(Job, 10000001)
+        job.acquire_lease(session, get_lease_owner(process.pid), 3600)
+        session.commit()
+
+    monkeypatch.setattr(worker_pool, "run_worker", _kill_worker)
+    pool = WorkerPool({}, 1, bind=db_container[1])
+    try:
+        assert pool.dispatch() == 1
+        wait(list(pool.futures.values()))
+
+        # The broken pool is recreated and keeps dispatching
+        monkeypatch.setattr(worker_pool, "run_worker", _return_worker_id)
+        assert pool.dispatch() == 1
+        assert pool.futures[0].result(timeout=60) == 0
+
+        with Session(db_container[1]) as session:
+            job = session.get(Job, 10000001)
+            assert job.state == EnumJobState.NOT_STARTED.value
+            assert job.lease_owner is None
+            assert job.attempts == 1
+    finally:
+        pool.shutdown()
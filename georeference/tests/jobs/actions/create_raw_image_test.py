@@ -7,9 +7,12 @@
 # "LICENSE", which is part of this source code package
 import os
 
+from osgeo import gdal
+
 from georeference.config.paths import PATH_IMAGE_ROOT, PATH_TMP_ROOT
 from georeference.jobs.actions.create_raw_image import (
     run_process_raw_image,
+    run_process_working_copy,
     _get_pixel_data_type,
 )
 
@@ -49,6 +52,38 @@ def test_run_process_raw_image_success_image_2():
         subject = run_process_raw_image(src_path, trg_path, force=True)
 
         assert os.path.exists(subject)
+
+        # The raw image stays an untiled baseline tiff
+        dataset = gdal.Open(subject)
+        assert dataset.GetRasterBand(1).GetBlockSize()[0] == dataset.RasterXSize
+        assert dataset.GetRasterBand(1).GetOverviewCount() == 0
+        del dataset
+    finally:
+        if os.path.exists(subject):
+            os.remove(subject)
+
+
+def test_run_process_working_copy_success():
+    """The working copy is a tiled and compressed copy of the raw image with internal overviews."""
+    try:
+        src_path = os.path.join(
+            PATH_IMAGE_ROOT,
+            "dd_stad_0000007_0015.tif",
+        )
+        trg_path = os.path.join(
+            PATH_TMP_ROOT,
+            "working_copies",
+            "dd_stad_0000007_0015.tif",
+        )
+        subject = run_process_working_copy(src_path, trg_path, force=True)
+
+        assert os.path.exists(subject)
+
+        dataset = gdal.Open(subject)
+        assert dataset.GetRasterBand(1).GetBlockSize() == [512, 512]
+        assert dataset.GetRasterBand(1).GetOverviewCount() > 0
+        assert dataset.GetMetadata("IMAGE_STRUCTURE")["COMPRESSION"] == "DEFLATE"
+        del dataset
     finally:
         if os.path.exists(subject):
             os.remove(subject)
@@ -6,12 +6,12 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import os
-import shutil
 
 from georeference.config.paths import PATH_TMP_ROOT
 from georeference.jobs.actions.create_geo_image import run_process_geo_image
 from georeference.jobs.actions.create_tms import run_process_tms
 from georeference.tests.jobs.actions.create_geo_image_test import create_test_data
+from georeference.utils.publish import unpublish
 
 
 def test_run_process_tms_success():
@@ -40,7 +40,7 @@ def test_run_process_tms_success():
         if os.path.exists(path_geo_image):
             os.remove(path_geo_image)
         if os.path.exists(tms_dir):
-            shutil.rmtree(tms_dir)
+            unpublish(tms_dir)
 
 
 def test_run_process_tms_force_success():
@@ -84,7 +84,7 @@ def test_run_process_tms_force_success():
         if os.path.exists(path_geo_image):
             os.remove(path_geo_image)
         if os.path.exists(subject):
-            shutil.rmtree(subject)
+            unpublish(subject)
 
 
 def test_run_process_tms_epsg_4314_bit_raster():
@@ -104,4 +104,4 @@ def test_run_process_tms_epsg_4314_bit_raster():
         assert os.path.exists(tms_dir)
     finally:
         if os.path.exists(tms_dir):
-            shutil.rmtree(tms_dir)
+            unpublish(tms_dir)
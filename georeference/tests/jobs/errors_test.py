@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import errno
+
+from elasticsearch import exceptions as es_exceptions
+from sqlalchemy import exc as sa_exceptions
+
+from georeference.jobs.errors import TransientJobError, is_transient_error
+from georeference.utils.es_bulk import BulkRejectedError
+
+
+def test_is_transient_error():
+    assert is_transient_error(TransientJobError("retry"))
+    assert is_transient_error(BulkRejectedError("rejected"))
+    assert is_transient_error(es_exceptions.ConnectionError("N/A", "refused"))
+    assert is_transient_error(es_exceptions.TransportError(503, "unavailable"))
+    assert is_transient_error(
+        sa_exceptions.OperationalError("SELECT 1", {}, Exception("server closed"))
+    )
+    assert is_transient_error(OSError(errno.ESTALE, "Stale file handle"))
+
+
+def test_is_permanent_error():
+    assert not is_transient_error(ValueError("Invalid transformation"))
+    assert not is_transient_error(es_exceptions.NotFoundError(404, "not found"))
+    assert not is_transient_error(FileNotFoundError(errno.ENOENT, "No such file"))
+    assert not is_transient_error(Exception("Something went wrong"))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+import time
+
+from sqlmodel import Session
+
+from georeference.jobs import fsck
+from georeference.models.georef_map import GeorefMap
+from georeference.models.job import Job
+from georeference.models.raw_map import RawMap
+
+
+def _write_file(path, size, age=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"0" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_run_fsck_reports_missing_orphaned_and_stale_items(
+    db_container, tmp_path, monkeypatch
+):
+    roots = {name: str(tmp_path / name) for name in fsck.ARTIFACT_ROOTS}
+    monkeypatch.setattr(
+        fsck,
+        "ARTIFACT_ROOTS",
+        {name: (path, fsck.ARTIFACT_ROOTS[name][1]) for name, path in roots.items()},
+    )
+    monkeypatch.setattr(
+        fsck,
+        "TMP_ROOTS",
+        {name: str(tmp_path / name) for name in fsck.TMP_ROOTS},
+    )
+
+    _write_file(os.path.join(roots["mapfile"], "orphaned.map"), 10)
+    _write_file(os.path.join(roots["working_copy"], "mtb", "orphaned.tif"), 50)
+    _write_file(os.path.join(roots["tms"], "mtb", "orphaned", "0", "0", "0.png"), 20)
+    _write_file(str(tmp_path / "upload_tmp" / "stale.tif"), 30, age=2 * 24 * 60 * 60)
+    _write_file(str(tmp_path / "upload_tmp" / "recent.tif"), 40)
+
+    with Session(db_container[1]) as session:
+        report = fsck.run_fsck(session, tmp_max_age=24 * 60 * 60, workers=2)
+
+        georef_map_count = len(GeorefMap.all(session))
+        assert len(report["roots"]["georef"]["missing"]) == georef_map_count
+        assert len(report["roots"]["tms"]["missing"]) == georef_map_count
+        assert report["roots"]["mapfile"]["orphaned"] == [
+            {"item": "orphaned.map", "size": 10}
+        ]
+        assert report["roots"]["tms"]["orphaned"] == [
+            {"item": "mtb/orphaned", "size": 20}
+        ]
+        assert len(report["roots"]["working_copy"]["missing"]) == len(
+            RawMap.all(session)
+        )
+        assert report["roots"]["working_copy"]["orphaned"] == [
+            {"item": "mtb/orphaned.tif", "size": 50}
+        ]
+        assert [entry["item"] for entry in report["roots"]["upload_tmp"]["stale"]] == [
+            "stale.tif"
+        ]
+        assert report["summary"]["reclaimable_size"] == 110
+        assert report["repairs"] == []
+
+        # The repair adds jobs for the maps with missing artifacts
+        report = fsck.run_fsck(session, repair=True, workers=2)
+        job_ids = {job.id for job in Job.all(session)}
+        assert all(repair["job_id"] in job_ids for repair in report["repairs"])
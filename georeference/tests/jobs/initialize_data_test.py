@@ -8,7 +8,11 @@
 # -*- coding: utf-8 -*-
 from sqlmodel import Session
 
-from georeference.jobs.initialize_data import run_initialize_data
+from georeference.jobs.initialize_data import (
+    run_incremental_initialize_data,
+    run_initialize_data,
+)
+from georeference.utils.manifest import ArtifactManifest
 
 
 def test_load_initial_data_success(readonly_db_container):
@@ -21,3 +25,21 @@ def test_load_initial_data_without_service_regeneration_success(readonly_db_cont
     with Session(readonly_db_container[1]) as session:
         success = run_initialize_data(session)
         assert success
+
+
+def test_incremental_initialize_data_success(db_container, es_index, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    with Session(db_container[1]) as session:
+        manifest = ArtifactManifest(manifest_path)
+        success = run_incremental_initialize_data(session, es_index, manifest)
+        assert success
+
+        entries = ArtifactManifest(manifest_path).entries
+        assert len(entries) > 0
+        assert all("document" in entry for entry in entries.values())
+
+        # A second run finds all artifacts and documents up to date
+        manifest = ArtifactManifest(manifest_path)
+        success = run_incremental_initialize_data(session, es_index, manifest)
+        assert success
+        assert ArtifactManifest(manifest_path).entries == entries
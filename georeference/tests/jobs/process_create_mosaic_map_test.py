@@ -8,7 +8,6 @@
 import json
 import logging
 import os
-import shutil
 from datetime import datetime
 
 from sqlmodel import Session
@@ -30,6 +29,7 @@ from georeference.utils.parser import (
     from_public_map_id,
     from_public_mosaic_map_id,
 )
+from georeference.utils.publish import unpublish
 
 # Initialize the logger
 LOGGER = logging.getLogger(__name__)
@@ -92,7 +92,7 @@ def test_run_process_create_mosaic_map(db_container, es_index):
 
     finally:
         if mosaic_dataset_path is not None and os.path.exists(mosaic_dataset_path):
-            shutil.rmtree(os.path.dirname(mosaic_dataset_path))
+            unpublish(os.path.dirname(mosaic_dataset_path))
         if mosaic_mapfile_path is not None and os.path.exists(mosaic_mapfile_path):
             os.remove(mosaic_mapfile_path)
 
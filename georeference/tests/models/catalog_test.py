@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+from sqlmodel import Session
+
+from georeference.models.catalog import iter_catalog
+from georeference.models.georef_map import GeorefMap
+from georeference.models.metadata import Metadata
+from georeference.models.raw_map import RawMap
+from georeference.utils.utils import get_geometry
+
+
+class TestCatalog:
+    def test_iter_catalog_matches_single_queries(self, db_container):
+        """The test checks if the streamed catalog returns the same objects and geometries as the single queries."""
+        with Session(db_container[1]) as session:
+            entries = list(iter_catalog(session, batch_size=2))
+
+            raw_map_ids = [raw_map_obj.id for raw_map_obj in RawMap.all(session)]
+            assert sorted(raw_map_ids, reverse=True) == [
+                entry.raw_map.id for entry in entries
+            ]
+
+            for entry in entries:
+                raw_map_id = entry.raw_map.id
+                assert entry.metadata == Metadata.by_map_id(raw_map_id, session)
+                assert entry.georef_map == GeorefMap.by_raw_map_id(raw_map_id, session)
+                if entry.georef_map is not None:
+                    assert entry.transformation.id == entry.georef_map.transformation_id
+                    assert entry.get_geometry() == get_geometry(raw_map_id, session)
+                else:
+                    assert entry.transformation is None
+                    assert entry.get_geometry() is None
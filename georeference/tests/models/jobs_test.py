@@ -10,7 +10,7 @@ from datetime import datetime
 from sqlalchemy import delete
 from sqlmodel import Session
 
-from georeference.models.job import Job
+from georeference.models.job import Job, JobHistory
 from georeference.models.enums import EnumJobType, EnumJobState
 from georeference.models.transformation import Transformation, EnumValidationValue
 
@@ -122,22 +122,68 @@ class TestJob:
             assert len(subject) == 1
             assert subject[0].id == 10000003
 
-    def test_has_not_started_jobs(self, db_container):
-        """The test checks if the function "queryUnprocessedJobs" returns the correct jobs and clears the race conditions.
+    def test_coalesce_not_started_jobs(self, db_container):
+        """The test checks if superseded jobs are merged into the effective last job for the same map."""
+        with Session(db_container[1]) as session:
+            session.execute(delete(Job))
+            for transformation_id in [10000000, 10000001, 10000002]:
+                session.add(
+                    Transformation(
+                        id=transformation_id,
+                        submitted=datetime.now().isoformat(),
+                        user_id="test",
+                        params="",
+                        target_crs=4326,
+                        validation=EnumValidationValue.MISSING.value,
+                        raw_map_id=self.map_id,
+                        overwrites=0,
+                        comment=None,
+                    )
+                )
+            session.flush()
 
-        :param db_container: Database session
-        :type db_container: sqlalchemy.orm.session.Session
-        :return:
-        """
+            jobs = [
+                (10000000, EnumJobType.TRANSFORMATION_PROCESS, 10000000),
+                (10000001, EnumJobType.TRANSFORMATION_PROCESS, 10000001),
+                (10000002, EnumJobType.TRANSFORMATION_SET_INVALID, 10000001),
+                (10000003, EnumJobType.TRANSFORMATION_PROCESS, 10000002),
+                (10000004, EnumJobType.TRANSFORMATION_SET_INVALID, 10000001),
+            ]
+            for job_id, job_type, transformation_id in jobs:
+                session.add(
+                    Job(
+                        id=job_id,
+                        submitted=datetime.now().isoformat(),
+                        user_id="test",
+                        type=job_type.value,
+                        description=f'{{"transformation_id": {transformation_id}}}',
+                        state=EnumJobState.NOT_STARTED.value,
+                    )
+                )
+            session.flush()
 
-        with Session(db_container[1]) as session:
-            # In the beginning there should be no started jobs for this map
-            assert not Job.has_not_started_jobs_for_map_id(session, self.map_id)
+            assert Job.coalesce_not_started_jobs(session) == 1
 
-            # add not started job for map
+            # Job 10000000 is superseded by job 10000001. Job 10000001 is followed by a validation job and the
+            # two validation jobs are separated by another transformation job, so they are all kept.
+            remaining_ids = [
+                job.id
+                for job in Job.query_not_started_jobs(
+                    [e.value for e in EnumJobType], session
+                )
+            ]
+            assert remaining_ids == [10000001, 10000002, 10000003, 10000004]
+
+            merged_job = session.get(JobHistory, 10000000)
+            assert merged_job.state == EnumJobState.MERGED.value
+            assert merged_job.comment == "Merged into job 10000001."
+
+    def test_get_targets(self, db_container):
+        """The test checks if the targets of jobs are resolved, including the raw maps of transformation jobs."""
+        with Session(db_container[1]) as session:
             session.add(
                 Transformation(
-                    id=10000001,
+                    id=10000000,
                     submitted=datetime.now().isoformat(),
                     user_id="test",
                     params="",
@@ -149,16 +195,24 @@ class TestJob:
                 )
             )
             session.flush()
-            session.add(
-                Job(
-                    id=10000001,
-                    submitted=datetime.now().isoformat(),
-                    user_id="test",
-                    type=EnumJobType.TRANSFORMATION_PROCESS.value,
-                    description='{ "transformation_id": 10000001 }',
-                    state=EnumJobState.NOT_STARTED.value,
-                )
-            )
-            session.flush()
 
-            assert Job.has_not_started_jobs_for_map_id(session, self.map_id)
+            descriptions = [
+                '{"transformation_id": 10000000}',
+                '{"transformation_id": 99999999}',
+                '{"map_id": 10009405}',
+                '{"mosaic_map_id": 11823}',
+                "invalid",
+            ]
+            jobs = [
+                Job(id=job_id, description=description)
+                for job_id, description in enumerate(descriptions)
+            ]
+
+            assert Job.get_targets(jobs, session) == {
+                0: ("raw_map", self.map_id),
+                1: None,
+                2: ("raw_map", 10009405),
+                3: ("mosaic_map", 11823),
+                4: None,
+            }
+            assert jobs[0].get_target(session) == ("raw_map", self.map_id)
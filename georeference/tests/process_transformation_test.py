@@ -8,9 +8,12 @@
 import json
 from datetime import datetime
 
+import pytest
 from sqlmodel import Session, select
 
 from georeference.config.settings import get_settings
+from georeference.jobs.actions import enable_transformation
+from georeference.jobs.actions.update_index import run_update_index
 from georeference.jobs.process_transformation import run_process_new_transformation
 from georeference.models.enums import EnumJobType, EnumJobState
 from georeference.models.georef_map import GeorefMap
@@ -20,7 +23,60 @@ from georeference.models.transformation import Transformation, EnumValidationVal
 from georeference.utils.parser import to_public_map_id
 
 
-def test_run_process_jobs_success(db_container, es_index):
+def _create_transformation(transformation_id, map_id):
+    return Transformation(
+        id=transformation_id,
+        submitted=datetime.now(),
+        user_id="test",
+        params=json.dumps(
+            {
+                "source": "pixel",
+                "target": "EPSG:4314",
+                "algorithm": "affine",
+                "gcps": [
+                    {
+                        "source": [55.4411, 90.2791],
+                        "target": [16.499998092651, 51.900001525879],
+                    },
+                    {
+                        "source": [55.0665, 698.5391],
+                        "target": [16.499998092651, 51.79999923706],
+                    },
+                    {
+                        "source": [682.8058, 698.5391],
+                        "target": [16.666667938232, 51.79999923706],
+                    },
+                    {
+                        "source": [682.6185, 91.0283],
+                        "target": [16.666667938232, 51.900001525879],
+                    },
+                ],
+            }
+        ),
+        target_crs=4314,
+        validation=EnumValidationValue.MISSING.value,
+        raw_map_id=map_id,
+        overwrites=0,
+        comment=None,
+        clip=json.dumps(
+            {
+                "crs": {"type": "name", "properties": {"name": "EPSG:4314"}},
+                "coordinates": [
+                    [
+                        [16.5000353928, 51.900032347],
+                        [16.4999608259, 51.7999684435],
+                        [16.666705251, 51.8000300686],
+                        [16.6666305921, 51.8999706667],
+                        [16.5000353928, 51.900032347],
+                    ]
+                ],
+                "type": "Polygon",
+            }
+        ),
+    )
+
+
+def test_run_process_jobs_success(db_container, es_index, monkeypatch):
     """The test checks the proper running of the process jobs"""
     # Create the test data
 
@@ -34,58 +90,7 @@ def test_run_process_jobs_success(db_container, es_index):
             description='{ "transformation_id": 10000001 }',
             state=EnumJobState.NOT_STARTED.value,
         )
-        session.add(
-            Transformation(
-                id=10000001,
-                submitted=datetime.now(),
-                user_id="test",
-                params=json.dumps(
-                    {
-                        "source": "pixel",
-                        "target": "EPSG:4314",
-                        "algorithm": "affine",
-                        "gcps": [
-                            {
-                                "source": [55.4411, 90.2791],
-                                "target": [16.499998092651, 51.900001525879],
-                            },
-                            {
-                                "source": [55.0665, 698.5391],
-                                "target": [16.499998092651, 51.79999923706],
-                            },
-                            {
-                                "source": [682.8058, 698.5391],
-                                "target": [16.666667938232, 51.79999923706],
-                            },
-                            {
-                                "source": [682.6185, 91.0283],
-                                "target": [16.666667938232, 51.900001525879],
-                            },
-                        ],
-                    }
-                ),
-                target_crs=4314,
-                validation=EnumValidationValue.MISSING.value,
-                raw_map_id=map_id,
-                overwrites=0,
-                comment=None,
-                clip=json.dumps(
-                    {
-                        "crs": {"type": "name", "properties": {"name": "EPSG:4314"}},
-                        "coordinates": [
-                            [
-                                [16.5000353928, 51.900032347],
-                                [16.4999608259, 51.7999684435],
-                                [16.666705251, 51.8000300686],
-                                [16.6666305921, 51.8999706667],
-                                [16.5000353928, 51.900032347],
-                            ]
-                        ],
-                        "type": "Polygon",
-                    }
-                ),
-            )
-        )
+        session.add(_create_transformation(10000001, map_id))
         session.commit()
         session.add(new_job)
         session.commit()
@@ -96,6 +101,9 @@ def test_run_process_jobs_success(db_container, es_index):
         raw_map_obj.map_scale = 1000000000
         session.commit()
 
+        # The search document has to list the tile archives written by this job
+        monkeypatch.setattr(get_settings(), "TMS_ARCHIVE_FORMATS", ["pmtiles"])
+
         # Build test request
         run_process_new_transformation(es_index, session, new_job)
 
@@ -108,7 +116,63 @@ def test_run_process_jobs_success(db_container, es_index):
 
         settings = get_settings()
         # Check if the index was pushed to the es
+        document = es_index.get(settings.ES_INDEX_NAME, id=to_public_map_id(map_id))
+        assert document is not None
+
+        tile_archives = document["_source"]["tile_archives"]
+        assert [tile_archive["format"] for tile_archive in tile_archives] == ["pmtiles"]
+        assert tile_archives[0]["maxzoom"] >= tile_archives[0]["minzoom"]
+        # The bounds of the tiles cover the clip of the transformation
+        west, south, east, north = tile_archives[0]["bounds"]
+        assert west <= 16.5 and east >= 16.66 and south <= 51.8 and north >= 51.9
+
+
+def test_run_process_jobs_restores_index_on_failed_tms(
+    db_container, es_index, monkeypatch
+):
+    """The search document is written before the tms stage and restored, if the tms stage fails"""
+    with Session(db_container[1]) as session:
+        map_id = 10010367
+        new_job = Job(
+            id=10000002,
+            submitted=datetime.now(),
+            user_id="test",
+            type=EnumJobType.TRANSFORMATION_PROCESS.value,
+            description='{ "transformation_id": 10000003 }',
+            state=EnumJobState.NOT_STARTED.value,
+        )
+        session.add(_create_transformation(10000003, map_id))
+        session.commit()
+        session.add(new_job)
+        session.commit()
+
+        raw_map_obj = RawMap.by_id(map_id, session)
+        run_update_index(
+            es_index,
+            raw_map_obj,
+            GeorefMap.by_raw_map_id(map_id, session),
+            session,
+        )
+        settings = get_settings()
+        previous_document = es_index.get(
+            settings.ES_INDEX_NAME, id=to_public_map_id(map_id)
+        )["_source"]
+
+        def run_failing_tms(*args, **kwargs):
+            raise Exception("Failed tms")
+
+        monkeypatch.setattr(enable_transformation, "run_process_tms", run_failing_tms)
+
+        with pytest.raises(Exception):
+            run_process_new_transformation(es_index, session, new_job)
+        session.rollback()
+
+        # The search document is restored after the tms stage failed
+        assert (
+            GeorefMap.by_raw_map_id(map_id, session) is None
+            or GeorefMap.by_raw_map_id(map_id, session).transformation_id != 10000003
+        )
         assert (
-            es_index.get(settings.ES_INDEX_NAME, id=to_public_map_id(map_id))
-            is not None
+            es_index.get(settings.ES_INDEX_NAME, id=to_public_map_id(map_id))["_source"]
+            == previous_document
         )
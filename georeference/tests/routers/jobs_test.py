@@ -80,6 +80,36 @@ class TestJobs:
         # All jobs are completed in the test db
         assert len(data) == 1
 
+    @pytest.mark.user("user_1")
+    @pytest.mark.roles("vk2-admin")
+    def test_get_jobs_success_progress(
+        self,
+        db_container,
+        override_get_session,
+        test_client: TestClient,
+        override_get_user_from_session,
+    ):
+        with Session(db_container[1]) as session:
+            job = session.exec(select(Job).limit(1)).one()
+            job.state = EnumJobState.IN_PROGRESS.value
+            job.stage = "tiles"
+            job.progress = 40
+            session.add(job)
+            session.commit()
+            job_id = job.id
+
+        response = test_client.get("/jobs?pending=true")
+        data = response.json()
+
+        assert response.status_code == 200
+        # Running jobs are pending, too
+        assert len(data) == 13
+
+        job_response = next(job for job in data if job["id"] == job_id)
+        assert job_response["state"] == EnumJobState.IN_PROGRESS.value
+        assert job_response["stage"] == "tiles"
+        assert job_response["progress"] == 40
+
     @pytest.mark.user("user_1")
     @pytest.mark.roles("vk2-admin")
     def test_get_jobs_success_limit(
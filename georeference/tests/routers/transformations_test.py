@@ -114,6 +114,10 @@ class TestTransformationGet:
 
         assert len(result["transformations"]) == 5
         assert result["additional_properties"]["pending_jobs"]
+        assert result["additional_properties"]["job_progress"]["state"] == (
+            EnumJobState.NOT_STARTED.value
+        )
+        assert result["additional_properties"]["job_progress"]["progress"] is None
 
         # Check proper transformation of the target_crs
         transformation_subject = result["transformations"][0]
@@ -352,6 +356,60 @@ class TestTransformationPost:
         assert "transformation_id" not in result
         assert "points" not in result
 
+    def test_post_transformation_success_dry_run_with_preview(
+        self,
+        test_client,
+        override_get_session,
+        override_get_user_from_session,
+        monkeypatch,
+    ):
+        monkeypatch.setattr(
+            "georeference.routers.transformations.settings.TRANSFORMATION_PREVIEW_MAX_SIZE",
+            64,
+        )
+        json_request = json.dumps(
+            {
+                "params": {
+                    "algorithm": "affine",
+                    "gcps": [
+                        {
+                            "source": [720.8952, 107.3811],
+                            "target": [14.809598142072, 50.897193140898],
+                        },
+                        {
+                            "source": [716.1610, 101.5709],
+                            "target": [14.808447338463, 50.898010359738],
+                        },
+                        {
+                            "source": [719.4964, 124.8117],
+                            "target": [14.809553411787, 50.894672081543],
+                        },
+                    ],
+                },
+                "map_id": to_public_map_id(10001556),
+                "overwrites": 0,
+            }
+        )
+
+        res = test_client.post(
+            "/transformations?dry_run=true",
+            data=json_request,
+        )
+        assert res.status_code == 200
+        full_resolution = res.json()["resolution"]
+        assert full_resolution["scale"] == 1.0
+
+        res = test_client.post(
+            "/transformations?dry_run=true&preview=true",
+            data=json_request,
+        )
+        assert res.status_code == 200
+        result = res.json()
+        assert "extent" in result
+        assert "wms_url" in result
+        assert result["resolution"]["scale"] < 1.0
+        assert result["resolution"]["pixel_size"][0] > full_resolution["pixel_size"][0]
+
     def test_post_transformation_success_dry_run_with_transformation_id(
         self,
         test_client,
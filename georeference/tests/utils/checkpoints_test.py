@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+
+from georeference.utils.checkpoints import PipelineCheckpoint, get_fingerprint
+
+
+def _write_stage(path, content):
+    def run():
+        with open(path, "w") as f:
+            f.write(content)
+        return str(path)
+
+    return run
+
+
+def _fail():
+    raise Exception("Stage failed")
+
+
+def test_get_fingerprint_is_stable():
+    assert get_fingerprint({"a": 1, "b": [1, 2]}) == get_fingerprint(
+        {"b": [1, 2], "a": 1}
+    )
+    assert get_fingerprint({"a": 1}) != get_fingerprint({"a": 2})
+
+
+def test_checkpoint_resumes_with_failed_stage(tmp_path):
+    calls = []
+
+    def stage(name):
+        def run():
+            calls.append(name)
+            return _write_stage(tmp_path / f"{name}.txt", name)()
+
+        return run
+
+    checkpoint = PipelineCheckpoint("transformation_1", "abc", tmp_path)
+    checkpoint.run_stage("geo_image", stage("geo_image"))
+    checkpoint.run_stage("tms", stage("tms"), ["geo_image"])
+    try:
+        checkpoint.run_stage("mapfile", _fail, ["geo_image"])
+    except Exception:
+        pass
+
+    # A retry skips the completed stages
+    checkpoint = PipelineCheckpoint("transformation_1", "abc", tmp_path)
+    checkpoint.run_stage("geo_image", stage("geo_image"))
+    checkpoint.run_stage("tms", stage("tms"), ["geo_image"])
+    checkpoint.run_stage("mapfile", stage("mapfile"), ["geo_image"])
+
+    assert calls == ["geo_image", "tms", "mapfile"]
+
+    checkpoint.clear()
+    assert not os.path.exists(tmp_path / "transformation_1.json")
+
+
+def test_checkpoint_reruns_stages_with_changed_inputs_or_outputs(tmp_path):
+    calls = []
+
+    def stage(name):
+        def run():
+            calls.append(name)
+            return _write_stage(tmp_path / f"{name}.txt", name)()
+
+        return run
+
+    checkpoint = PipelineCheckpoint("transformation_1", "abc", tmp_path)
+    checkpoint.run_stage("geo_image", stage("geo_image"))
+    checkpoint.run_stage("tms", stage("tms"), ["geo_image"])
+    checkpoint.run_stage("mapfile", stage("mapfile"), ["geo_image"])
+
+    # Changed fingerprint
+    checkpoint = PipelineCheckpoint("transformation_1", "def", tmp_path)
+    checkpoint.run_stage("geo_image", stage("geo_image"))
+    checkpoint.run_stage("tms", stage("tms"), ["geo_image"])
+    assert calls == ["geo_image", "tms", "mapfile", "geo_image", "tms"]
+
+    # Changed output of a stage only invalidates the stages depending on it
+    os.remove(tmp_path / "tms.txt")
+    checkpoint = PipelineCheckpoint("transformation_1", "def", tmp_path)
+    checkpoint.run_stage("geo_image", stage("geo_image"))
+    checkpoint.run_stage("tms", stage("tms"), ["geo_image"])
+    assert calls[5:] == ["tms"]
+
+    # Changed output of the first stage invalidates the stages depending on it, too
+    os.remove(tmp_path / "geo_image.txt")
+    checkpoint = PipelineCheckpoint("transformation_1", "def", tmp_path)
+    checkpoint.run_stage("geo_image", stage("geo_image"))
+    checkpoint.run_stage("tms", stage("tms"), ["geo_image"])
+    assert calls[6:] == ["geo_image", "tms"]
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+import threading
+from types import SimpleNamespace
+
+from georeference.utils.dry_run_cache import DryRunCache, get_dry_run_key
+
+
+def test_get_dry_run_key_ignores_order_of_gcps(tmp_path):
+    raw_image = tmp_path / "raw.tif"
+    raw_image.write_bytes(b"0")
+    raw_map_obj = SimpleNamespace(id=1, get_abs_path=lambda: str(raw_image))
+    gcps = [
+        {"source": [1.0, 2.0], "target": [13.1, 51.1]},
+        {"source": [3.0, 4.0], "target": [13.2, 51.2]},
+    ]
+
+    key = get_dry_run_key(raw_map_obj, {"algorithm": "tps", "gcps": gcps}, "EPSG:4314")
+    assert key == get_dry_run_key(
+        raw_map_obj, {"algorithm": "tps", "gcps": gcps[::-1]}, "EPSG:4314"
+    )
+    assert key != get_dry_run_key(
+        raw_map_obj, {"algorithm": "affine", "gcps": gcps}, "EPSG:4314"
+    )
+    assert key != get_dry_run_key(
+        raw_map_obj, {"algorithm": "tps", "gcps": gcps}, "EPSG:4314", scale=0.5
+    )
+
+
+def test_dry_run_cache_single_flight(tmp_path):
+    cache = DryRunCache(cache_dir=str(tmp_path))
+    trg_file = tmp_path / "dry_run.tif"
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def create():
+        calls.append(1)
+        started.set()
+        release.wait()
+        trg_file.write_bytes(b"0")
+        return {"wms_url": "wms_1"}, [str(trg_file)]
+
+    responses = []
+    threads = [
+        threading.Thread(
+            target=lambda: responses.append(cache.get_or_create("a", create))
+        )
+        for _ in range(4)
+    ]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert responses == [{"wms_url": "wms_1"}] * 4
+
+    # A record is only valid, as long as its files exist
+    assert cache.get_or_create("a", create) == {"wms_url": "wms_1"}
+    assert len(calls) == 1
+    os.remove(trg_file)
+    assert cache.get("a") is None
+    cache.get_or_create("a", create)
+    assert len(calls) == 2
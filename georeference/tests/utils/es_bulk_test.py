@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+
+import pytest
+from elasticsearch import exceptions as es_exceptions
+
+from georeference.utils.es_bulk import BulkIndexer, BulkRejectedError
+
+
+class _BulkClient:
+    """Records the bulk requests and answers them with the given item status codes."""
+
+    def __init__(self, status_codes, failing_requests=0):
+        self.status_codes = status_codes
+        self.failing_requests = failing_requests
+        self.requests = []
+
+    def bulk(self, body, index):
+        if self.failing_requests > 0:
+            self.failing_requests -= 1
+            raise es_exceptions.ConnectionError("N/A", "Connection refused", None)
+
+        lines = [json.loads(line) for line in body.strip().split("\n")]
+        actions = [line for line in lines if "index" in line or "delete" in line]
+        self.requests.append([next(iter(a.values()))["_id"] for a in actions])
+        items = []
+        for action in actions:
+            operation, meta = next(iter(action.items()))
+            statuses = self.status_codes.get(meta["_id"], [201])
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+            items.append({operation: {"_id": meta["_id"], "status": status}})
+        return {"errors": False, "items": items}
+
+
+def test_bulk_indexer_batches_and_flushes():
+    client = _BulkClient({})
+    indexed = []
+    with BulkIndexer(client, "vk20", batch_size=2) as bulk_indexer:
+        for document_id in ["a", "b", "c"]:
+            bulk_indexer.index(
+                document_id,
+                {"map_id": document_id},
+                on_success=lambda document_id=document_id: indexed.append(document_id),
+            )
+        bulk_indexer.delete("d")
+
+    assert client.requests == [["a", "b"], ["c", "d"]]
+    assert indexed == ["a", "b", "c"]
+    assert bulk_indexer.indexed_count == 4
+    assert bulk_indexer.errors == []
+
+
+def test_bulk_indexer_retries_rejected_items():
+    client = _BulkClient({"b": [429, 429, 201], "c": [400]})
+    bulk_indexer = BulkIndexer(client, "vk20", max_retries=3, retry_backoff=0)
+    for document_id in ["a", "b", "c"]:
+        bulk_indexer.index(document_id, {"map_id": document_id})
+    bulk_indexer.flush()
+
+    assert client.requests == [["a", "b", "c"], ["b"], ["b"]]
+    assert bulk_indexer.indexed_count == 2
+    assert [error["id"] for error in bulk_indexer.errors] == ["c"]
+
+
+def test_bulk_indexer_keeps_rejected_items_after_max_retries():
+    client = _BulkClient({"a": [429, 429, 201]})
+    bulk_indexer = BulkIndexer(client, "vk20", max_retries=1, retry_backoff=0)
+    bulk_indexer.index("a", {"map_id": "a"})
+    bulk_indexer.index("b", {"map_id": "b"})
+    with pytest.raises(BulkRejectedError):
+        bulk_indexer.flush()
+
+    assert client.requests == [["a", "b"], ["a"]]
+    assert [operation[0] for operation in bulk_indexer.buffer] == [
+        {"index": {"_id": "a"}}
+    ]
+
+    # The rejected items are sent again by the next flush
+    bulk_indexer.flush()
+    assert client.requests[-1] == ["a"]
+    assert bulk_indexer.buffer == []
+    assert bulk_indexer.indexed_count == 2
+    assert bulk_indexer.errors == []
+
+
+def test_bulk_indexer_keeps_buffer_on_transport_error():
+    client = _BulkClient({}, failing_requests=1)
+    bulk_indexer = BulkIndexer(client, "vk20", retry_backoff=0)
+    bulk_indexer.index("a", {"map_id": "a"})
+    with pytest.raises(es_exceptions.ConnectionError):
+        bulk_indexer.flush()
+    assert len(bulk_indexer.buffer) == 1
+
+    bulk_indexer.flush()
+    assert client.requests == [["a"]]
+    assert bulk_indexer.buffer == []
+    assert bulk_indexer.indexed_count == 1
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+from georeference.config.settings import get_settings
+from georeference.utils.es_index import (
+    create_index_version,
+    delete_old_index_versions,
+    get_es_index,
+    get_pending_index_version,
+    swap_index_alias,
+)
+
+
+def test_swap_index_alias_keeps_search_available(es_index):
+    index_name = get_settings().ES_INDEX_NAME
+    previous_versions = list(es_index.indices.get_alias(name=index_name).keys())
+    es_index.index(index=index_name, id="old", body={"map_id": "old"}, refresh=True)
+
+    # The search still uses the previous version, while the new one is built
+    version_name = create_index_version(es_index, index_name)
+    es_index.index(index=version_name, id="new", body={"map_id": "new"}, refresh=True)
+    assert es_index.exists(index_name, id="old") is True
+    assert es_index.exists(index_name, id="new") is False
+
+    swap_index_alias(es_index, index_name, version_name)
+    assert list(es_index.indices.get_alias(name=index_name).keys()) == [version_name]
+    assert es_index.exists(index_name, id="new") is True
+
+    # The previous version is kept once and deleted afterwards
+    delete_old_index_versions(es_index, index_name, keep=1)
+    assert es_index.indices.exists(previous_versions[0]) is True
+    delete_old_index_versions(es_index, index_name, keep=0)
+    assert es_index.indices.exists(previous_versions[0]) is False
+    assert es_index.indices.exists(version_name) is True
+
+
+def test_get_es_index_with_recreation_keeps_search_available(es_index):
+    index_name = get_settings().ES_INDEX_NAME
+    active_versions = list(es_index.indices.get_alias(name=index_name).keys())
+    es_index.index(index=index_name, id="old", body={"map_id": "old"}, refresh=True)
+
+    host = es_index.transport.hosts[0]
+    get_es_index(
+        {"host": host["host"], "port": host["port"], "ssl": False}, index_name, True
+    )
+
+    # The alias still points to the previous version, while the new version waits for the initialization
+    assert list(es_index.indices.get_alias(name=index_name).keys()) == active_versions
+    assert es_index.exists(index_name, id="old") is True
+    version_name = get_pending_index_version(es_index, index_name)
+    assert version_name is not None and version_name not in active_versions
+
+    # A pending version is not deleted as an old version
+    delete_old_index_versions(es_index, index_name, keep=0)
+    assert es_index.indices.exists(version_name) is True
@@ -111,9 +111,7 @@ def test_rectify_image():
                 gcps = to_gdal_gcps(test["gcps"])
 
                 t00 = time.time()
-                response = rectify_image(
-                    src_file, dst_file, algorithm, gcps, srs, tmp_dir, None
-                )
+                response = rectify_image(src_file, dst_file, algorithm, gcps, srs, None)
                 print("Test: %s (Time: %s)" % (test["name"], (time.time()) - t00))
 
                 # Tests
@@ -167,7 +165,6 @@ def test_rectify_image_with_clip_and_overviews():
                     algorithm,
                     gcps,
                     gcps_srs,
-                    tmp_dir,
                     clip,
                 )
                 print("Test: %s (Time: %s)" % (test["name"], (time.time()) - t00))
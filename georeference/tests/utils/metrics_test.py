@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import queue
+
+from georeference.utils.metrics import MetricsRegistry, format_labels
+
+
+def test_format_labels():
+    assert format_labels(()) == ""
+    assert (
+        format_labels((("stage", "mapfile"), ("le", 5))) == '{stage="mapfile",le="5"}'
+    )
+    assert format_labels((("comment", 'a "b"'),)) == '{comment="a \\"b\\""}'
+
+
+def test_registry_renders_cumulative_histogram():
+    registry = MetricsRegistry()
+    registry.observe("vk_stage_duration_seconds", 0.5, stage="rsync")
+    registry.observe("vk_stage_duration_seconds", 7, stage="rsync")
+    registry.observe("vk_stage_duration_seconds", 10000, stage="rsync")
+
+    lines = registry.render()
+
+    assert "# TYPE vk_stage_duration_seconds histogram" in lines
+    assert 'vk_stage_duration_seconds_bucket{stage="rsync",le="1"} 1' in lines
+    assert 'vk_stage_duration_seconds_bucket{stage="rsync",le="5"} 1' in lines
+    assert 'vk_stage_duration_seconds_bucket{stage="rsync",le="10"} 2' in lines
+    assert 'vk_stage_duration_seconds_bucket{stage="rsync",le="+Inf"} 3' in lines
+    assert 'vk_stage_duration_seconds_count{stage="rsync"} 3' in lines
+    assert 'vk_stage_duration_seconds_sum{stage="rsync"} 10007.5' in lines
+
+
+def test_registry_collects_forwarded_observations():
+    metrics_queue = queue.Queue()
+    worker_registry = MetricsRegistry()
+    worker_registry.forward_to(metrics_queue)
+    worker_registry.observe("vk_job_duration_seconds", 3, type="maps_create")
+
+    assert worker_registry.render() == []
+
+    main_registry = MetricsRegistry()
+    main_registry.collect_from(metrics_queue)
+
+    assert (
+        'vk_job_duration_seconds_count{type="maps_create"} 1' in main_registry.render()
+    )
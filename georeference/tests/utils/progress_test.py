@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from georeference.utils.progress import (
+    ProgressReporter,
+    progress_reporting,
+    report_progress,
+    run_command_with_progress,
+    submit_stage,
+    wait_with_progress,
+)
+
+
+def test_progress_reporter_throttles_updates():
+    writes = []
+    reporter = ProgressReporter(
+        lambda stage, progress: writes.append((stage, progress)), 60
+    )
+
+    reporter.report("warp", 0)
+    reporter.report("warp", 0.1)
+    reporter.report("warp", 0.2)
+    reporter.report("overviews", 0)
+    reporter.report("overviews", 1)
+
+    # Updates within the same stage are throttled, but a new stage and a finished stage are always written
+    assert writes == [("warp", 0), ("overviews", 0), ("overviews", 100)]
+
+
+def test_progress_reporter_writes_only_from_the_job_thread():
+    writes = []
+    reporter = ProgressReporter(
+        lambda stage, progress: writes.append((stage, progress, threading.get_ident())),
+        0,
+    )
+
+    reported = threading.Event()
+    release = threading.Event()
+
+    def stage():
+        report_progress("build_tms_cache", 0.5)
+        reported.set()
+        release.wait()
+        return "tms"
+
+    with progress_reporting(reporter), ThreadPoolExecutor(max_workers=1) as executor:
+        future = submit_stage(executor, stage)
+        reported.wait()
+        assert writes == []
+
+        release_timer = threading.Timer(0.2, release.set)
+        release_timer.start()
+        assert wait_with_progress(future, interval=0.05) == "tms"
+
+    assert writes == [("build_tms_cache", 50, threading.get_ident())]
+
+
+def test_wait_with_progress_for_stage_longer_than_interval():
+    writes = []
+    reporter = ProgressReporter(
+        lambda stage, progress: writes.append((stage, progress)), 0
+    )
+
+    def stage():
+        for progress in [0.25, 0.5, 0.75]:
+            report_progress("build_tms_cache", progress)
+            time.sleep(0.1)
+        return "tms"
+
+    # The result of the future is awaited several times, before the stage is finished
+    with progress_reporting(reporter), ThreadPoolExecutor(max_workers=1) as executor:
+        assert wait_with_progress(submit_stage(executor, stage), interval=0.02) == "tms"
+
+    assert len(writes) > 0
+    assert all(stage == "build_tms_cache" for stage, _ in writes)
+
+
+def test_progress_reporting_is_scoped_to_the_job():
+    writes = []
+    reporter = ProgressReporter(
+        lambda stage, progress: writes.append((stage, progress)), 0
+    )
+
+    # Threads, which are not started for a stage of the job, e.g. the background initialization, do not report to
+    # the reporter of the job
+    other_thread = threading.Thread(target=report_progress, args=("warp", 0.5))
+    with progress_reporting(reporter):
+        other_thread.start()
+        other_thread.join()
+        reporter.flush()
+
+    assert writes == []
+
+
+def test_report_progress_without_reporter():
+    # Does nothing, if no job is processed
+    report_progress("warp", 0.5)
+
+
+def test_run_command_with_progress():
+    writes = []
+    reporter = ProgressReporter(
+        lambda stage, progress: writes.append((stage, progress)), 0
+    )
+
+    with progress_reporting(reporter):
+        output = run_command_with_progress(
+            "printf '0...10...20...30...40...50...60...70...80...90...100 - done.'",
+            "warp",
+        )
+
+    assert output.endswith(b"100 - done.")
+    assert writes[0] == ("warp", 0)
+    assert writes[-1] == ("warp", 100)
+
+
+def test_run_command_with_progress_raises_on_error():
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        run_command_with_progress("echo 'ERROR 4: not found' && exit 1", "warp")
+    assert b"ERROR 4" in e.value.output
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+
+from georeference.utils.publish import (
+    VERSIONS_DIR,
+    get_temporary_path,
+    get_version_path,
+    publish_directory,
+    publish_file,
+    reap_versions,
+    unpublish,
+)
+
+
+def _create_version(path, content):
+    version_path = get_version_path(path)
+    os.makedirs(os.path.join(version_path, "0", "0"))
+    with open(os.path.join(version_path, "0", "0", "0.png"), "w") as f:
+        f.write(content)
+    return version_path
+
+
+def _read_tile(path):
+    with open(os.path.join(path, "0", "0", "0.png")) as f:
+        return f.read()
+
+
+def test_publish_directory_switches_versions(tmp_path):
+    path = str(tmp_path / "tms" / "df_dk_1")
+
+    # A directory of the previous layout is moved into the versions
+    os.makedirs(os.path.join(path, "0", "0"))
+    with open(os.path.join(path, "0", "0", "0.png"), "w") as f:
+        f.write("legacy")
+
+    first_version = _create_version(path, "first")
+    publish_directory(first_version, path)
+    assert os.path.islink(path)
+    assert _read_tile(path) == "first"
+
+    # A version, which is still being built, is not reaped
+    second_version = _create_version(path, "second")
+    reap_versions(path)
+    assert os.path.exists(first_version)
+    assert os.path.exists(second_version)
+
+    publish_directory(second_version, path)
+    assert _read_tile(path) == "second"
+    reap_versions(path)
+    assert os.listdir(os.path.join(str(tmp_path / "tms"), VERSIONS_DIR)) == [
+        os.path.basename(second_version)
+    ]
+
+    unpublish(path)
+    reap_versions(path)
+    assert not os.path.lexists(path)
+    assert not os.path.exists(second_version)
+
+
+def test_publish_file_replaces_file(tmp_path):
+    path = str(tmp_path / "df_dk_1.tif")
+    with open(path, "w") as f:
+        f.write("old")
+
+    tmp_file = get_temporary_path(path)
+    assert tmp_file.endswith(".tif")
+    assert os.path.basename(tmp_file).startswith(".")
+    with open(tmp_file, "w") as f:
+        f.write("new")
+
+    publish_file(tmp_file, path)
+    with open(path) as f:
+        assert f.read() == "new"
+    assert not os.path.exists(tmp_file)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+import sqlite3
+
+import pytest
+
+from georeference.utils.publish import (
+    VERSIONS_DIR,
+    get_version_path,
+    publish_directory,
+    reap_versions,
+)
+from georeference.utils.tile_archives import (
+    PMTILES_HEADER,
+    _build_directories,
+    deserialize_directory,
+    read_tile_archive_metadata,
+    remove_tms_outputs,
+    serialize_directory,
+    write_tile_archive,
+    zxy_to_tileid,
+)
+
+
+def _create_tms_directory(path):
+    # Zoom level 1 with two identical tiles in the bottom row (TMS scheme)
+    tiles = {
+        (0, 0, 0): b"base",
+        (1, 0, 0): b"tile",
+        (1, 1, 0): b"tile",
+        (1, 1, 1): b"other",
+    }
+    for (z, x, y), data in tiles.items():
+        os.makedirs(os.path.join(path, str(z), str(x)), exist_ok=True)
+        with open(os.path.join(path, str(z), str(x), f"{y}.png"), "wb") as f:
+            f.write(data)
+    return path
+
+
+def test_zxy_to_tileid():
+    assert zxy_to_tileid(0, 0, 0) == 0
+    assert [zxy_to_tileid(1, x, y) for x, y in [(0, 0), (0, 1), (1, 1), (1, 0)]] == [
+        1,
+        2,
+        3,
+        4,
+    ]
+    assert zxy_to_tileid(2, 0, 0) == 5
+    assert zxy_to_tileid(12, 3423, 1763) == 19078479
+
+
+def test_serialize_directory_round_trip():
+    entries = [(0, 0, 10, 1), (1, 10, 20, 2), (5, 0, 10, 1), (9, 30, 5, 1)]
+    assert deserialize_directory(serialize_directory(entries)) == entries
+
+
+def test_build_directories_with_leaves():
+    entries = [
+        (tile_id * 2, tile_id * 7, 3 + tile_id % 5, 1) for tile_id in range(40000)
+    ]
+    root, leaves = _build_directories(entries)
+
+    assert len(root) + PMTILES_HEADER.size <= 16384
+    root_entries = deserialize_directory(root)
+    assert all(run_length == 0 for _, _, _, run_length in root_entries)
+
+    result = []
+    for _, offset, length, _ in root_entries:
+        result += deserialize_directory(leaves[offset : offset + length])
+    assert result == entries
+
+
+def test_write_mbtiles(tmp_path):
+    tms_path = _create_tms_directory(str(tmp_path / "df_dk_1"))
+    archive_path = str(tmp_path / "df_dk_1.mbtiles")
+
+    metadata = write_tile_archive(tms_path, archive_path, "mbtiles", "df_dk_1")
+    assert metadata["minzoom"] == 0
+    assert metadata["maxzoom"] == 1
+
+    connection = sqlite3.connect(archive_path)
+    assert connection.execute(
+        "SELECT tile_data FROM tiles WHERE zoom_level = 1 AND tile_column = 1 AND tile_row = 1"
+    ).fetchone() == (b"other",)
+    assert connection.execute("SELECT count(*) FROM tiles").fetchone() == (4,)
+    assert connection.execute("SELECT count(*) FROM images").fetchone() == (3,)
+    connection.close()
+
+    assert read_tile_archive_metadata(archive_path) == {
+        "bounds": metadata["bounds"],
+        "minzoom": 0,
+        "maxzoom": 1,
+    }
+
+
+def test_write_pmtiles(tmp_path):
+    tms_path = _create_tms_directory(str(tmp_path / "df_dk_1"))
+    archive_path = str(tmp_path / "df_dk_1.pmtiles")
+
+    write_tile_archive(tms_path, archive_path, "pmtiles", "df_dk_1")
+    with open(archive_path, "rb") as f:
+        data = f.read()
+    header = PMTILES_HEADER.unpack(data[: PMTILES_HEADER.size])
+
+    # Addressed tiles, tile entries and tile contents
+    assert header[10:13] == (4, 3, 3)
+    entries = deserialize_directory(data[header[2] : header[2] + header[3]])
+
+    def get_tile(z, x, y):
+        tile_id = zxy_to_tileid(z, x, y)
+        for first_tile_id, offset, length, run_length in entries:
+            if first_tile_id <= tile_id < first_tile_id + run_length:
+                return data[header[8] + offset : header[8] + offset + length]
+
+    # Rows in the XYZ scheme
+    assert get_tile(0, 0, 0) == b"base"
+    assert get_tile(1, 0, 1) == b"tile"
+    assert get_tile(1, 1, 1) == b"tile"
+    assert get_tile(1, 1, 0) == b"other"
+    assert get_tile(1, 0, 0) is None
+
+    metadata = read_tile_archive_metadata(archive_path)
+    assert metadata["minzoom"] == 0
+    assert metadata["maxzoom"] == 1
+    assert metadata["bounds"] == pytest.approx(
+        [-180, -85.0511287, 180, 85.0511287], abs=1e-6
+    )
+
+
+def test_remove_tms_outputs(tmp_path):
+    tms_path = str(tmp_path / "df_dk_1")
+    version_path = _create_tms_directory(get_version_path(tms_path))
+    publish_directory(version_path, tms_path)
+    for archive_format in ["mbtiles", "pmtiles"]:
+        write_tile_archive(
+            tms_path, f"{tms_path}.{archive_format}", archive_format, "df_dk_1"
+        )
+
+    remove_tms_outputs(tms_path)
+    reap_versions(tms_path)
+    assert not os.path.lexists(tms_path)
+    assert os.listdir(str(tmp_path)) == [VERSIONS_DIR]
+    assert os.listdir(str(tmp_path / VERSIONS_DIR)) == []
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+
+from PIL import Image
+from osgeo import gdal
+
+from georeference.utils.tms import (
+    TRANSPARENT_INDEX,
+    _compress_tms_directory,
+    _get_batches_by_zoom_level,
+    get_map_palette,
+)
+
+
+def _create_tile(path, color):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGBA", (256, 256), color).save(path, "PNG")
+    return path
+
+
+def test_get_batches_by_zoom_level(tmp_path):
+    path = str(tmp_path)
+    pngs = [os.path.join(path, "10", "1", f"{y}.png") for y in range(3)] + [
+        os.path.join(path, "2", "0", "0.png")
+    ]
+
+    assert _get_batches_by_zoom_level(path, pngs, 2) == [
+        [pngs[3]],
+        pngs[0:2],
+        [pngs[2]],
+    ]
+
+
+def test_compress_tms_directory_with_process_pool(tmp_path):
+    pngs = [
+        _create_tile(str(tmp_path / str(z) / "0" / f"{y}.png"), (z * 40, y, 0, 255))
+        for z in range(3)
+        for y in range(4)
+    ]
+
+    assert _compress_tms_directory(str(tmp_path), processes=2, batch_size=3) == 12
+    for png in pngs:
+        assert Image.open(png).mode == "P"
+
+
+def test_compress_tms_directory_with_map_palette(tmp_path):
+    # Geo image with a red and a blue half and a transparent border
+    path_image = str(tmp_path / "geo.tif")
+    dataset = gdal.GetDriverByName("GTiff").Create(path_image, 512, 512, 4)
+    for index, value in enumerate([255, 0, 0, 255]):
+        dataset.GetRasterBand(index + 1).Fill(value)
+    dataset.GetRasterBand(3).WriteRaster(0, 256, 512, 256, b"\xff" * 512 * 256)
+    dataset.GetRasterBand(1).WriteRaster(0, 256, 512, 256, b"\x00" * 512 * 256)
+    dataset.GetRasterBand(4).SetColorInterpretation(gdal.GCI_AlphaBand)
+    dataset.GetRasterBand(4).WriteRaster(0, 0, 512, 16, b"\x00" * 512 * 16)
+    del dataset
+
+    palette = get_map_palette(path_image)
+    assert palette is not None
+
+    tile_dir = tmp_path / "tms"
+    png = _create_tile(str(tile_dir / "1" / "0" / "0.png"), (250, 4, 2, 255))
+    tile = Image.open(png)
+    tile.paste((0, 0, 0, 0), (0, 0, 16, 16))
+    tile.save(png)
+
+    assert _compress_tms_directory(str(tile_dir), processes=1, palette=palette) == 1
+    result = Image.open(png)
+    assert result.mode == "P"
+    assert result.getpixel((0, 0)) == TRANSPARENT_INDEX
+    assert result.convert("RGB").getpixel((128, 128)) == (255, 0, 0)
+
+
+def test_compress_tms_directory_skips_transparent_and_links_identical_tiles(tmp_path):
+    transparent = _create_tile(str(tmp_path / "2" / "0" / "0.png"), (0, 0, 0, 0))
+    first = _create_tile(str(tmp_path / "2" / "1" / "0.png"), (10, 20, 30, 255))
+    second = _create_tile(str(tmp_path / "2" / "1" / "1.png"), (10, 20, 30, 255))
+
+    assert _compress_tms_directory(str(tmp_path), processes=1) == 2
+    assert not os.path.exists(transparent)
+    assert not os.path.exists(os.path.dirname(transparent))
+    assert os.stat(first).st_ino == os.stat(second).st_ino
@@ -6,15 +6,19 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import json
+import os
 from datetime import datetime
 
+from georeference.config.paths import PATH_IMAGE_ROOT, PATH_WORKING_COPY_ROOT
 from georeference.models.georef_map import GeorefMap
 from georeference.models.raw_map import RawMap
 from georeference.models.transformation import Transformation, EnumValidationValue
 from georeference.utils.utils import (
     fix_polygon_geometry,
     get_geometry,
+    get_readable_raw_image_path,
     get_tms_directory,
+    get_working_copy_path,
     bbox_position,
 )
 
@@ -490,6 +494,18 @@ def test_get_tms_directory_success():
     assert "m/df_dk_0010001_3352_191s8" in subject
 
 
+def test_get_working_copy_path_success():
+    path_raw_image = os.path.join(PATH_IMAGE_ROOT, "m", "df_dk_0010001_3352_191s8.tif")
+    subject = get_working_copy_path(path_raw_image)
+
+    assert subject == os.path.abspath(
+        os.path.join(PATH_WORKING_COPY_ROOT, "m", "df_dk_0010001_3352_191s8.tif")
+    )
+
+    # Without a working copy the raw image is read
+    assert get_readable_raw_image_path(path_raw_image) == path_raw_image
+
+
 def test_bbox_position_north():
     bbox = [0, 0, 0, 3]
     container = [0, 0, 1, 1]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import threading
+
+import pytest
+from osgeo import gdal, osr
+
+from georeference.utils.warp import (
+    WarpCancelledError,
+    WarpError,
+    create_gcp_dataset,
+    get_overview_count,
+    get_preview_scale,
+    warp,
+    write_cog,
+)
+
+
+def _create_image(path, size=256):
+    dataset = gdal.GetDriverByName("GTiff").Create(path, size, size, 1, gdal.GDT_Byte)
+    dataset.GetRasterBand(1).Fill(128)
+    dataset.FlushCache()
+    del dataset
+    return path
+
+
+def _get_gcps(size=256):
+    return [
+        gdal.GCP(13.0, 51.1, 0, 0, 0),
+        gdal.GCP(13.1, 51.1, 0, size, 0),
+        gdal.GCP(13.1, 51.0, 0, size, size),
+        gdal.GCP(13.0, 51.0, 0, 0, size),
+    ]
+
+
+def test_warp_gcp_dataset_in_memory(tmp_path):
+    src_file = _create_image(str(tmp_path / "src.tif"))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4314)
+    vrt_path = create_gcp_dataset(src_file, _get_gcps(), srs.ExportToWkt())
+    dst_file = str(tmp_path / "dst.tif")
+
+    try:
+        response = warp(
+            dst_file, vrt_path, config_options={"GDAL_CACHEMAX": 64}, dstAlpha=True
+        )
+
+        dataset = gdal.Open(response)
+        assert response == dst_file
+        assert dataset.RasterCount == 2
+        assert dataset.GetGCPCount() == 0
+        assert dataset.GetGeoTransform() != (0, 1, 0, 0, 0, 1)
+    finally:
+        gdal.Unlink(vrt_path)
+
+
+def test_warp_cancelled(tmp_path):
+    src_file = _create_image(str(tmp_path / "src.tif"))
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    with pytest.raises(WarpCancelledError):
+        warp(
+            str(tmp_path / "dst.tif"),
+            src_file,
+            cancel_event=cancel_event,
+            dstSRS="EPSG:3857",
+            srcSRS="EPSG:4326",
+        )
+
+
+def test_warp_raises_structured_error(tmp_path):
+    with pytest.raises(WarpError):
+        warp(str(tmp_path / "dst.tif"), str(tmp_path / "missing.tif"))
+
+
+def test_get_overview_count():
+    assert get_overview_count(200, 100, 256) == 0
+    assert get_overview_count(1024, 512, 256) == 2
+    assert get_overview_count(1000, 3000, 256) == 4
+
+
+def test_write_cog_with_mask(tmp_path):
+    src_file = str(tmp_path / "src.tif")
+    dataset = gdal.GetDriverByName("GTiff").Create(
+        src_file, 1024, 1024, 4, gdal.GDT_Byte
+    )
+    dataset.GetRasterBand(4).SetColorInterpretation(gdal.GCI_AlphaBand)
+    del dataset
+    dst_file = str(tmp_path / "dst.tif")
+
+    response = write_cog(dst_file, src_file, compression="JPEG", overview_min_size=256)
+
+    dataset = gdal.Open(response)
+    band = dataset.GetRasterBand(1)
+    assert dataset.RasterCount == 3
+    assert band.GetOverviewCount() == 2
+    assert band.GetMaskFlags() == gdal.GMF_PER_DATASET
+    assert dataset.GetMetadata("IMAGE_STRUCTURE")["COMPRESSION"] == "JPEG"
+    assert dataset.GetMetadata("IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+
+
+def test_create_gcp_dataset_with_scale(tmp_path):
+    src_file = _create_image(str(tmp_path / "src.tif"), size=1024)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4314)
+    scale = get_preview_scale(1024, 512, 256)
+    vrt_path = create_gcp_dataset(
+        src_file, _get_gcps(size=1024), srs.ExportToWkt(), scale=scale
+    )
+
+    try:
+        dataset = gdal.Open(vrt_path)
+        assert scale == 0.25
+        assert dataset.RasterXSize == 256
+        assert dataset.GetGCPs()[2].GCPPixel == 256
+        assert dataset.GetGCPs()[2].GCPX == 13.1
+    finally:
+        gdal.Unlink(vrt_path)
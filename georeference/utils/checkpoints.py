@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import hashlib
+import json
+import os
+import threading
+
+from loguru import logger
+
+from georeference.config.paths import PATH_CHECKPOINT_ROOT
+
+
+def get_fingerprint(inputs):
+    """Returns a stable fingerprint for the given inputs.
+
+    :param inputs: JSON serializable inputs
+    :type inputs: dict
+    :result: Hex digest
+    :rtype: str
+    """
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def get_file_signature(path):
+    """Returns a signature of a file or directory, which changes as soon as it is replaced or modified.
+
+    :param path: Path of the file or directory
+    :type path: str
+    :result: Signature or None if the path does not exist
+    :rtype: list|None
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+class PipelineCheckpoint:
+    """Durable checkpoint of a multi-stage pipeline. The checkpoint is stored as JSON file and is keyed by a name
+    (e.g. the transformation id) and the fingerprint of the inputs. A stage is skipped, if it was completed with the
+    same fingerprint, its output is still unchanged and the outputs of the stages it depends on are the same as
+    when it was completed. Stages may be run concurrently from different threads."""
+
+    def __init__(self, name, fingerprint, checkpoint_dir=PATH_CHECKPOINT_ROOT):
+        self.path = os.path.join(checkpoint_dir, f"{name}.json")
+        self.fingerprint = fingerprint
+        self.stages = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    content = json.load(f)
+                if content.get("fingerprint") == fingerprint:
+                    self.stages = content.get("stages", {})
+                else:
+                    logger.debug(
+                        f"Discard checkpoint {self.path}, because the inputs have changed."
+                    )
+            except Exception as e:
+                logger.warning(f"Could not read checkpoint {self.path}.")
+                logger.error(e)
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "stages": self.stages}, f)
+        os.replace(tmp_path, self.path)
+
+    def _get_dependency_signatures(self, depends_on):
+        return {
+            stage: self.stages[stage]["signature"] if stage in self.stages else None
+            for stage in depends_on
+        }
+
+    def is_completed(self, stage, depends_on=()):
+        """Checks if a stage was completed and neither its output nor the outputs of its dependencies changed.
+
+        :param stage: Name of the stage
+        :type stage: str
+        :param depends_on: Names of the stages, whose outputs are used by the stage
+        :type depends_on: str[]
+        :result: True if the stage can be skipped
+        :rtype: bool
+        """
+        with self.lock:
+            checkpoint = self.stages.get(stage)
+            if checkpoint is None:
+                return False
+            if checkpoint.get("dependencies", {}) != self._get_dependency_signatures(
+                depends_on
+            ):
+                return False
+        return get_file_signature(checkpoint["output"]) == checkpoint["signature"]
+
+    def run_stage(self, stage, run, depends_on=()):
+        """Runs a stage, unless it can be skipped. The result of the stage is the path of its output. The stages it
+            depends on have to be run before.
+
+        :param stage: Name of the stage
+        :type stage: str
+        :param run: Function, which runs the stage and returns the path of the output
+        :type run: function
+        :param depends_on: Names of the stages, whose outputs are used by the stage
+        :type depends_on: str[]
+        :result: Path of the output
+        :rtype: str|None
+        """
+        if self.is_completed(stage, depends_on):
+            logger.info(f"Skip stage {stage}, because it was already completed.")
+            return self.stages[stage]["output"]
+
+        with self.lock:
+            if self.stages.pop(stage, None) is not None:
+                self._write()
+
+        output = run()
+
+        signature = get_file_signature(output)
+        if signature is not None:
+            with self.lock:
+                self.stages[stage] = {
+                    "output": output,
+                    "signature": signature,
+                    "dependencies": self._get_dependency_signatures(depends_on),
+                }
+                self._write()
+        return output
+
+    def clear(self):
+        """Removes the checkpoint, e.g. after the pipeline has finished."""
+        with self.lock:
+            self.stages = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+import os
+import threading
+import uuid
+
+from loguru import logger
+
+from georeference.config.paths import PATH_TMP_TRANSFORMATION_ROOT
+from georeference.utils.checkpoints import get_file_signature, get_fingerprint
+
+
+def _normalize_gcps(gcps):
+    # The result of a transformation does not depend on the order of the gcps
+    return sorted(
+        [round(value, 8) for value in [*gcp["source"], *gcp["target"]]] for gcp in gcps
+    )
+
+
+def get_dry_run_key(
+    raw_map_obj, transformation_params, target_crs, clip=None, scale=1.0
+):
+    """Returns the key of a dry run. It is the fingerprint of the raw map, the signature of the raw image, the
+    normalized gcps, the algorithm, the target crs, the clip and the preview scale.
+
+    :param raw_map_obj: RawMap
+    :type raw_map_obj: georeference.models.raw_maps.RawMap
+    :param transformation_params: Dict describing the transformation_params
+    :type transformation_params: Dict
+    :param target_crs: ESPG code of the target crs
+    :type target_crs: str
+    :param clip: Clip geometry
+    :type clip: dict|None
+    :param scale: Factor, by which the resolution of the raw image is reduced (Default: 1.0)
+    :type scale: float
+    :result: Key of the dry run
+    :rtype: str
+    """
+    return get_fingerprint(
+        {
+            "raw_map_id": raw_map_obj.id,
+            "raw_image": get_file_signature(raw_map_obj.get_abs_path()),
+            "gcps": _normalize_gcps(transformation_params["gcps"]),
+            "algorithm": transformation_params["algorithm"],
+            "target_crs": target_crs,
+            "clip": clip,
+            "scale": scale,
+        }
+    )
+
+
+class DryRunCache:
+    """Content-addressed cache of the results of transformation dry runs. A record is stored as JSON file per key and
+    references the temporary files of the dry run. It is valid, as long as all of these files exist. Concurrent
+    requests for the same key within a process share one computation (single-flight)."""
+
+    def __init__(self, cache_dir=PATH_TMP_TRANSFORMATION_ROOT):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def _get_record_path(self, key):
+        return os.path.join(self.cache_dir, f"dry_run_{key}.json")
+
+    def get(self, key):
+        """Returns the cached response for a key.
+
+        :param key: Key of the dry run
+        :type key: str
+        :result: Response or None, if there is no valid record
+        :rtype: dict|None
+        """
+        try:
+            with open(self._get_record_path(key)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not all(os.path.exists(path) for path in record["files"]):
+            return None
+        return record["response"]
+
+    def set(self, key, response, files):
+        """Stores the response for a key. The record is replaced atomically.
+
+        :param key: Key of the dry run
+        :type key: str
+        :param response: JSON serializable response of the dry run
+        :type response: dict
+        :param files: Paths of the temporary files, which are referenced by the response
+        :type files: list[str]
+        """
+        path = self._get_record_path(key)
+        tmp_path = f"{path}.{uuid.uuid4()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"response": response, "files": files}, f)
+        os.replace(tmp_path, path)
+
+    def get_or_create(self, key, create):
+        """Returns the cached response for a key or computes it. Concurrent calls for the same key wait for the
+        computation of the first call and receive its response or exception.
+
+        :param key: Key of the dry run
+        :type key: str
+        :param create: Function, which runs the dry run and returns the response and the paths of its files
+        :type create: Callable[[], (dict, list[str])]
+        :result: Response of the dry run
+        :rtype: dict
+        """
+        response = self.get(key)
+        if response is not None:
+            logger.debug(f"Use cached dry run {key}.")
+            return response
+
+        with self.lock:
+            flight = self.in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = {"done": threading.Event(), "response": None, "error": None}
+                self.in_flight[key] = flight
+
+        if not is_leader:
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["response"]
+
+        try:
+            # The record might have been written, while waiting for the lock
+            response = self.get(key)
+            if response is None:
+                response, files = create()
+                self.set(key, response, files)
+            flight["response"] = response
+            return response
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight["done"].set()
+
+
+dry_run_cache = DryRunCache()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+from georeference.config.settings import get_settings
+
+# Status codes of single bulk items, which signal that elasticsearch rejected the item because it is overloaded
+RETRYABLE_ITEM_STATUS_CODES = {429, 503}
+
+
+class BulkRejectedError(Exception):
+    """Is raised if bulk operations are still rejected by an overloaded elasticsearch after all retries."""
+
+
+class BulkIndexer:
+    """Buffers index and delete operations and sends them in batches to the _bulk API of elasticsearch. Items, which
+    are rejected because elasticsearch is overloaded, are retried with a backoff. All other failed items are logged
+    and collected in the errors. The buffer is flushed when the batch is full and when the context is left.
+    Operations are only removed from the buffer, once elasticsearch has answered them."""
+
+    def __init__(
+        self, es_index, index_name, batch_size=500, max_retries=3, retry_backoff=1
+    ):
+        self.es_index = es_index
+        self.index_name = index_name
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.buffer = []
+        self.errors = []
+        self.indexed_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # If the context failed, e.g. because a flush failed, the operations are kept in the buffer
+        if exc_type is None:
+            self.flush()
+
+    def index(self, document_id, document, on_success=None):
+        """Adds a document to the buffer.
+
+        :param document_id: Id of the document
+        :type document_id: str
+        :param document: Document matching the es mapping
+        :type document: dict
+        :param on_success: Function, which is called after the document was indexed successfully
+        :type on_success: function|None
+        """
+        self._add({"index": {"_id": document_id}}, document, on_success)
+
+    def delete(self, document_id, on_success=None):
+        """Adds the deletion of a document to the buffer.
+
+        :param document_id: Id of the document
+        :type document_id: str
+        :param on_success: Function, which is called after the document was deleted successfully
+        :type on_success: function|None
+        """
+        self._add({"delete": {"_id": document_id}}, None, on_success)
+
+    def _add(self, action, document, on_success):
+        self.buffer.append((action, document, on_success))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Sends the buffered operations to elasticsearch. If the request fails or items are still rejected after all
+        retries, the remaining operations are kept in the buffer and the error is raised, so that a later flush sends
+        them again.
+
+        :raise: elasticsearch.exceptions.TransportError|BulkRejectedError
+        """
+        attempt = 0
+        while len(self.buffer) > 0:
+            operations = self.buffer
+            response = self.es_index.bulk(
+                body=_to_ndjson(operations), index=self.index_name
+            )
+            rejected = []
+            for operation, item in zip(operations, response["items"]):
+                result = next(iter(item.values()))
+                status = result.get("status", 500)
+
+                # A delete of a missing document is not an error
+                if status < 300 or ("delete" in item and status == 404):
+                    self.indexed_count += 1
+                    if operation[2] is not None:
+                        operation[2]()
+                elif status in RETRYABLE_ITEM_STATUS_CODES:
+                    rejected.append(operation)
+                else:
+                    logger.warning(
+                        f"Failed bulk operation for document {result.get('_id')} with status {status}."
+                    )
+                    logger.error(result.get("error"))
+                    self.errors.append(
+                        {
+                            "id": result.get("_id"),
+                            "status": status,
+                            "error": result.get("error"),
+                        }
+                    )
+
+            self.buffer = rejected
+            if len(rejected) > 0:
+                if attempt >= self.max_retries:
+                    raise BulkRejectedError(
+                        f"{len(rejected)} bulk operations were rejected after {attempt} retries."
+                    )
+                attempt += 1
+                backoff = self.retry_backoff * 2 ** (attempt - 1)
+                logger.info(
+                    f"Retry {len(rejected)} rejected bulk operations in {backoff} seconds ..."
+                )
+                time.sleep(backoff)
+
+
+def get_bulk_indexer_from_settings(es_index, index_name=None):
+    settings = get_settings()
+    return BulkIndexer(
+        es_index,
+        index_name if index_name is not None else settings.ES_INDEX_NAME,
+        batch_size=settings.ES_BULK_BATCH_SIZE,
+        max_retries=settings.ES_BULK_MAX_RETRIES,
+        retry_backoff=settings.ES_BULK_RETRY_BACKOFF,
+    )
+
+
+def _to_ndjson(operations):
+    lines = []
+    for action, document, _ in operations:
+        lines.append(json.dumps(action))
+        if document is not None:
+            lines.append(json.dumps(document))
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def relaxed_index_settings(es_index, index_name):
+    """Disables the refresh and the replicas of an index during a full rebuild, which speeds up the bulk indexing.
+    Afterwards the previous settings are restored and the index is refreshed.
+
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param index_name: Name of the index
+    :type index_name: str
+    """
+    response = es_index.indices.get_settings(index=index_name)
+    index_settings = next(iter(response.values()))["settings"]["index"]
+    previous_settings = {
+        "refresh_interval": index_settings.get("refresh_interval", "1s"),
+        "number_of_replicas": index_settings.get("number_of_replicas", "1"),
+    }
+
+    logger.debug(f"Relax the settings of index {index_name} ...")
+    es_index.indices.put_settings(
+        index=index_name,
+        body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}},
+    )
+    try:
+        yield
+    finally:
+        logger.debug(f"Restore the settings of index {index_name} ...")
+        es_index.indices.put_settings(
+            index=index_name, body={"index": previous_settings}
+        )
+        es_index.indices.refresh(index=index_name)
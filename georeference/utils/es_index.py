@@ -13,6 +13,8 @@ import json
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 import os
+import re
+from datetime import datetime
 
 from elasticsearch import Elasticsearch
 from loguru import logger
@@ -25,6 +27,11 @@ from georeference.config.templates import (
 )
 from georeference.utils.georeference import get_image_size
 from georeference.utils.parser import to_public_map_id, to_public_mosaic_map_id
+from georeference.utils.tile_archives import (
+    get_tile_archive_path,
+    read_tile_archive_metadata,
+)
+from georeference.utils.utils import get_tms_directory
 
 MAPPING = {
     "map_id": {"type": "text", "index": True},  # string id
@@ -58,6 +65,8 @@ MAPPING = {
     # [{	"url":"http://digital.slub-dresden.de/id335921620", "type":"Permalinkk" }]
     "tms_urls": {"type": "text", "index": False},
     # ["http://vk2-cdn{s}.slub-dresden.de/tms/mtb/df_dk_0010001_5248_1933"],
+    "tile_archives": {"type": "object", "enabled": False},
+    # [{"format": "pmtiles", "urls": ["http://vk2-cdn{s}.slub-dresden.de/tms/mtb/df_dk_0010001_5248_1933.pmtiles"], "bounds": [13.7, 50.7, 13.9, 50.8], "minzoom": 0, "maxzoom": 15}]
     "thumb_url": {"type": "text", "index": False},
     # "http://fotothek.slub-dresden.de/thumbs/df/dk/0010000/df_dk_0010001_5248_1933.jpg"
     "geometry": {"type": "geo_shape"},  # GeoJSON
@@ -158,6 +167,37 @@ def _get_online_resource_wcs_for_download(georef_map_obj, coverage_title, extent
     }
 
 
+def _get_tile_archives(raw_map_obj):
+    """Returns the urls, bounds and zoom levels of the existing tile archives of a map. Only archives of the
+    configured TMS_ARCHIVE_FORMATS are listed, as archives of other formats are not updated anymore. The archives are
+    read from disk, so the document has to be generated after the tms stage has finished.
+
+    :param raw_map_obj: Original map
+    :type raw_map_obj: georeference.models.raw_maps.RawMap
+    :result: Tile archives
+    :rtype: dict[]
+    """
+    tile_archives = []
+    tms_dir = get_tms_directory(raw_map_obj)
+    for archive_format in get_settings().TMS_ARCHIVE_FORMATS:
+        archive_path = get_tile_archive_path(tms_dir, archive_format)
+        if not os.path.exists(archive_path):
+            continue
+
+        item = get_tile_archive_path(
+            str(raw_map_obj.map_type).lower() + "/" + raw_map_obj.file_name,
+            archive_format,
+        )
+        tile_archives.append(
+            {
+                "format": archive_format,
+                "urls": [template.format(item) for template in TEMPLATE_TMS_URLS],
+                **read_tile_archive_metadata(archive_path),
+            }
+        )
+    return tile_archives
+
+
 def generate_es_original_map_document(
     raw_map_obj, metadata_obj, georef_map_obj=None, geometry=None
 ):
@@ -194,6 +234,7 @@ def generate_es_original_map_document(
 
         # Create tms link
         tms_urls = []
+        tile_archives = []
         if georef_map_obj is not None and os.path.exists(georef_map_obj.get_abs_path()):
             for template in TEMPLATE_TMS_URLS:
                 tms_urls.append(
@@ -201,6 +242,7 @@ def generate_es_original_map_document(
                         str(raw_map_obj.map_type).lower() + "/" + raw_map_obj.file_name
                     )
                 )
+            tile_archives = _get_tile_archives(raw_map_obj)
 
         keywords = ";".join(
             list(
@@ -226,6 +268,7 @@ def generate_es_original_map_document(
             "slub_url": metadata_obj.permalink,
             "online_resources": online_resources,
             "tms_urls": tms_urls,
+            "tile_archives": tile_archives,
             "thumb_url": str(metadata_obj.link_thumb_small).replace("http:", ""),
             "geometry": geometry if geometry is not None else None,  #
             "has_georeference": georef_map_obj is not None,
@@ -269,6 +312,7 @@ def generate_es_mosaic_map_document(mosaic_map_obj, geometry=None):
             "slub_url": None,
             "online_resources": online_resources,
             "tms_urls": [],
+            "tile_archives": [],
             "thumb_url": str(mosaic_map_obj.link_thumb).replace("http:", ""),
             "geometry": geometry if geometry is not None else None,  #
             "has_georeference": True,
@@ -294,7 +338,9 @@ def get_es_index(es_config, index_name, force_recreation):
     }}
     :param index_name: Name of the index
     :type index_name: str
-    :param force_recreation: Signals that the index should be created fresh
+    :param force_recreation: Signals that the index should be created fresh. A new, empty version is created, while
+        the alias keeps pointing to the previous version. The initialization fills the new version and switches the
+        alias afterwards (see run_initialize_data).
     :type force_recreation: bool
     :result: Reference on the index
     :rtype: elasticsearch.Elasticsearch
@@ -317,22 +363,19 @@ def get_es_index(es_config, index_name, force_recreation):
             use_ssl=es_config["ssl"],
             timeout=5000,
         )
-        index_exists = es.indices.exists(index_name)
-
-        # Force a reset of the index
-        if force_recreation and index_exists:
-            logger.debug("Delete current index, because forceRecreation=True")
-            es.indices.delete(index_name, ignore=404)
-
-        # Check if index exists and if not create it
-        if index_exists is False or force_recreation:
+        # The index name is an alias on a versioned index. A recreation only creates a new version, so that the
+        # search keeps using the previous version until the new one is filled.
+        if not es.indices.exists(index_name):
             logger.debug(
                 'Index "%s" does not exist. Create a fresh index.' % index_name
             )
-            es.indices.create(
-                index=index_name,
-                body={"mappings": {"properties": MAPPING}},
+            swap_index_alias(es, index_name, create_index_version(es, index_name))
+        elif force_recreation:
+            logger.debug(
+                'Index "%s" should be recreated. Create a fresh index version.'
+                % index_name
             )
+            create_index_version(es, index_name)
         return es
     except Exception as e:
         logger.debug(es_config)
@@ -340,6 +383,125 @@ def get_es_index(es_config, index_name, force_recreation):
         logger.error(e)
 
 
+def create_index_version(es_index, index_name):
+    """Creates a new, empty version of an index. The version is not searchable via the index name until the alias is
+        switched to it.
+
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param index_name: Name of the index (alias)
+    :type index_name: str
+    :result: Name of the new version
+    :rtype: str
+    """
+    version_name = f"{index_name}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    logger.debug(f"Create index version {version_name} ...")
+    es_index.indices.create(
+        index=version_name,
+        body={"mappings": {"properties": MAPPING}},
+    )
+    return version_name
+
+
+def _get_index_versions(es_index, index_name):
+    pattern = re.compile(rf"^{re.escape(index_name)}_\d{{20}}$")
+    response = es_index.indices.get(index=f"{index_name}_*", ignore=404)
+    return sorted(name for name in response.keys() if pattern.match(name))
+
+
+def get_pending_index_version(es_index, index_name):
+    """Returns the most recent version of an index, which was created after the version the alias points to and is
+        not searchable yet.
+
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param index_name: Name of the index (alias)
+    :type index_name: str
+    :result: Name of the version or None
+    :rtype: str|None
+    """
+    active_versions = _get_active_index_versions(es_index, index_name)
+    pending_versions = [
+        version
+        for version in _get_index_versions(es_index, index_name)
+        if len(active_versions) == 0 or version > max(active_versions)
+    ]
+    return pending_versions[-1] if len(pending_versions) > 0 else None
+
+
+def _get_active_index_versions(es_index, index_name):
+    if es_index.indices.exists_alias(name=index_name):
+        return set(es_index.indices.get_alias(name=index_name).keys())
+    return set()
+
+
+def swap_index_alias(es_index, index_name, version_name):
+    """Points the alias atomically to the given version of the index. An index, which was created before the
+        versioning and uses the name of the alias, is removed within the same request.
+
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param index_name: Name of the index (alias)
+    :type index_name: str
+    :param version_name: Name of the version
+    :type version_name: str
+    """
+    actions = []
+    if es_index.indices.exists_alias(name=index_name):
+        for current_version in es_index.indices.get_alias(name=index_name).keys():
+            if current_version != version_name:
+                actions.append(
+                    {"remove": {"index": current_version, "alias": index_name}}
+                )
+    elif es_index.indices.exists(index_name):
+        actions.append({"remove_index": {"index": index_name}})
+    actions.append({"add": {"index": version_name, "alias": index_name}})
+
+    logger.debug(f"Switch alias {index_name} to index version {version_name} ...")
+    es_index.indices.update_aliases(body={"actions": actions})
+
+
+def delete_old_index_versions(es_index, index_name, keep=None):
+    """Deletes old versions of an index, which are older than the version referenced by the alias. The most recent
+        previous versions are kept, which allows to switch back.
+
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param index_name: Name of the index (alias)
+    :type index_name: str
+    :param keep: Number of previous versions to keep (Default: ES_INDEX_KEEP_VERSIONS)
+    :type keep: int|None
+    """
+    keep = keep if keep is not None else get_settings().ES_INDEX_KEEP_VERSIONS
+    active_versions = _get_active_index_versions(es_index, index_name)
+
+    # Versions, which are newer than the active one, are still being built
+    previous_versions = [
+        version
+        for version in _get_index_versions(es_index, index_name)
+        if version not in active_versions
+        and (len(active_versions) == 0 or version < max(active_versions))
+    ]
+    outdated_versions = previous_versions[: max(0, len(previous_versions) - keep)]
+    for version in outdated_versions:
+        logger.debug(f"Delete outdated index version {version} ...")
+        es_index.indices.delete(index=version, ignore=404)
+
+
+def get_es_index_uuid(es_index, index_name):
+    """Returns the uuid of an index. It changes, whenever the index is recreated.
+
+    :param es_index: Elasticsearch client
+    :type es_index: elasticsearch.Elasticsearch
+    :param index_name: Name of the index
+    :type index_name: str
+    :result: Uuid of the index
+    :rtype: str
+    """
+    response = es_index.indices.get_settings(index=index_name)
+    return next(iter(response.values()))["settings"]["index"]["uuid"]
+
+
 def get_es_index_from_settings(force_recreation: bool):
     settings = get_settings()
     return get_es_index(
@@ -6,17 +6,12 @@
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
 
-import json
 import os
-import subprocess
-import sys
 
 # Created by jacob.mendt@pikobytes.de on 06.09.21
 #
 # This file is subject to the terms and conditions defined in file
 # "LICENSE", which is part of this source code package
-import uuid
-
 import pyproj
 from loguru import logger
 from osgeo import gdal
@@ -24,6 +19,14 @@ from osgeo import osr
 from osgeo.gdalconst import GA_ReadOnly
 
 from georeference.config.settings import get_settings
+from georeference.utils.metrics import stage_timer
+from georeference.utils.warp import (
+    create_gcp_dataset,
+    create_geojson_file,
+    get_memory_path,
+    warp,
+    write_cog,
+)
 
 settings = get_settings()
 
@@ -39,44 +42,6 @@ CO_PARAMETER = [
 ]
 
 
-def _add_overviews(dst_file, overview_levels):
-    """Function adds overview to given geotiff.
-
-    :param dst_file: Path of the destination image to which overviews should be added
-    :type dst_file: str
-    :param overview_levels: String describing the adding of overview levels
-    :type overview_levels: str
-    :return: str
-    :raise: Exception"""
-    try:
-        logger.debug("Adding overviews to raster %s" % dst_file)
-        command = f"gdaladdo --config GDAL_CACHEMAX 500 -r average {dst_file} {overview_levels}"
-        subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT)
-        return dst_file
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output)
-        raise
-    except Exception as e:
-        logger.warning(
-            f"{sys.stderr} - Unexpected error while trying add overviews to the raster: {sys.exc_info()[0]} - with command - {command}"
-        )
-        logger.error(e)
-        raise
-
-
-def _create_vrt(src_dataset, dst_file):
-    """This functions creates a vrt for a corresponding, from gdal supported, source dataset.
-
-    :type src_dataset: osgeo.gdal.Dataset
-    :type dst_file: str
-    :result: Path of the VRT
-    :rtype: str"""
-    output_format = "VRT"
-    dst_driver = gdal.GetDriverByName(output_format)
-    dst_dataset = dst_driver.CreateCopy(dst_file, src_dataset, 0)
-    return dst_dataset
-
-
 def _get_extent_from_dataset(dataset):
     """Returns the extent of a given gdal dataset.
 
@@ -151,6 +116,22 @@ def get_image_extent(file_path):
         del dataset
 
 
+def get_image_resolution(file_path):
+    """Returns the pixel size for a given georeference image.
+
+    :param file_path: Path to the georeferenced image
+    :type file_path: str
+    :return: Pixel size in x and y direction in units of the spatial reference system
+    :rtype: [number, number]
+    """
+    dataset = gdal.Open(file_path, GA_ReadOnly)
+    try:
+        geotransform = dataset.GetGeoTransform()
+        return [abs(geotransform[1]), abs(geotransform[5])]
+    finally:
+        del dataset
+
+
 def get_image_size(file_path):
     """Functions looks for the image size of an given path
 
@@ -174,10 +155,20 @@ def get_image_size(file_path):
 
 
 def rectify_image(
-    src_file, dst_file, algorithm, gcps, srs, tmp_dir, clip_geo_json=None
+    src_file,
+    dst_file,
+    algorithm,
+    gcps,
+    srs,
+    clip_geo_json=None,
+    cancel_event=None,
+    output_format="GTiff",
+    scale=1.0,
 ):
-    """Functions generates and clips a georeferenced image based on a polynom transformation. This function heavily
-    relies on the usage of [gdalwarp](https://gdal.org/programs/gdalwarp.html).
+    """Functions generates and clips a georeferenced image based on a polynom transformation. The image is warped
+    in-process with [gdal.Warp](https://gdal.org/programs/gdalwarp.html), the source image with the ground control
+    points is kept in /vsimem/. A COG is written from a warped VRT, so that the warping, the compression and the
+    overviews are processed within a single pass.
 
     :param src_file: Source image path
     :type src_file: str
@@ -189,19 +180,23 @@ def rectify_image(
     :type gcps: List.<gdal.GCP>
     :param srs: EPSG code of the spatial reference system. Currently only EPSG:4314 is supported
     :type srs: str
-    :param tmp_dir: Path for temporary working directory
-    :type tmp_dir: str
-    :param clip_geo_json: Path to the GeoJSON which is used for clipping
-    :type clip_geo_json: str (Default: None)
+    :param clip_geo_json: GeoJSON geometry or path to a GeoJSON which is used for clipping
+    :type clip_geo_json: dict|str (Default: None)
+    :param cancel_event: If the event is set, the rectification is cancelled
+    :type cancel_event: threading.Event|None
+    :param output_format: Format of the target image (Default: GTiff)
+    :type output_format: 'GTiff', 'COG'
+    :param scale: Factor, by which the resolution of the source image is reduced, e.g. for previews (Default: 1.0)
+    :type scale: float
     :raise: ValueError
+    :raise: georeference.utils.warp.WarpError
     :result: Path to the target image
     :rtype: str
     """
-    tmp_file = None
+    vrt_path = None
+    clip_path = None
+    warped_vrt_path = None
     try:
-        # define tmp file path
-        tmp_data_name = uuid.uuid4()
-
         # get projection
         geo_proj = pyproj.CRS.from_string(srs.upper()).to_wkt()
 
@@ -210,49 +205,51 @@ def rectify_image(
             raise ValueError('The given algorithm "%s" is not supported.' % algorithm)
 
         # Create a virtual raster dataset and add the GCP with the target geoprojection to it
-        tmp_file = os.path.abspath(os.path.join(tmp_dir, "%s.vrt" % tmp_data_name))
-        logger.debug("Create temporary file - %s" % tmp_file)
-        new_dataset = _create_vrt(gdal.Open(src_file, GA_ReadOnly), tmp_file)
-        new_dataset.SetGCPs(gcps, geo_proj)
-        new_dataset.FlushCache()
-
-        if os.path.exists(tmp_file):
-            logger.info("Rectify image with a %s transformation ..." % (algorithm))
-
-            # For a full understanding of the warp command, have a look at the documentation: https://gdal.org/programs/gdalwarp.html
-            warp_command = "gdalwarp {config_options} {creation_options} {resampling_method} {warp_memory} {algorithm} {cutline} -dstalpha -overwrite {source_file} {target_file}".format(
-                # In case no algorithm is set, the gdalwarp command tries to detect the correct order of a polynom by using
-                # the count of gcps attached to the image
-                algorithm="-tps"
-                if algorithm == "tps"
-                else "-order 1"
-                if algorithm == "affine"
-                else "",
-                config_options=" ".join(
-                    ["--config %s %s" % (el[0], el[1]) for el in GC_PARAMTER]
-                ),
-                # If a shapefile with a clip polygon is defined it is used.
-                cutline="-crop_to_cutline -cutline '{geojson}'".format(
-                    geojson=str(clip_geo_json).replace("'", '"')
-                )
-                if clip_geo_json is not None
-                else "",
-                creation_options=" ".join(
-                    ['-co "%s=%s"' % (el[0], el[1]) for el in CO_PARAMETER]
-                ),
-                resampling_method="-r near",
-                source_file=tmp_file,
-                target_file=dst_file,
-                warp_memory=f"-wm {settings.GDAL_WARP_MEMORY}",
+        vrt_path = create_gcp_dataset(src_file, gcps, geo_proj, scale=scale)
+
+        # If a clip polygon is defined it is used as cutline
+        if isinstance(clip_geo_json, dict):
+            clip_path = create_geojson_file(clip_geo_json)
+
+        logger.info("Rectify image with a %s transformation ..." % (algorithm))
+
+        # For a full understanding of the warp options, have a look at the documentation: https://gdal.org/programs/gdalwarp.html
+        warp_options = dict(
+            config_options=dict(GC_PARAMTER),
+            resampleAlg="near",
+            warpMemoryLimit=settings.GDAL_WARP_MEMORY,
+            dstAlpha=True,
+            # In case no algorithm is set, gdal tries to detect the correct order of a polynom by using the count of
+            # gcps attached to the image
+            tps=algorithm == "tps",
+            polynomialOrder=1 if algorithm == "affine" else None,
+            cutlineDSName=clip_path if clip_path is not None else clip_geo_json,
+            cropToCutline=clip_geo_json is not None,
+        )
+        if output_format != "COG":
+            return warp(
+                dst_file,
+                vrt_path,
+                stage="warp",
+                cancel_event=cancel_event,
+                creationOptions=["%s=%s" % (el[0], el[1]) for el in CO_PARAMETER],
+                **warp_options,
             )
 
-            # run the command
-            logger.debug(warp_command)
-            subprocess.check_output(warp_command, shell=True, stderr=subprocess.STDOUT)
-        return dst_file
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output)
-        raise
+        # The warped VRT only describes the warping. The pixels are warped while the COG is written.
+        warped_vrt_path = warp(
+            get_memory_path(".vrt"), vrt_path, format="VRT", **warp_options
+        )
+        return write_cog(
+            dst_file,
+            warped_vrt_path,
+            compression=settings.GEO_IMAGE_COMPRESSION,
+            quality=settings.GEO_IMAGE_QUALITY,
+            overview_min_size=settings.GEO_IMAGE_OVERVIEW_MIN_SIZE,
+            stage="warp",
+            cancel_event=cancel_event,
+            config_options=dict(GC_PARAMTER),
+        )
     except pyproj.exceptions.CRSError as e:
         logger.error(e)
         raise
@@ -260,15 +257,15 @@ def rectify_image(
         logger.error(e)
         raise
     finally:
-        if os.path.exists(tmp_file):
-            os.remove(tmp_file)
-        del new_dataset
+        for path in [warped_vrt_path, vrt_path, clip_path]:
+            if path is not None:
+                gdal.Unlink(path)
 
 
 def rectify_image_with_clip_and_overviews(
-    src_file, dst_file, algorithm, gcps, gcps_srs, tmp_dir, clip=None
+    src_file, dst_file, algorithm, gcps, gcps_srs, clip=None
 ):
-    """Function rectifies a image, clips it and adds overviews to it.
+    """Function rectifies a image, clips it and writes it as Cloud Optimized GeoTIFF with internal overviews.
 
     :param src_file: Source image path
     :type src_file: str
@@ -280,8 +277,6 @@ def rectify_image_with_clip_and_overviews(
     :type gcps: List.<gdal.GCP>
     :param gcps_srs: EPSG code of the spatial reference system of the gcps. Currently only EPSG:4314 is supported
     :type gcps_srs: str
-    :param tmp_dir: Path for temporary working directory
-    :type tmp_dir: str
     :param clip: Clip as a GeoJSON geometry
     :type clip: dict
     :raise: ValueError
@@ -292,31 +287,19 @@ def rectify_image_with_clip_and_overviews(
         if not os.path.exists(os.path.dirname(dst_file)):
             os.makedirs(os.path.dirname(dst_file))
 
-        # Create the clip shapefile
-        clip_file = None
-        if clip is not None:
-            clip_file = os.path.abspath(
-                os.path.join(tmp_dir, "%s.geojson" % uuid.uuid4())
+        with stage_timer("geo_image"):
+            rectify_image(
+                src_file,
+                dst_file,
+                algorithm,
+                gcps,
+                gcps_srs,
+                clip_geo_json=clip,
+                output_format="COG",
             )
-            with open(clip_file, "w") as jsonFile:
-                json.dump(clip, jsonFile, indent=2)
-                jsonFile.close()
-
-        rectify_image(
-            src_file,
-            dst_file,
-            algorithm,
-            gcps,
-            gcps_srs,
-            tmp_dir,
-            clip_geo_json=clip_file,
-        )
 
         if not os.path.exists(dst_file):
             raise Exception("Could not find result of rectifyImage.")
-        else:
-            logger.info("Add overviews to the image ...")
-            _add_overviews(dst_file, "2 4 8 16 32")
 
         return dst_file
     except Exception as e:
@@ -342,15 +325,12 @@ def reproject_image_from_4314_15869_to_3857(src_file, dst_file):
     :result: Path to the target image
     :rtype: str
     """
-    try:
-        warp_command = f"gdalwarp -r near -wm {settings.GDAL_WARP_MEMORY} -s_srs '+proj=longlat +ellps=bessel +towgs84=612.4,77,440.2,-0.054,0.057,-2.797,2.55 +no_defs +type=crs' -t_srs EPSG:3857 {src_file} {dst_file}"
-        # run the command
-        logger.debug(warp_command)
-        subprocess.check_output(warp_command, shell=True, stderr=subprocess.STDOUT)
-        return dst_file
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output)
-        raise
-    except Exception as e:
-        logger.error(e)
-        raise
+    return warp(
+        dst_file,
+        src_file,
+        stage="reproject",
+        resampleAlg="near",
+        warpMemoryLimit=settings.GDAL_WARP_MEMORY,
+        srcSRS="+proj=longlat +ellps=bessel +towgs84=612.4,77,440.2,-0.054,0.057,-2.797,2.55 +no_defs +type=crs",
+        dstSRS="EPSG:3857",
+    )
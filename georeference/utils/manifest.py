@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+import os
+
+from loguru import logger
+
+from georeference.config.paths import PATH_MANIFEST
+
+
+class ArtifactManifest:
+    """Records the state of the derived artifacts (geo image, tms, mapfile and search document) per map. It allows
+    the initialization to only process artifacts, which are missing or stale. The manifest is stored as JSON file."""
+
+    def __init__(self, path=PATH_MANIFEST):
+        self.path = path
+        self.es_index_uuid = None
+        self.entries = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    content = json.load(f)
+                self.es_index_uuid = content.get("es_index_uuid")
+                self.entries = content.get("entries", {})
+            except Exception as e:
+                logger.warning(
+                    f"Could not read manifest {self.path}. Start with an empty one."
+                )
+                logger.error(e)
+
+    def get(self, key):
+        """Returns the entry for a map.
+
+        :param key: Key of the map, e.g. "raw_map:10001556"
+        :type key: str
+        :result: Entry of the map
+        :rtype: dict
+        """
+        return dict(self.entries.get(key, {}))
+
+    def set(self, key, entry):
+        self.entries[key] = entry
+
+    def set_document(self, key, document_fingerprint):
+        """Records the fingerprint of the search document of a map, after it was written to the index.
+
+        :param key: Key of the map, e.g. "raw_map:10001556"
+        :type key: str
+        :param document_fingerprint: Fingerprint of the search document
+        :type document_fingerprint: str
+        """
+        self.entries.setdefault(key, {})["document"] = document_fingerprint
+
+    def set_es_index_uuid(self, es_index_uuid):
+        """Sets the uuid of the search index. If the index was replaced in the meantime, all search documents have to
+            be written again.
+
+        :param es_index_uuid: Uuid of the search index
+        :type es_index_uuid: str
+        """
+        if self.es_index_uuid != es_index_uuid:
+            logger.info(
+                "The search index has changed. All documents are written again."
+            )
+            for entry in self.entries.values():
+                entry.pop("document", None)
+            self.es_index_uuid = es_index_uuid
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"es_index_uuid": self.es_index_uuid, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds. Jobs range from a few seconds (validation) up to hours (tiling
+# of large maps).
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+JOB_DURATION_METRIC = "vk_job_duration_seconds"
+STAGE_DURATION_METRIC = "vk_stage_duration_seconds"
+
+METRIC_HELP = {
+    JOB_DURATION_METRIC: "Duration of processed jobs in seconds.",
+    STAGE_DURATION_METRIC: "Duration of the stages of a transformation in seconds.",
+}
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_cumulative_counts(self):
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class MetricsRegistry:
+    """Collects duration histograms per metric name and label set. Within the worker processes of the daemon, the
+    observations are forwarded to the main process via a queue, so that the main process holds all metrics."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.forward_queue = None
+
+    def forward_to(self, queue):
+        """Forwards all following observations to the given queue instead of recording them.
+
+        :param queue: Queue of the main process
+        :type queue: multiprocessing.Queue
+        """
+        self.forward_queue = queue
+
+    def observe(self, name, value, **labels):
+        """Records a value for the histogram with the given name and labels.
+
+        :param name: Name of the metric
+        :type name: str
+        :param value: Observed value
+        :type value: float
+        """
+        if self.forward_queue is not None:
+            self.forward_queue.put((name, value, labels))
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def collect_from(self, queue):
+        """Records all observations, which were forwarded via the given queue.
+
+        :param queue: Queue of the main process
+        :type queue: multiprocessing.Queue
+        """
+        while not queue.empty():
+            try:
+                name, value, labels = queue.get_nowait()
+            except Exception:
+                break
+            self.observe(name, value, **labels)
+
+    def render(self):
+        """Renders all histograms in the Prometheus text exposition format.
+
+        :result: Lines of the exposition format
+        :rtype: str[]
+        """
+        lines = []
+        with self.lock:
+            names = sorted({name for name, _ in self.histograms.keys()})
+            for name in names:
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric_name, labels), histogram in sorted(self.histograms.items()):
+                    if metric_name != name:
+                        continue
+
+                    for bucket, count in zip(
+                        histogram.buckets, histogram.get_cumulative_counts()
+                    ):
+                        bucket_labels = format_labels(labels + (("le", bucket),))
+                        lines.append(f"{name}_bucket{bucket_labels} {count}")
+                    bucket_labels = format_labels(labels + (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{bucket_labels} {histogram.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(
+                        f"{name}_count{format_labels(labels)} {histogram.count}"
+                    )
+        return lines
+
+
+def format_labels(labels):
+    """Formats label pairs in the Prometheus text exposition format.
+
+    :param labels: Pairs of label name and value
+    :type labels: (str, any)[]
+    :result: Formatted labels, e.g. '{type="maps_create"}'
+    :rtype: str
+    """
+    if len(labels) == 0:
+        return ""
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+# Registry of the current process
+registry = MetricsRegistry()
+
+
+@contextmanager
+def stage_timer(stage):
+    """Measures the duration of a processing stage and records it, also if the stage fails.
+
+    :param stage: Name of the stage, e.g. "build_tms_cache"
+    :type stage: str
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        registry.observe(STAGE_DURATION_METRIC, time.monotonic() - start, stage=stage)
@@ -12,6 +12,7 @@ from loguru import logger
 
 from georeference.config.settings import get_settings
 from georeference.utils.georeference import get_epsg_code_from_geotiff
+from georeference.utils.warp import translate, warp
 
 settings = get_settings()
 # For a full list of all supported config options have a look at https://gdal.org/user/configoptions.html
@@ -185,46 +186,30 @@ def _warp_geo_images(source_file, target_file, target_crs):
     :result: Returns the reprojected and copied georeference image
     :rtype: str
     """
-    try:
-        # gdal warping fails, if we want to warp to the same crs as the src image. Therefor we have to check the coordinate system first
-        source_crs = get_epsg_code_from_geotiff(source_file)
-        target_crs = f"EPSG:{target_crs}"
-
-        copy_warp_command = None
-        if source_crs.lower() == target_crs.lower():
-            # For a full understanding of the warp command, have a look at the documentation: https://gdal.org/programs/gdalwarp.html
-            copy_warp_command = "gdal_translate {config_options} {creation_options} {resampling_method} {source_file} {target_file}".format(
-                config_options=" ".join(
-                    ["--config %s %s" % (el[0], el[1]) for el in GC_PARAMTER]
-                ),
-                creation_options=" ".join(
-                    ['-co "%s=%s"' % (el[0], el[1]) for el in CO_PARAMETER]
-                ),
-                resampling_method="-r near",
-                source_file=source_file,
-                target_file=target_file,
-            )
-        else:
-            # For a full understanding of the warp command, have a look at the documentation: https://gdal.org/programs/gdalwarp.html
-            copy_warp_command = "gdalwarp -overwrite {config_options} {creation_options} {resampling_method} {warp_memory} -t_srs {target_crs} {source_file} {target_file}".format(
-                config_options=" ".join(
-                    ["--config %s %s" % (el[0], el[1]) for el in GC_PARAMTER]
-                ),
-                creation_options=" ".join(
-                    ['-co "%s=%s"' % (el[0], el[1]) for el in CO_PARAMETER]
-                ),
-                resampling_method="-r near",
-                source_file=source_file,
-                target_file=target_file,
-                target_crs=target_crs,
-                warp_memory=f"-wm {settings.GDAL_WARP_MEMORY}",
-            )
-
-        # run the command
-        logger.debug(copy_warp_command)
-        subprocess.check_output(copy_warp_command, shell=True, stderr=subprocess.STDOUT)
+    # gdal warping fails, if we want to warp to the same crs as the src image. Therefor we have to check the coordinate system first
+    source_crs = get_epsg_code_from_geotiff(source_file)
+    target_crs = f"EPSG:{target_crs}"
+
+    logger.debug(f"Copy {source_file} to {target_file} with crs {target_crs} ...")
+    if source_crs.lower() == target_crs.lower():
+        # For a full understanding of the translate options, have a look at the documentation: https://gdal.org/programs/gdal_translate.html
+        return translate(
+            target_file,
+            source_file,
+            stage="copy",
+            config_options=dict(GC_PARAMTER),
+            creationOptions=["%s=%s" % (el[0], el[1]) for el in CO_PARAMETER],
+            resampleAlg="near",
+        )
 
-        return target_file
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output)
-        raise
+    # For a full understanding of the warp options, have a look at the documentation: https://gdal.org/programs/gdalwarp.html
+    return warp(
+        target_file,
+        source_file,
+        stage="reproject",
+        config_options=dict(GC_PARAMTER),
+        creationOptions=["%s=%s" % (el[0], el[1]) for el in CO_PARAMETER],
+        resampleAlg="near",
+        warpMemoryLimit=settings.GDAL_WARP_MEMORY,
+        dstSRS=target_crs,
+    )
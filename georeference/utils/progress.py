@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import contextvars
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from loguru import logger
+
+# GDAL command line tools print their progress as "0...10...20...30 ... 100 - done."
+GDAL_PROGRESS_PATTERN = re.compile(r"(\d{1,3})(?:\.\.\.| - done)")
+
+
+class ProgressReporter:
+    """Reports the progress of a job. The reports are throttled, so that a write only happens if the stage changes,
+    the stage is finished or the interval has passed since the last write. Only the thread, which runs the job,
+    writes. Stages running in other threads only leave their latest progress, which is written by flush."""
+
+    def __init__(self, write, interval):
+        self.write = write
+        self.interval = interval
+        self.owner = threading.get_ident()
+        self.pending = None
+        self.last_stage = None
+        self.last_progress = None
+        self.last_write = float("-inf")
+        self.lock = threading.Lock()
+
+    def report(self, stage, progress=None):
+        """Reports the progress of a stage.
+
+        :param stage: Name of the stage
+        :type stage: str
+        :param progress: Progress of the stage between 0 and 1
+        :type progress: float|None
+        """
+        if threading.get_ident() != self.owner:
+            with self.lock:
+                self.pending = (stage, progress)
+            return
+
+        self._write(stage, progress)
+
+    def flush(self):
+        """Writes the latest progress, which was reported by another thread. Does nothing, if it is not called by
+        the thread, which runs the job."""
+        if threading.get_ident() != self.owner:
+            return
+
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is not None:
+            self._write(*pending)
+
+    def _write(self, stage, progress):
+        percent = None if progress is None else max(0, min(100, round(progress * 100)))
+        now = time.monotonic()
+        with self.lock:
+            is_due = now - self.last_write >= self.interval or percent == 100
+            if stage == self.last_stage and (
+                percent == self.last_progress or not is_due
+            ):
+                return
+            self.last_stage = stage
+            self.last_progress = percent
+            self.last_write = now
+
+        try:
+            self.write(stage, percent)
+        except Exception as e:
+            logger.warning(f"Could not report progress of stage {stage}.")
+            logger.error(e)
+
+
+# Reporter of the job, which is processed within the current context. Other threads of the process, e.g. the
+# background initialization, do not see it. Stages of the job, which run in other threads, are submitted with
+# submit_stage.
+_current_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+
+@contextmanager
+def progress_reporting(reporter):
+    """Sets the reporter for the job, which is processed within the context.
+
+    :param reporter: Progress reporter
+    :type reporter: ProgressReporter
+    """
+    token = _current_reporter.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _current_reporter.reset(token)
+
+
+def submit_stage(executor, fn, *args):
+    """Submits a stage of the current job to a thread pool. The stage runs within a copy of the current context, so
+        that its progress is reported to the reporter of the job.
+
+    :param executor: Thread pool
+    :type executor: concurrent.futures.ThreadPoolExecutor
+    :param fn: Function of the stage
+    :type fn: function
+    :result: Future of the stage
+    :rtype: concurrent.futures.Future
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def report_progress(stage, progress=None):
+    """Reports the progress of a stage of the current job. Without a current job, this does nothing.
+
+    :param stage: Name of the stage
+    :type stage: str
+    :param progress: Progress of the stage between 0 and 1
+    :type progress: float|None
+    """
+    reporter = _current_reporter.get()
+    if reporter is not None:
+        reporter.report(stage, progress)
+
+
+def wait_with_progress(future, interval=1):
+    """Waits for the result of a stage, which runs in another thread, and writes its progress in the meantime.
+
+    :param future: Future of the stage
+    :type future: concurrent.futures.Future
+    :param interval: Seconds between two writes (Default: 1)
+    :type interval: float
+    :result: Result of the stage
+    """
+    while True:
+        try:
+            return future.result(timeout=interval)
+        except FutureTimeoutError:
+            reporter = _current_reporter.get()
+            if reporter is not None:
+                reporter.flush()
+
+
+def run_command_with_progress(command, stage):
+    """Runs a GDAL command line tool and reports its progress output for the given stage. It behaves like
+        subprocess.check_output with stderr redirected to stdout.
+
+    :param command: Shell command
+    :type command: str
+    :param stage: Name of the stage
+    :type stage: str
+    :result: Output of the command
+    :rtype: bytes
+    :raise: subprocess.CalledProcessError
+    """
+    report_progress(stage, 0)
+    output = b""
+    with subprocess.Popen(
+        command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    ) as process:
+        while True:
+            chunk = process.stdout.read1(1024)
+            if not chunk:
+                break
+            output += chunk
+
+            # Only the tail of the output is searched, as the progress is always written at the end
+            matches = GDAL_PROGRESS_PATTERN.findall(
+                output[-64:].decode(errors="ignore")
+            )
+            if len(matches) > 0:
+                report_progress(stage, int(matches[-1]) / 100)
+        return_code = process.wait()
+
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, command, output=output)
+    return output
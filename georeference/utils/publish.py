@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import os
+import re
+import shutil
+import threading
+import uuid
+from datetime import datetime
+
+from loguru import logger
+
+# Directory next to the published artifacts, which contains their versions. It is placed on the same file system,
+# so that a version is published by an atomic rename.
+VERSIONS_DIR = ".versions"
+
+
+def _get_versions_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), VERSIONS_DIR)
+
+
+def _get_version_pattern(path):
+    return re.compile(rf"^{re.escape(os.path.basename(path))}\.\d{{20}}$")
+
+
+def get_version_path(path):
+    """Returns the path of a new version of an artifact directory. Versions are named by the artifact and a
+    timestamp, so that later versions sort after earlier ones.
+
+    :param path: Path of the published artifact
+    :type path: str
+    :result: Path of the new version
+    :rtype: str
+    """
+    versions_dir = _get_versions_dir(path)
+    os.makedirs(versions_dir, exist_ok=True)
+    return os.path.join(
+        versions_dir,
+        f"{os.path.basename(path)}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}",
+    )
+
+
+def get_temporary_path(path):
+    """Returns a hidden temporary path next to an artifact file, which keeps the extension of the artifact.
+
+    :param path: Path of the published artifact
+    :type path: str
+    :result: Temporary path
+    :rtype: str
+    """
+    parent, name = os.path.split(os.path.abspath(path))
+    stem, extension = os.path.splitext(name)
+    return os.path.join(parent, f".{stem}.{uuid.uuid4().hex}{extension}")
+
+
+def publish_file(tmp_path, path):
+    """Replaces an artifact file atomically. Readers, which opened the previous file, keep reading it.
+
+    :param tmp_path: Path of the new file (see get_temporary_path)
+    :type tmp_path: str
+    :param path: Path of the published artifact
+    :type path: str
+    """
+    os.replace(tmp_path, path)
+
+
+def publish_directory(version_path, path):
+    """Publishes a version of an artifact directory by switching the symlink of the artifact atomically. Previous
+    versions are reaped in the background.
+
+    :param version_path: Path of the version (see get_version_path)
+    :type version_path: str
+    :param path: Path of the published artifact
+    :type path: str
+    """
+    parent, name = os.path.split(os.path.abspath(path))
+    tmp_link = os.path.join(parent, f".{name}.{uuid.uuid4().hex}.link")
+    os.symlink(os.path.relpath(version_path, parent), tmp_link)
+
+    # Artifacts of the previous layout are real directories. They are moved into the versions once, as the oldest
+    # version.
+    if os.path.isdir(path) and not os.path.islink(path):
+        legacy_version = f"{name}.{'0' * 20}"
+        os.rename(path, os.path.join(_get_versions_dir(path), legacy_version))
+
+    os.replace(tmp_link, path)
+    logger.debug(f"Published {version_path} as {path}.")
+    reap_versions_in_background(path)
+
+
+def unpublish(path):
+    """Removes a published artifact and reaps its versions in the background.
+
+    :param path: Path of the published artifact
+    :type path: str
+    """
+    if os.path.islink(path):
+        os.remove(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    reap_versions_in_background(path)
+
+
+def reap_versions(path):
+    """Removes the versions of an artifact, which are older than the published one. Versions, which are newer, are
+    still being built and are kept. If the artifact is not published, all versions are removed.
+
+    :param path: Path of the published artifact
+    :type path: str
+    :result: Count of removed versions
+    :rtype: int
+    """
+    versions_dir = _get_versions_dir(path)
+    pattern = _get_version_pattern(path)
+    current = None
+    if os.path.islink(path):
+        current = os.path.basename(os.path.realpath(path))
+
+    try:
+        versions = [entry for entry in os.listdir(versions_dir) if pattern.match(entry)]
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for version in versions:
+        if current is None or version < current:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def reap_versions_in_background(path):
+    """Runs reap_versions within a background thread.
+
+    :param path: Path of the published artifact
+    :type path: str
+    :result: Thread
+    :rtype: threading.Thread
+    """
+
+    def reap():
+        try:
+            removed = reap_versions(path)
+            if removed > 0:
+                logger.debug(f"Reaped {removed} versions of {path}.")
+        except Exception as e:
+            logger.info(f"Error while reaping the versions of {path}")
+            logger.error(e)
+
+    thread = threading.Thread(target=reap, daemon=True)
+    thread.start()
+    return thread
@@ -11,10 +11,7 @@ import uuid
 
 from loguru import logger
 
-from georeference.config.paths import (
-    PATH_TMP_TRANSFORMATION_ROOT,
-    PATH_TMP_ROOT,
-)
+from georeference.config.paths import PATH_TMP_TRANSFORMATION_ROOT
 from georeference.config.templates import (
     PATH_MAPFILE_TEMPLATES,
     TEMPLATE_TRANSFORMATION_WMS_URL,
@@ -26,7 +23,7 @@ from georeference.utils.parser import to_gdal_gcps
 
 
 def _create_temporary_georeference_image(
-    trg_file_name, src_file, transformation_params, clip_geometry
+    trg_file_name, src_file, transformation_params, clip_geometry, scale=1.0
 ):
     """Function creates a temporary georeference image.
 
@@ -38,6 +35,8 @@ def _create_temporary_georeference_image(
     :type transformation_params: dict
     :param clip_geometry: Clip geometry in GeoJSON syntax
     :type clip_geometry: dict
+    :param scale: Factor, by which the resolution of the source file is reduced (Default: 1.0)
+    :type scale: float
     :result: Path to the temporary georeference file
     :rtype: str
     """
@@ -60,12 +59,34 @@ def _create_temporary_georeference_image(
         transformation_params["algorithm"],
         gdal_gcps,
         transformation_params["target"].lower(),
-        PATH_TMP_ROOT,
         None if clip_geometry is None else clip_geometry,
+        scale=scale,
     )
 
 
-def _create_temporary_mapfile(raw_map_obj, trg_file, transformation_params):
+def get_temporary_mapfile_name():
+    """Returns a random name for a temporary mapfile.
+
+    :result: Name of the mapfile
+    :rtype: str
+    """
+    return f'wms_{str(uuid.uuid4()).replace("-", "_")}'
+
+
+def get_temporary_mapfile_path(mapfile_name):
+    """Returns the path of a temporary mapfile.
+
+    :param mapfile_name: Name of the mapfile
+    :type mapfile_name: str
+    :result: Path of the mapfile
+    :rtype: str
+    """
+    return os.path.join(PATH_TMP_TRANSFORMATION_ROOT, f"{mapfile_name}.map")
+
+
+def _create_temporary_mapfile(
+    raw_map_obj, trg_file, transformation_params, mapfile_name=None
+):
     """Creates a temporary mapfile.
 
     :param raw_map_obj: RawMap
@@ -74,12 +95,15 @@ def _create_temporary_mapfile(raw_map_obj, trg_file, transformation_params):
     :type trg_file: str
     :param transformation_params: Transformation params
     :type transformation_params: dict
+    :param mapfile_name: Name of the mapfile. If it is not set, a random name is used.
+    :type mapfile_name: str|None
     :result: Link to the wms service
     :rtype: str
     """
     logger.debug("Create temporary map service ...")
     logger.debug(transformation_params)
-    mapfile_name = f'wms_{str(uuid.uuid4()).replace("-", "_")}'
+    if mapfile_name is None:
+        mapfile_name = get_temporary_mapfile_name()
     wms_url = TEMPLATE_TRANSFORMATION_WMS_URL.format(mapfile_name)
 
     # The path resolution of the trg_file are different in production/staging and local development setup. Therefor we
@@ -90,7 +114,7 @@ def _create_temporary_mapfile(raw_map_obj, trg_file, transformation_params):
         )
 
     write_mapfile(
-        os.path.join(PATH_TMP_TRANSFORMATION_ROOT, f"{mapfile_name}.map"),
+        get_temporary_mapfile_path(mapfile_name),
         os.path.join(PATH_MAPFILE_TEMPLATES, "./wms_dynamic.map"),
         {
             "wmsAbstract": f"This wms is a temporary wms for {raw_map_obj.file_name}",
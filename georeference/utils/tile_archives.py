@@ -0,0 +1,490 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import gzip
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import struct
+
+from georeference.config.settings import get_settings
+from georeference.utils.publish import unpublish
+
+# Single-file archives, which can be written next to a tms directory
+TILE_ARCHIVE_FORMATS = ("mbtiles", "pmtiles")
+
+# Layout of the fixed size header of a PMTiles v3 archive (see https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md)
+PMTILES_HEADER = struct.Struct("<7sBQQQQQQQQQQQBBBBBBiiiiBii")
+PMTILES_COMPRESSION_NONE = 1
+PMTILES_COMPRESSION_GZIP = 2
+PMTILES_TILE_TYPE_PNG = 2
+
+# The root directory and the header have to fit into the first 16 KiB of an archive, which a client fetches first
+PMTILES_ROOT_SIZE = 16384 - PMTILES_HEADER.size
+
+
+def get_tile_archive_path(tms_path, archive_format):
+    """Returns the path of a tile archive, which is placed next to the tms directory.
+
+    :param tms_path: Path of the tms directory
+    :type tms_path: str
+    :param archive_format: Format of the archive ("mbtiles" or "pmtiles")
+    :type archive_format: str
+    :result: Path of the archive
+    :rtype: str
+    """
+    return f"{tms_path}.{archive_format}"
+
+
+def get_tms_outputs(tms_path):
+    """Returns the paths, which are written for a tms cache. These are the tms directory, if TMS_DIRECTORY_OUTPUT is
+    set, and an archive per format of TMS_ARCHIVE_FORMATS.
+
+    :param tms_path: Path of the tms directory
+    :type tms_path: str
+    :result: Paths of the outputs
+    :rtype: list[str]
+    """
+    settings = get_settings()
+    outputs = [tms_path] if settings.TMS_DIRECTORY_OUTPUT else []
+    return outputs + [
+        get_tile_archive_path(tms_path, archive_format)
+        for archive_format in settings.TMS_ARCHIVE_FORMATS
+    ]
+
+
+def remove_tms_outputs(tms_path):
+    """Removes a tms cache. These are the published tms directory together with its versions and the archives of
+    all formats, also of formats, which are not configured anymore.
+
+    :param tms_path: Path of the tms directory
+    :type tms_path: str
+    """
+    unpublish(tms_path)
+    for archive_format in TILE_ARCHIVE_FORMATS:
+        archive_path = get_tile_archive_path(tms_path, archive_format)
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+
+def _get_tiles(tms_path):
+    """Returns the png tiles of a tms directory sorted by zoom level, column and row. Rows use the TMS scheme, which
+    counts from the bottom.
+
+    :param tms_path: Path of the tms directory
+    :type tms_path: str
+    :result: Zoom level, column, row and path of the tiles
+    :rtype: (int, int, int, str)[]
+    """
+    tiles = []
+    for z in os.listdir(tms_path):
+        if not z.isdigit():
+            continue
+        for x in os.listdir(os.path.join(tms_path, z)):
+            if not x.isdigit():
+                continue
+            for file_name in os.listdir(os.path.join(tms_path, z, x)):
+                y, extension = os.path.splitext(file_name)
+                if extension == ".png" and y.isdigit():
+                    path = os.path.join(tms_path, z, x, file_name)
+                    tiles.append((int(z), int(x), int(y), path))
+    return sorted(tiles)
+
+
+def _get_tile_bounds(z, x, y):
+    """Returns the bounds of a tile of the web mercator grid in EPSG:4326. The row uses the TMS scheme.
+
+    :result: Bounds as [west, south, east, north]
+    :rtype: list[float]
+    """
+    n = 1 << z
+
+    def get_lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    # Row of the top edge in the XYZ scheme, which counts from the top
+    row = n - 1 - y
+    return [
+        x / n * 360 - 180,
+        get_lat(row + 1),
+        (x + 1) / n * 360 - 180,
+        get_lat(row),
+    ]
+
+
+def get_tiles_metadata(tiles, name):
+    """Returns the metadata of a set of tiles. The bounds are the bounds of the tiles of the max zoom level.
+
+    :param tiles: Zoom level, column, row and path of the tiles (see _get_tiles)
+    :type tiles: (int, int, int, str)[]
+    :param name: Name of the tile set
+    :type name: str
+    :result: Metadata with name, format, bounds, center, minzoom and maxzoom
+    :rtype: dict
+    """
+    if len(tiles) == 0:
+        raise ValueError(f"Tile set {name} does not contain any tiles.")
+
+    minzoom = min(z for z, _, _, _ in tiles)
+    maxzoom = max(z for z, _, _, _ in tiles)
+    columns = [x for z, x, _, _ in tiles if z == maxzoom]
+    rows = [y for z, _, y, _ in tiles if z == maxzoom]
+    west, south, _, _ = _get_tile_bounds(maxzoom, min(columns), min(rows))
+    _, _, east, north = _get_tile_bounds(maxzoom, max(columns), max(rows))
+    return {
+        "name": name,
+        "format": "png",
+        "bounds": [west, south, east, north],
+        "center": [(west + east) / 2, (south + north) / 2, minzoom],
+        "minzoom": minzoom,
+        "maxzoom": maxzoom,
+    }
+
+
+def _read_tile(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def write_mbtiles(tiles, metadata, dst_path):
+    """Writes tiles to an MBTiles 1.3 archive. Identical tiles are stored once (see https://github.com/mapbox/mbtiles-spec).
+
+    :param tiles: Zoom level, column, row and path of the tiles (see _get_tiles)
+    :type tiles: (int, int, int, str)[]
+    :param metadata: Metadata of the tiles (see get_tiles_metadata)
+    :type metadata: dict
+    :param dst_path: Path of the archive
+    :type dst_path: str
+    """
+    connection = sqlite3.connect(dst_path)
+    try:
+        connection.executescript(
+            """
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);
+            CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+            CREATE UNIQUE INDEX map_index ON map (zoom_level, tile_column, tile_row);
+            CREATE VIEW tiles AS
+                SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column, map.tile_row AS tile_row,
+                    images.tile_data AS tile_data
+                FROM map JOIN images ON images.tile_id = map.tile_id;
+            """
+        )
+        for z, x, y, path in tiles:
+            data, tile_id = _read_tile(path)
+            connection.execute(
+                "INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)",
+                (tile_id, data),
+            )
+            # MBTiles uses the TMS scheme for the rows as well
+            connection.execute(
+                "INSERT INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+                (z, x, y, tile_id),
+            )
+        connection.executemany(
+            "INSERT INTO metadata (name, value) VALUES (?, ?)",
+            [
+                ("name", metadata["name"]),
+                ("format", metadata["format"]),
+                ("type", "overlay"),
+                ("bounds", ",".join(str(value) for value in metadata["bounds"])),
+                ("center", ",".join(str(value) for value in metadata["center"])),
+                ("minzoom", str(metadata["minzoom"])),
+                ("maxzoom", str(metadata["maxzoom"])),
+            ],
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def zxy_to_tileid(z, x, y):
+    """Returns the PMTiles tile id of a tile, which is its position on the hilbert curves of all zoom levels. The row
+    uses the XYZ scheme.
+
+    :param z: Zoom level
+    :type z: int
+    :param x: Column
+    :type x: int
+    :param y: Row
+    :type y: int
+    :result: Tile id
+    :rtype: int
+    """
+    n = 1 << z
+    # Count of the tiles of all lower zoom levels
+    tile_id = ((1 << (z * 2)) - 1) // 3
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return tile_id
+
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def serialize_directory(entries):
+    """Serializes the entries of a PMTiles directory. The columns are stored one after another as varints, tile ids as
+    deltas and offsets as 0, if an entry directly follows the previous one. The result is gzip compressed.
+
+    :param entries: Tile id, offset, length and run length of the entries sorted by tile id
+    :type entries: (int, int, int, int)[]
+    :result: Compressed directory
+    :rtype: bytes
+    """
+    buffer = bytearray()
+    _write_varint(buffer, len(entries))
+    last_tile_id = 0
+    for tile_id, _, _, _ in entries:
+        _write_varint(buffer, tile_id - last_tile_id)
+        last_tile_id = tile_id
+    for _, _, _, run_length in entries:
+        _write_varint(buffer, run_length)
+    for _, _, length, _ in entries:
+        _write_varint(buffer, length)
+    for index, (_, offset, _, _) in enumerate(entries):
+        previous = entries[index - 1] if index > 0 else None
+        if previous is not None and offset == previous[1] + previous[2]:
+            _write_varint(buffer, 0)
+        else:
+            _write_varint(buffer, offset + 1)
+    return gzip.compress(bytes(buffer), mtime=0)
+
+
+def deserialize_directory(data):
+    """Inverse of serialize_directory.
+
+    :param data: Compressed directory
+    :type data: bytes
+    :result: Tile id, offset, length and run length of the entries
+    :rtype: (int, int, int, int)[]
+    """
+    data = gzip.decompress(data)
+    count, position = _read_varint(data, 0)
+    columns = []
+    for _ in range(4):
+        column = []
+        for _ in range(count):
+            value, position = _read_varint(data, position)
+            column.append(value)
+        columns.append(column)
+
+    entries = []
+    tile_id = 0
+    for index in range(count):
+        tile_id += columns[0][index]
+        offset = columns[3][index] - 1
+        if columns[3][index] == 0:
+            offset = entries[index - 1][1] + entries[index - 1][2]
+        entries.append((tile_id, offset, columns[2][index], columns[1][index]))
+    return entries
+
+
+def _build_directories(entries):
+    """Returns the root directory and the leaf directories. If the root directory does not fit into PMTILES_ROOT_SIZE,
+    the entries are split into leaf directories, which grow until their root directory fits.
+
+    :param entries: Entries sorted by tile id
+    :type entries: (int, int, int, int)[]
+    :result: Root directory and leaf directories
+    :rtype: (bytes, bytes)
+    """
+    root = serialize_directory(entries)
+    if len(root) <= PMTILES_ROOT_SIZE:
+        return root, b""
+
+    leaf_size = 4096
+    while True:
+        leaves = bytearray()
+        root_entries = []
+        for index in range(0, len(entries), leaf_size):
+            leaf = serialize_directory(entries[index : index + leaf_size])
+            # Entries with a run length of 0 point to a leaf directory
+            root_entries.append((entries[index][0], len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = serialize_directory(root_entries)
+        if len(root) <= PMTILES_ROOT_SIZE:
+            return root, bytes(leaves)
+        leaf_size = int(leaf_size * 1.2)
+
+
+def write_pmtiles(tiles, metadata, dst_path):
+    """Writes tiles to a PMTiles v3 archive. Identical tiles are stored once and runs of identical tiles are stored as
+    one directory entry.
+
+    :param tiles: Zoom level, column, row and path of the tiles (see _get_tiles)
+    :type tiles: (int, int, int, str)[]
+    :param metadata: Metadata of the tiles (see get_tiles_metadata)
+    :type metadata: dict
+    :param dst_path: Path of the archive
+    :type dst_path: str
+    """
+    # PMTiles uses the XYZ scheme and orders the tiles by tile id
+    tiles = sorted(
+        (zxy_to_tileid(z, x, (1 << z) - 1 - y), path) for z, x, y, path in tiles
+    )
+
+    tmp_data_path = f"{dst_path}.data"
+    entries = []
+    offsets = {}
+    try:
+        with open(tmp_data_path, "wb") as f:
+            tile_data_length = 0
+            for tile_id, path in tiles:
+                data, tile_hash = _read_tile(path)
+                if tile_hash not in offsets:
+                    offsets[tile_hash] = (tile_data_length, len(data))
+                    f.write(data)
+                    tile_data_length += len(data)
+                offset, length = offsets[tile_hash]
+
+                last = entries[-1] if len(entries) > 0 else None
+                if (
+                    last is not None
+                    and last[1] == offset
+                    and last[0] + last[3] == tile_id
+                ):
+                    entries[-1] = (last[0], last[1], last[2], last[3] + 1)
+                else:
+                    entries.append((tile_id, offset, length, 1))
+
+        root, leaves = _build_directories(entries)
+        json_metadata = gzip.compress(
+            json.dumps(
+                {key: metadata[key] for key in ("name", "format", "bounds", "center")}
+                | {"type": "overlay"}
+            ).encode("utf-8"),
+            mtime=0,
+        )
+
+        root_offset = PMTILES_HEADER.size
+        metadata_offset = root_offset + len(root)
+        leaves_offset = metadata_offset + len(json_metadata)
+        tile_data_offset = leaves_offset + len(leaves)
+        west, south, east, north = metadata["bounds"]
+        center_lon, center_lat, center_zoom = metadata["center"]
+        header = PMTILES_HEADER.pack(
+            b"PMTiles",
+            3,
+            root_offset,
+            len(root),
+            metadata_offset,
+            len(json_metadata),
+            leaves_offset,
+            len(leaves),
+            tile_data_offset,
+            tile_data_length,
+            len(tiles),
+            len(entries),
+            len(offsets),
+            1,  # clustered
+            PMTILES_COMPRESSION_GZIP,
+            PMTILES_COMPRESSION_NONE,
+            PMTILES_TILE_TYPE_PNG,
+            metadata["minzoom"],
+            metadata["maxzoom"],
+            round(west * 10_000_000),
+            round(south * 10_000_000),
+            round(east * 10_000_000),
+            round(north * 10_000_000),
+            center_zoom,
+            round(center_lon * 10_000_000),
+            round(center_lat * 10_000_000),
+        )
+
+        with open(dst_path, "wb") as dst, open(tmp_data_path, "rb") as src:
+            dst.write(header)
+            dst.write(root)
+            dst.write(json_metadata)
+            dst.write(leaves)
+            while chunk := src.read(1024 * 1024):
+                dst.write(chunk)
+    finally:
+        if os.path.exists(tmp_data_path):
+            os.remove(tmp_data_path)
+
+
+def write_tile_archive(tms_path, dst_path, archive_format, name):
+    """Writes the tiles of a tms directory to a single-file archive.
+
+    :param tms_path: Path of the tms directory
+    :type tms_path: str
+    :param dst_path: Path of the archive
+    :type dst_path: str
+    :param archive_format: Format of the archive ("mbtiles" or "pmtiles")
+    :type archive_format: str
+    :param name: Name of the tile set
+    :type name: str
+    :result: Metadata of the archive
+    :rtype: dict
+    """
+    tiles = _get_tiles(tms_path)
+    metadata = get_tiles_metadata(tiles, name)
+    if archive_format == "mbtiles":
+        write_mbtiles(tiles, metadata, dst_path)
+    elif archive_format == "pmtiles":
+        write_pmtiles(tiles, metadata, dst_path)
+    else:
+        raise ValueError(f"Unknown tile archive format {archive_format}.")
+    return metadata
+
+
+def read_tile_archive_metadata(path):
+    """Reads the bounds and zoom levels of a tile archive. Only the metadata table of a MBTiles archive or the header
+    of a PMTiles archive are read.
+
+    :param path: Path of the archive
+    :type path: str
+    :result: Bounds as [west, south, east, north], minzoom and maxzoom
+    :rtype: dict
+    """
+    if path.endswith(".mbtiles"):
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            metadata = dict(connection.execute("SELECT name, value FROM metadata"))
+        finally:
+            connection.close()
+        return {
+            "bounds": [float(value) for value in metadata["bounds"].split(",")],
+            "minzoom": int(metadata["minzoom"]),
+            "maxzoom": int(metadata["maxzoom"]),
+        }
+
+    with open(path, "rb") as f:
+        header = PMTILES_HEADER.unpack(f.read(PMTILES_HEADER.size))
+    if header[0] != b"PMTiles" or header[1] != 3:
+        raise ValueError(f"{path} is not a PMTiles v3 archive.")
+    return {
+        "bounds": [value / 10_000_000 for value in header[19:23]],
+        "minzoom": header[17],
+        "maxzoom": header[18],
+    }
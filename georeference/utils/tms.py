@@ -7,24 +7,48 @@
 # "LICENSE", which is part of this source code package
 
 import argparse
+import hashlib
 import logging
 import math
+import multiprocessing
 import os
 import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
 from PIL import Image
 from loguru import logger
 from osgeo import gdal
-
-from georeference.config.paths import TMP_DIR
+from osgeo.gdalconst import GA_ReadOnly
+
+from georeference.config.settings import get_settings
+from georeference.utils.metrics import stage_timer
+from georeference.utils.progress import report_progress, run_command_with_progress
+from georeference.utils.publish import (
+    get_temporary_path,
+    get_version_path,
+    publish_directory,
+    publish_file,
+    unpublish,
+)
+from georeference.utils.tile_archives import get_tile_archive_path, write_tile_archive
 
 BASE_PATH = os.path.dirname(os.path.realpath(__file__))
 BASE_PATH_PARENT = os.path.abspath(os.path.join(BASE_PATH, "../../"))
 sys.path.insert(0, BASE_PATH)
 sys.path.append(BASE_PATH_PARENT)
 
+settings = get_settings()
+
+# Bits per channel of the lookup table, which maps colors to the nearest color of a shared palette
+PALETTE_LUT_BITS = 5
+
+# Index of the transparent color within a shared palette
+TRANSPARENT_INDEX = 255
+
 
 def _add_base_tile(target_dir):
     """Functions adds a basetile dir to a directory in case it doesn't exits.
@@ -79,23 +103,21 @@ def get_max_zoom_level(path_image):
         raise ValueError(f"Error calculating the maximum zoom level: {e}")
 
 
-def _build_tms_cache(path_image, target_root_path, processes):
+def _build_tms_cache(path_image, tms_target_dir, processes):
     """Functions calculates a Tile Map Service cache for a given georeferenced source file.
 
     :param path_image: Path to target image
     :type path_image: str
-    :param target_root_path: Path of the target directory, where to place the tms directory.
-    :type target_root_path: str
+    :param tms_target_dir: Path of the tms directory
+    :type tms_target_dir: str
     :param processes: Number of processes used by gdal2tiles
     :type processes: int
     :return: str"""
     logger.debug("------------------------------------------------------------------")
     logger.debug("Source image %s" % path_image)
-    logger.debug("Target dir %s" % target_root_path)
-    file_name, file_extension = os.path.splitext(os.path.basename(path_image))
+    logger.debug("Target dir %s" % tms_target_dir)
 
     # check if target dir extist
-    tms_target_dir = os.path.join(target_root_path, file_name)
     if os.path.exists(tms_target_dir):
         logger.debug("Remove old tsm cache directory ...")
         shutil.rmtree(tms_target_dir)
@@ -107,28 +129,274 @@ def _build_tms_cache(path_image, target_root_path, processes):
 
     try:
         logger.debug("Execute - %s" % command)
-        subprocess.check_output(command, shell=True, stderr=subprocess.STDOUT)
+        run_command_with_progress(command, "tiles")
     except subprocess.CalledProcessError as e:
         logger.error(e.output)
         raise
     return tms_target_dir
 
 
-def _compress_tms_directory(path):
-    """Functions runs a pngs compression on the given tms cache.
+def get_map_palette(path_image, colors=255, sample_size=1024):
+    """Computes one palette for all tiles of a map from a low resolution version of the geo image. GDAL reads the
+    overviews of the geo image for it. Besides the palette it returns a lookup table, which maps colors reduced to
+    PALETTE_LUT_BITS bits per channel to the index of the nearest palette color.
 
-    :param path: Path to the directory containing the images
-    :type path: path
-    :return:
+    :param path_image: Path to the geo image
+    :type path_image: str
+    :param colors: Count of colors of the palette. The index of the last color is used for transparency.
+    :type colors: int
+    :param sample_size: Maximal size of the low resolution version of the geo image
+    :type sample_size: int
+    :return: Palette (colors x 3) and lookup table or None, if the geo image has no valid pixels
+    :rtype: (numpy.ndarray, numpy.ndarray)|None
     """
-    logger.debug("Run png compression on %s ..." % path)
+    dataset = gdal.Open(path_image, GA_ReadOnly)
+    try:
+        scale = min(1.0, sample_size / max(dataset.RasterXSize, dataset.RasterYSize))
+        width = max(1, round(dataset.RasterXSize * scale))
+        height = max(1, round(dataset.RasterYSize * scale))
+
+        # The mask covers alpha bands, internal masks and nodata values
+        first_band = dataset.GetRasterBand(1)
+        mask = first_band.GetMaskBand().ReadAsArray(buf_xsize=width, buf_ysize=height)
+        color_bands = [
+            dataset.GetRasterBand(index)
+            for index in range(1, dataset.RasterCount + 1)
+            if dataset.GetRasterBand(index).GetColorInterpretation()
+            != gdal.GCI_AlphaBand
+        ][:3]
+        data = [
+            band.ReadAsArray(buf_xsize=width, buf_ysize=height) for band in color_bands
+        ]
+        color_table = first_band.GetColorTable()
+        if color_table is not None:
+            entries = np.array(
+                [
+                    color_table.GetColorEntry(i)[:3]
+                    for i in range(color_table.GetCount())
+                ],
+                dtype=np.uint8,
+            )
+            rgb = entries[data[0]]
+        else:
+            rgb = np.stack([data[min(i, len(data) - 1)] for i in range(3)], axis=-1)
+    finally:
+        del dataset
+
+    pixels = rgb[mask > 0].astype(np.uint8)
+    if len(pixels) == 0:
+        return None
 
+    quantized = Image.fromarray(pixels.reshape(1, -1, 3), mode="RGB").quantize(
+        colors=colors, method=Image.Quantize.MEDIANCUT
+    )
+    palette = np.array(quantized.getpalette(), dtype=np.uint8).reshape(-1, 3)[:colors]
+
+    # Every cell of the lookup table gets the palette color nearest to its center
+    shift = 8 - PALETTE_LUT_BITS
+    levels = 1 << PALETTE_LUT_BITS
+    centers = (np.arange(levels) << shift) + (1 << shift >> 1)
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1)
+    grid = grid.reshape(-1, 3).astype(np.int32)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 4096):
+        distances = (
+            (grid[start : start + 4096, None, :] - palette[None, :, :].astype(np.int32))
+            ** 2
+        ).sum(axis=2)
+        lut[start : start + 4096] = distances.argmin(axis=1)
+    return palette, lut.reshape(levels, levels, levels)
+
+
+def _quantize_with_palette(png, palette, lut):
+    shift = 8 - PALETTE_LUT_BITS
+    rgba = np.asarray(Image.open(png).convert("RGBA"))
+    indices = lut[rgba[..., 0] >> shift, rgba[..., 1] >> shift, rgba[..., 2] >> shift]
+    indices[rgba[..., 3] < 128] = TRANSPARENT_INDEX
+
+    image = Image.fromarray(indices, mode="P")
+    image.putpalette(palette.flatten().tolist() + [0, 0, 0] * (256 - len(palette)))
+    image.save(png, transparency=TRANSPARENT_INDEX)
+
+
+def _is_transparent(image):
+    """Checks if all pixels of a tile are fully transparent.
+
+    :param image: Tile
+    :type image: PIL.Image.Image
+    :return: bool
+    """
+    if "A" not in image.getbands():
+        return False
+    return image.getchannel("A").getextrema()[1] == 0
+
+
+def _compress_tiles(pngs, palette=None):
+    """Quantizes a batch of png tiles. Fully transparent tiles are removed instead. It runs within the processes of
+    the compression pool.
+
+    :param pngs: Paths of the png tiles
+    :type pngs: list<str>
+    :param palette: Palette and lookup table of the map (see get_map_palette). If it is not set, a palette is
+        computed per tile.
+    :type palette: (numpy.ndarray, numpy.ndarray)|None
+    :return: Paths and content hashes of the written tiles
+    :rtype: list<(str, str)>
+    """
     # Prevents pil from logs pollution
     logging.getLogger("PIL").setLevel(logging.WARNING)
 
-    pngs = _get_all_image_paths_in_directory(path, "png")
+    tiles = []
+    for png in pngs:
+        image = Image.open(png)
+        if _is_transparent(image):
+            os.remove(png)
+            continue
+
+        if palette is None:
+            image.convert("RGBA").quantize(method=2).save(png)
+        else:
+            _quantize_with_palette(png, *palette)
+
+        with open(png, "rb") as f:
+            tiles.append((png, hashlib.sha256(f.read()).hexdigest()))
+    return tiles
+
+
+def _link_identical_tiles(tiles):
+    """Replaces byte-identical tiles by hardlinks to the first tile with the same content.
+
+    :param tiles: Paths and content hashes of the tiles
+    :type tiles: list<(str, str)>
+    :return: Count of linked tiles
+    :rtype: int
+    """
+    originals = {}
+    linked = 0
+    for png, digest in tiles:
+        original = originals.setdefault(digest, png)
+        if original != png:
+            tmp_png = f"{png}.tmp"
+            os.link(original, tmp_png)
+            os.replace(tmp_png, png)
+            linked += 1
+    return linked
+
+
+def _remove_empty_directories(path):
+    """Removes all empty directories below a directory.
+
+    :param path: Path of the directory
+    :type path: str
+    """
+    for root, dirs, files in os.walk(path, topdown=False):
+        if root != path and len(os.listdir(root)) == 0:
+            os.rmdir(root)
+
+
+def _get_batches_by_zoom_level(path, pngs, batch_size):
+    """Groups the tiles by their zoom level (the first directory below the tms root) and splits them into batches.
+
+    :param path: Path of the tms directory
+    :type path: str
+    :param pngs: Paths of the png tiles
+    :type pngs: list<str>
+    :param batch_size: Maximal count of tiles per batch
+    :type batch_size: int
+    :return: Batches of tile paths
+    :rtype: list<list<str>>
+    """
+    zoom_levels = {}
     for png in pngs:
-        Image.open(png).convert("RGBA").quantize(method=2).save(png)
+        zoom_level = os.path.relpath(png, path).split(os.sep)[0]
+        zoom_levels.setdefault(zoom_level, []).append(png)
+
+    batches = []
+    for zoom_level in sorted(zoom_levels, key=lambda z: int(z) if z.isdigit() else -1):
+        tiles = zoom_levels[zoom_level]
+        batches.extend(
+            tiles[i : i + batch_size] for i in range(0, len(tiles), batch_size)
+        )
+    return batches
+
+
+def get_compression_processes():
+    """Returns the count of processes for the png compression. It is limited by the cpu budget of a job, which
+    defaults to the available cpus shared by the workers of the daemon.
+
+    :return: Count of processes
+    :rtype: int
+    """
+    cpu_budget = settings.TMS_JOB_CPU_BUDGET
+    if cpu_budget is None:
+        cpu_budget = (os.cpu_count() or 1) // max(1, settings.DAEMON_WORKER_COUNT)
+    return max(1, min(settings.TMS_COMPRESSION_PROCESSES, cpu_budget))
+
+
+def _compress_tms_directory(path, processes=None, batch_size=None, palette=None):
+    """Functions runs a pngs compression on the given tms cache. The tiles are compressed in batches per zoom level
+    within a process pool. Fully transparent tiles are removed and byte-identical tiles are hardlinked.
+
+    :param path: Path to the directory containing the images
+    :type path: path
+    :param processes: Count of processes (Default: get_compression_processes())
+    :type processes: int|None
+    :param batch_size: Maximal count of tiles per batch (Default: TMS_COMPRESSION_BATCH_SIZE)
+    :type batch_size: int|None
+    :param palette: Palette and lookup table of the map (see get_map_palette). If it is not set, a palette is
+        computed per tile.
+    :type palette: (numpy.ndarray, numpy.ndarray)|None
+    :return: Count of written tiles
+    :rtype: int
+    """
+    logger.debug("Run png compression on %s ..." % path)
+    processes = processes if processes is not None else get_compression_processes()
+    batch_size = (
+        batch_size if batch_size is not None else settings.TMS_COMPRESSION_BATCH_SIZE
+    )
+
+    pngs = _get_all_image_paths_in_directory(path, "png")
+    batches = _get_batches_by_zoom_level(path, pngs, batch_size)
+    start_time = time.monotonic()
+    processed = 0
+    tiles = []
+
+    if processes == 1 or len(batches) <= 1:
+        for batch in batches:
+            tiles.extend(_compress_tiles(batch, palette))
+            processed += len(batch)
+            report_progress("compress_tiles", processed / len(pngs))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {
+                executor.submit(_compress_tiles, batch, palette): len(batch)
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                tiles.extend(future.result())
+                processed += futures[future]
+                report_progress("compress_tiles", processed / len(pngs))
+
+    # Fully transparent tiles are not stored and identical tiles share one inode
+    linked = _link_identical_tiles(tiles)
+    _remove_empty_directories(path)
+
+    duration = time.monotonic() - start_time
+    logger.info(
+        "Compressed %s tiles with %s processes in %.1fs (%.1f tiles/s). Skipped %s transparent tiles and linked %s "
+        "identical tiles."
+        % (
+            len(tiles),
+            processes,
+            duration,
+            processed / duration if duration else 0,
+            processed - len(tiles),
+            linked,
+        )
+    )
+    return len(tiles)
 
 
 def _get_all_image_paths_in_directory(base_dir, image_extension):
@@ -164,8 +432,12 @@ def _get_all_image_paths_in_directory(base_dir, image_extension):
     return images
 
 
-def calculate_compressed_tms(path_image, tms_path, processes=1):
-    """The following functions creates a compressed version of TMS cache.
+def calculate_compressed_tms(
+    path_image, tms_path, processes=1, archive_formats=(), with_directory=True
+):
+    """The following functions creates a compressed version of TMS cache. The cache is built into a new version
+    next to the tms directory and published by an atomic switch of the symlink of the tms directory. Optionally the
+    cache is also written to single-file archives next to the tms directory.
 
     :param path_image: Path to target image
     :type path_image: str
@@ -173,38 +445,66 @@ def calculate_compressed_tms(path_image, tms_path, processes=1):
     :type tms_path: str
     :param processes: Number of processes used by gdal2tiles
     :type processes: int
+    :param archive_formats: Formats of the tile archives ("mbtiles", "pmtiles"), which should be written (Default: ())
+    :type archive_formats: list[str]
+    :param with_directory: Signals if the tms directory should be published (Default: True)
+    :type with_directory: bool
     :return:
     """
+    version_path = get_version_path(tms_path)
+    tmp_archives = []
     try:
         logger.debug("Calculate tms cache ...")
-        tmp_cache_dir = _build_tms_cache(path_image, TMP_DIR, processes)
+        with stage_timer("build_tms_cache"):
+            _build_tms_cache(path_image, version_path, processes)
 
         logger.debug("Compress cache ...")
-        _compress_tms_directory(tmp_cache_dir)
-
-        # check if the target dir exits, if yes remove it
-        if os.path.exists(tms_path):
-            logger.debug("Remove old target dir ...")
-            shutil.rmtree(tms_path)
+        with stage_timer("compress_tms_directory"):
+            palette = (
+                get_map_palette(path_image)
+                if settings.TMS_COMPRESSION_PALETTE == "map"
+                else None
+            )
+            _compress_tms_directory(version_path, palette=palette)
 
         logger.debug(
             "Check if base tile directory is add to cache and add it if not ..."
         )
-        _add_base_tile(tmp_cache_dir)
-
-        logger.debug("Copy compressed cache to target dir ...")
-        if not os.path.exists(tms_path):
-            os.makedirs(tms_path)
-
-        copy_command = f"rsync -rI {tmp_cache_dir}/ {tms_path}"
-        logger.debug(copy_command)
-        subprocess.check_output(copy_command, shell=True, stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as e:
-        logger.error(e.output)
+        _add_base_tile(version_path)
+
+        if len(archive_formats) > 0:
+            logger.debug(f"Write tile archives {', '.join(archive_formats)} ...")
+            with stage_timer("write_tile_archives"):
+                for archive_format in archive_formats:
+                    archive_path = get_tile_archive_path(tms_path, archive_format)
+                    tmp_archives.append(
+                        (get_temporary_path(archive_path), archive_path)
+                    )
+                    write_tile_archive(
+                        version_path,
+                        tmp_archives[-1][0],
+                        archive_format,
+                        os.path.basename(tms_path),
+                    )
+
+        logger.debug("Publish compressed cache ...")
+        with stage_timer("publish"):
+            for tmp_archive_path, archive_path in tmp_archives:
+                publish_file(tmp_archive_path, archive_path)
+            if with_directory:
+                publish_directory(version_path, tms_path)
+            else:
+                shutil.rmtree(version_path)
+                # A tms directory of a previous run would serve outdated tiles
+                if os.path.lexists(tms_path):
+                    unpublish(tms_path)
+    except Exception:
+        if os.path.exists(version_path):
+            shutil.rmtree(version_path)
+        for tmp_archive_path, _ in tmp_archives:
+            if os.path.exists(tmp_archive_path):
+                os.remove(tmp_archive_path)
         raise
-    finally:
-        if os.path.exists(tms_path):
-            shutil.rmtree(tmp_cache_dir)
 
 
 """ Main """
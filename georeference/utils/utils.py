@@ -15,9 +15,11 @@ from osgeo.gdalconst import GA_ReadOnly
 from shapely.geometry import shape, mapping
 
 from georeference.config.paths import (
+    PATH_IMAGE_ROOT,
     PATH_MAPFILE_ROOT,
     PATH_TMS_ROOT,
     PATH_THUMBNAIL_ROOT,
+    PATH_WORKING_COPY_ROOT,
     PATH_ZOOMIFY_ROOT,
 )
 from georeference.models.georef_map import GeorefMap
@@ -201,6 +203,36 @@ def get_thumbnail_path(file_name):
     return os.path.join(PATH_THUMBNAIL_ROOT, file_name)
 
 
+def get_working_copy_path(path_raw_image):
+    """Function returns the path of the tiled working copy of a raw image. The working copy has the same relative
+        path within the working copy directory as the raw image within the image directory.
+
+    :param path_raw_image: Path to the raw image
+    :type path_raw_image: str
+    :result: Path to the working copy
+    :rtype: str"""
+    return os.path.abspath(
+        os.path.join(
+            PATH_WORKING_COPY_ROOT,
+            os.path.relpath(
+                os.path.abspath(path_raw_image), os.path.abspath(PATH_IMAGE_ROOT)
+            ),
+        )
+    )
+
+
+def get_readable_raw_image_path(path_raw_image):
+    """Function returns the path of the image, which should be read instead of a raw image. This is the working copy
+        of the raw image or the raw image itself, if no working copy exists yet.
+
+    :param path_raw_image: Path to the raw image
+    :type path_raw_image: str
+    :result: Path to the working copy or the raw image
+    :rtype: str"""
+    path_working_copy = get_working_copy_path(path_raw_image)
+    return path_working_copy if os.path.exists(path_working_copy) else path_raw_image
+
+
 def get_zoomify_path(zoomify_name):
     """Function returns a path for a thumbnail from a file name.
 
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in file
+# "LICENSE", which is part of this source code package
+import json
+import uuid
+
+from loguru import logger
+from osgeo import gdal
+from osgeo.gdalconst import GA_ReadOnly
+
+from georeference.utils.progress import report_progress
+
+
+# Lossy compressions of the COG driver, which do not support an alpha band. The transparency is stored as internal
+# mask instead.
+LOSSY_COMPRESSIONS = {"JPEG", "WEBP"}
+
+# Lossless compressions of the COG driver, which benefit from a predictor
+PREDICTOR_COMPRESSIONS = {"DEFLATE", "LZW", "ZSTD", "LZMA"}
+
+
+class WarpError(Exception):
+    """Raised if GDAL fails to warp or translate a dataset. The message is the error reported by GDAL."""
+
+
+class WarpCancelledError(WarpError):
+    """Raised if a warp or translate operation was cancelled."""
+
+
+def get_memory_path(suffix):
+    """Returns a unique path within the in-memory file system of GDAL.
+
+    :param suffix: Suffix of the file, e.g. ".vrt"
+    :type suffix: str
+    :result: Path within /vsimem/
+    :rtype: str
+    """
+    return f"/vsimem/{uuid.uuid4()}{suffix}"
+
+
+def get_preview_scale(width, height, max_size):
+    """Returns the factor, by which a raster is scaled down, so that its larger side fits into the maximal size.
+
+    :param width: Width of the raster
+    :type width: int
+    :param height: Height of the raster
+    :type height: int
+    :param max_size: Maximal size of the larger side. If it is not set, the raster is not scaled.
+    :type max_size: int|None
+    :result: Scale factor between 0 and 1
+    :rtype: float
+    """
+    if not max_size or max(width, height) <= max_size:
+        return 1.0
+    return max_size / max(width, height)
+
+
+def create_gcp_dataset(src_file, gcps, srs_wkt, scale=1.0):
+    """Creates an in-memory VRT of a source image and attaches the ground control points to it. If a scale is set,
+        the VRT has a reduced resolution, so that GDAL reads the overviews of the source image (or uses the reduced
+        decoding of JPEG) instead of the full resolution. The ground control points are scaled accordingly.
+
+    :param src_file: Source image path
+    :type src_file: str
+    :param gcps: List of ground control points
+    :type gcps: List.<gdal.GCP>
+    :param srs_wkt: Spatial reference system of the ground control points as WKT
+    :type srs_wkt: str
+    :param scale: Factor, by which the resolution of the source image is reduced (Default: 1.0)
+    :type scale: float
+    :result: Path of the VRT within /vsimem/. It has to be removed with gdal.Unlink.
+    :rtype: str
+    """
+    vrt_path = get_memory_path(".vrt")
+    with gdal.ExceptionMgr(useExceptions=True):
+        src_dataset = gdal.Open(src_file, GA_ReadOnly)
+        if scale < 1:
+            width = max(1, round(src_dataset.RasterXSize * scale))
+            height = max(1, round(src_dataset.RasterYSize * scale))
+            scale_x = width / src_dataset.RasterXSize
+            scale_y = height / src_dataset.RasterYSize
+            vrt_dataset = gdal.Translate(
+                vrt_path, src_dataset, format="VRT", width=width, height=height
+            )
+            gcps = [
+                gdal.GCP(
+                    gcp.GCPX,
+                    gcp.GCPY,
+                    gcp.GCPZ,
+                    gcp.GCPPixel * scale_x,
+                    gcp.GCPLine * scale_y,
+                )
+                for gcp in gcps
+            ]
+        else:
+            vrt_dataset = gdal.GetDriverByName("VRT").CreateCopy(
+                vrt_path, src_dataset, 0
+            )
+        vrt_dataset.SetGCPs(gcps, srs_wkt)
+        vrt_dataset.FlushCache()
+        del vrt_dataset, src_dataset
+    return vrt_path
+
+
+def create_geojson_file(geojson):
+    """Writes a GeoJSON to the in-memory file system, e.g. for using it as cutline.
+
+    :param geojson: GeoJSON geometry or feature collection
+    :type geojson: dict
+    :result: Path of the GeoJSON within /vsimem/. It has to be removed with gdal.Unlink.
+    :rtype: str
+    """
+    geojson_path = get_memory_path(".geojson")
+    gdal.FileFromMemBuffer(geojson_path, json.dumps(geojson).encode("utf-8"))
+    return geojson_path
+
+
+def _create_callback(stage, cancel_event):
+    def callback(complete, message, user_data):
+        report_progress(stage, complete)
+        return 0 if cancel_event is not None and cancel_event.is_set() else 1
+
+    return callback
+
+
+def _run(operation, stage, cancel_event, config_options):
+    error = None
+    try:
+        with gdal.ExceptionMgr(useExceptions=True), gdal.config_options(
+            {key: str(value) for key, value in (config_options or {}).items()}
+        ):
+            report_progress(stage, 0)
+            dataset = operation(_create_callback(stage, cancel_event))
+            if dataset is None:
+                error = RuntimeError(gdal.GetLastErrorMsg())
+            else:
+                dataset.FlushCache()
+                del dataset
+    except RuntimeError as e:
+        error = e
+
+    if error is None:
+        return
+    if cancel_event is not None and cancel_event.is_set():
+        raise WarpCancelledError(f"Stage {stage} was cancelled.") from error
+    logger.error(error)
+    raise WarpError(str(error)) from error
+
+
+def warp(
+    dst_file, src_file, stage="warp", cancel_event=None, config_options=None, **kwargs
+):
+    """Warps a dataset in-process with gdal.Warp. The target image is created anew, if it exists.
+
+    :param dst_file: Target image path
+    :type dst_file: str
+    :param src_file: Source image path, e.g. a VRT within /vsimem/
+    :type src_file: str
+    :param stage: Name of the stage, for which the progress is reported (Default: "warp")
+    :type stage: str
+    :param cancel_event: If the event is set, the operation is cancelled
+    :type cancel_event: threading.Event|None
+    :param config_options: GDAL config options, which are only set for this call
+    :type config_options: dict|None
+    :param kwargs: Options of gdal.WarpOptions
+    :raise: georeference.utils.warp.WarpError
+    :result: Target image path
+    :rtype: str
+    """
+    _run(
+        lambda callback: gdal.Warp(
+            dst_file,
+            src_file,
+            options=gdal.WarpOptions(callback=callback, **kwargs),
+        ),
+        stage,
+        cancel_event,
+        config_options,
+    )
+    return dst_file
+
+
+def translate(
+    dst_file,
+    src_file,
+    stage="translate",
+    cancel_event=None,
+    config_options=None,
+    **kwargs,
+):
+    """Copies a dataset in-process with gdal.Translate.
+
+    :param dst_file: Target image path
+    :type dst_file: str
+    :param src_file: Source image path
+    :type src_file: str
+    :param stage: Name of the stage, for which the progress is reported (Default: "translate")
+    :type stage: str
+    :param cancel_event: If the event is set, the operation is cancelled
+    :type cancel_event: threading.Event|None
+    :param config_options: GDAL config options, which are only set for this call
+    :type config_options: dict|None
+    :param kwargs: Options of gdal.TranslateOptions
+    :raise: georeference.utils.warp.WarpError
+    :result: Target image path
+    :rtype: str
+    """
+    _run(
+        lambda callback: gdal.Translate(
+            dst_file,
+            src_file,
+            options=gdal.TranslateOptions(callback=callback, **kwargs),
+        ),
+        stage,
+        cancel_event,
+        config_options,
+    )
+    return dst_file
+
+
+def get_overview_count(width, height, min_size):
+    """Returns the number of overview levels for a raster. Overviews are added until the larger side of the smallest
+        overview is not larger than the minimal size.
+
+    :param width: Width of the raster
+    :type width: int
+    :param height: Height of the raster
+    :type height: int
+    :param min_size: Minimal size of the smallest overview
+    :type min_size: int
+    :result: Number of overview levels
+    :rtype: int
+    """
+    count = 0
+    size = max(width, height)
+    while size > min_size:
+        size = size / 2
+        count += 1
+    return count
+
+
+def write_cog(
+    dst_file,
+    src_file,
+    compression="DEFLATE",
+    quality=85,
+    overview_min_size=256,
+    stage="cog",
+    cancel_event=None,
+    config_options=None,
+):
+    """Writes a Cloud Optimized GeoTIFF with internal overviews. If the source is a warped VRT, the warping and the
+        writing of the COG happens within a single pass.
+
+    :param dst_file: Target image path
+    :type dst_file: str
+    :param src_file: Source image path, e.g. a warped VRT within /vsimem/
+    :type src_file: str
+    :param compression: Compression of the COG, e.g. JPEG, WEBP or DEFLATE (Default: DEFLATE)
+    :type compression: str
+    :param quality: Quality of lossy compressions (Default: 85)
+    :type quality: int
+    :param overview_min_size: Minimal size of the smallest overview (Default: 256)
+    :type overview_min_size: int
+    :param stage: Name of the stage, for which the progress is reported (Default: "cog")
+    :type stage: str
+    :param cancel_event: If the event is set, the operation is cancelled
+    :type cancel_event: threading.Event|None
+    :param config_options: GDAL config options, which are only set for this call
+    :type config_options: dict|None
+    :raise: georeference.utils.warp.WarpError
+    :result: Target image path
+    :rtype: str
+    """
+    compression = compression.upper()
+    with gdal.ExceptionMgr(useExceptions=True):
+        dataset = gdal.Open(src_file, GA_ReadOnly)
+        width, height = dataset.RasterXSize, dataset.RasterYSize
+        band_count = dataset.RasterCount
+        has_alpha = (
+            dataset.GetRasterBand(band_count).GetColorInterpretation()
+            == gdal.GCI_AlphaBand
+        )
+        has_color_table = dataset.GetRasterBand(1).GetColorTable() is not None
+        del dataset
+
+    # Lossy compressions do not support color tables
+    if compression in LOSSY_COMPRESSIONS and has_color_table:
+        logger.info(
+            f"Use DEFLATE instead of {compression} for {dst_file}, because it has a color table."
+        )
+        compression = "DEFLATE"
+
+    creation_options = [
+        f"COMPRESS={compression}",
+        f"OVERVIEW_COUNT={get_overview_count(width, height, overview_min_size)}",
+        "OVERVIEW_RESAMPLING=AVERAGE",
+        "BIGTIFF=IF_SAFER",
+    ]
+    kwargs = {}
+    if compression in LOSSY_COMPRESSIONS:
+        creation_options.append(f"QUALITY={quality}")
+        if has_alpha:
+            kwargs["bandList"] = list(range(1, band_count))
+            kwargs["maskBand"] = band_count
+    elif compression in PREDICTOR_COMPRESSIONS:
+        creation_options.append("PREDICTOR=YES")
+
+    return translate(
+        dst_file,
+        src_file,
+        stage=stage,
+        cancel_event=cancel_event,
+        config_options=config_options,
+        format="COG",
+        creationOptions=creation_options,
+        **kwargs,
+    )